@@ -1 +1 @@
-pdoc --html ./src/tournament_selection.py ./src/evolution.py ./src/experiment.py ./src/one_plus_lambda.py ./src/population.py ./src/utils.py ./src/genome.py -o ./docs
\ No newline at end of file
+pdoc --html ./src/tournament_selection.py ./src/evolution.py ./src/experiment.py ./src/one_plus_lambda.py ./src/population.py ./src/utils.py ./src/genome.py ./src/program.py ./src/fitness_cache.py ./src/kernels.py ./src/codegen.py ./src/subexpression_cache.py ./src/datasets.py ./src/geometry.py -o ./docs
\ No newline at end of file
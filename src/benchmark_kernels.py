@@ -0,0 +1,64 @@
+'''
+File: benchmark_kernels.py
+Purpose: Compares memory allocated and time spent per call of the operation kernels and of the previous lambda operations
+Author: Petr Bromnik
+'''
+
+from constants.operations import operations, op_inputs
+from kernels import op_kernels
+import numpy as np
+import timeit
+import tracemalloc
+
+# operations as they were implemented before the kernels, a new mask is built on every call
+lambda_operations = {
+    '+': lambda x, y, out=None: np.add(x, y, out=out, where=(x < 1e+30) & (x > -1e30) & (y < 1e+30) & (y > -1e30)),
+    '-': lambda x, y, out=None: np.subtract(x, y, out=out, where=(x < 1e+30) & (x > -1e30) & (y < 1e+30) & (y > -1e30)),
+    '*': lambda x, y, out=None: np.multiply(x, y, out=out, where=(x < 1e+30) & (x > -1e30) & (y < 1e+30) & (y > -1e30)),
+    '%': lambda x, y, out=None: np.mod(x, y, out=out, where=(y != 0)),
+    'sin': lambda x, out=None: np.sin(x, out=out),
+    'cos': lambda x, out=None: np.cos(x, out=out),
+    'e^n': lambda x, out=None: np.exp(x, out=out, where=(x <= 50)),
+    'ln(|x|)': lambda x, out=None: np.log(np.absolute(x), out=out, where=(x != 0)),
+}
+
+def allocated_per_call(function):
+    '''[summary]
+    Returns peak memory allocated by one call of the function (after a warm up call)
+    ### Returns
+    int
+        - allocated bytes
+    '''
+    function()
+    tracemalloc.start()
+    function()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return peak
+
+def benchmark_kernels(nsamples = 10000, repeats = 200):
+    '''[summary]
+    Prints allocated bytes and time per call of every operation, for the lambda operations and the kernels.
+    ### Parameters
+    1. nsamples
+        - number of values in the operands
+    2. repeats
+        - number of calls the time is averaged over
+    ### Returns
+    None
+    '''
+    rng = np.random.default_rng(0)
+    x = rng.uniform(-10, 10, nsamples)
+    y = rng.uniform(-10, 10, nsamples)
+    out = np.empty(nsamples)
+
+    print(f"{'operation':<10}{'lambda B/call':>16}{'kernel B/call':>16}{'lambda us/call':>16}{'kernel us/call':>16}")
+    for operation in operations:
+        operands = (x, y) if op_inputs[operation] == 2 else (x,)
+        calls = [lambda function=function: function(*operands, out=out) for function in (lambda_operations[operation], op_kernels[operation])]
+        allocated = [allocated_per_call(call) for call in calls]
+        times = [timeit.timeit(call, number=repeats) / repeats * 1e6 for call in calls]
+        print(f"{operation:<10}{allocated[0]:>16}{allocated[1]:>16}{times[0]:>16.1f}{times[1]:>16.1f}")
+
+if __name__ == '__main__':
+    benchmark_kernels()
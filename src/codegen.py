@@ -0,0 +1,131 @@
+'''
+File: codegen.py
+Purpose: Contains the generation of straight-line python functions from compiled programs used in the CGP algorithm, the experimental CODEGEN backend
+Author: Petr Bromnik
+'''
+
+from collections import OrderedDict
+from kernels import kernels
+from program import opcode_inputs
+import numpy as np
+
+GENERATED_FUNCTION_NAME = "generated_program"
+
+def generate_source(program):
+    '''[summary]
+    Returns the source code of a python function calculating the output of the program.
+    Every instruction becomes one kernel call writing to its own array, there are no loops or lookups of instructions.
+    ### Parameters
+    1. program
+        - program to generate the function from
+    ### Returns
+    str
+        - source code of the function generated_program(input_matrix, dtype = np.float64) -> np.ndarray, returning the output as program_output
+    '''
+    lines = [
+        f"def {GENERATED_FUNCTION_NAME}(input_matrix, dtype = np.float64):",
+        "    nsamples = len(input_matrix[0])",
+    ]
+    for i in range(program.ninputs):
+        lines.append(f"    v{i} = np.asarray(input_matrix[{i}], dtype=dtype)")
+    # constants are broadcast to all samples, their values are always finite, so their repr is a valid literal
+    for slot, value in program.constants:
+        lines.append(f"    v{slot} = np.full(nsamples, {value!r}, dtype=dtype)")
+
+    # float32 products can overflow to inf, which the kernels treat as out of range
+    if len(program) > 0:
+        lines.append("    with np.errstate(over='ignore'):")
+    for opcode, destination, first_operand, second_operand in program.instructions:
+        operands = f"v{first_operand}" if opcode_inputs[opcode] == 1 else f"v{first_operand}, v{second_operand}"
+        lines.append(f"        v{destination} = k{opcode}({operands}, out=np.empty(nsamples, dtype=dtype))")
+
+    # one output is returned as it is, several are stacked into rows, see program_output
+    output_slots = program.output_slots.tolist()
+    if len(output_slots) > 1:
+        lines.append(f"    return np.stack([{', '.join(f'v{output_slot}' for output_slot in output_slots)}])")
+    elif output_slots[0] < program.ninputs:
+        lines.append(f"    return v{output_slots[0]}.copy()")
+    else:
+        lines.append(f"    return v{output_slots[0]}")
+    return "\n".join(lines) + "\n"
+
+def program_signature(program):
+    '''[summary]
+    Returns everything the generated function of the program depends on, programs with the same signature have the same generated function.
+    ### Parameters
+    1. program
+        - compiled program
+    ### Returns
+    tuple
+        - number of inputs, instructions, constants and output slots of the program
+    '''
+    return (program.ninputs, tuple(program.instructions), tuple(program.constants), tuple(program.output_slots.tolist()))
+
+def compile_generated_function(program):
+    '''[summary]
+    Generates the source code of the program and compiles it into a python function.
+    ### Parameters
+    1. program
+        - program to compile
+    ### Returns
+    Callable[[np.ndarray, np.dtype], np.ndarray]
+        - function returning the output of the program for the given input_matrix, evaluated in the given dtype
+    '''
+    namespace = {"np": np}
+    namespace.update({f"k{opcode}": kernel for opcode, kernel in enumerate(kernels)})
+    exec(compile(generate_source(program), "<generated cgp program>", "exec"), namespace)
+    return namespace[GENERATED_FUNCTION_NAME]
+
+class GeneratedFunctionCache:
+    def __init__(self, max_entries = 1024):
+        '''[summary]
+        Cache of generated functions keyed by phenotype hash, least recently used functions are evicted first.
+        Every function is cached with the signature of its program (see program_signature), a function of a different program
+        with the same hash is not used.
+        ### Parameters
+        1. max_entries
+            - maximum number of cached functions, 0 disables the cache
+        '''
+        self.max_entries = max_entries
+        self.functions = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.collisions = 0 # lookups of a phenotype hash cached for a different program
+
+    def __len__(self):
+        return len(self.functions)
+
+    def get_function(self, key, program):
+        '''[summary]
+        Returns the generated function of the program, generates and compiles it if it is not cached.
+        A function cached under the same key for a different program is replaced.
+        ### Parameters
+        1. key
+            - phenotype hash of the program
+        2. program
+            - program the function is generated from, when not cached
+        ### Returns
+        Callable[[np.ndarray], np.ndarray]
+            - generated function of the program
+        '''
+        signature = program_signature(program)
+        entry = self.functions.get(key)
+        if entry is not None:
+            function, cached_signature = entry
+            if cached_signature == signature:
+                self.hits += 1
+                self.functions.move_to_end(key)
+                return function
+            self.collisions += 1
+
+        self.misses += 1
+        function = compile_generated_function(program)
+        if self.max_entries > 0:
+            self.functions[key] = (function, signature)
+            self.functions.move_to_end(key)
+            if len(self.functions) > self.max_entries:
+                self.functions.popitem(last=False)
+        return function
+
+# shared by genome_output, the cache of a population is separate
+generated_function_cache = GeneratedFunctionCache()
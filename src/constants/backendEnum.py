@@ -0,0 +1,11 @@
+'''
+File: backendEnum.py
+Purpose: Contains the BackendEnum enum class of the ways programs are evaluated
+Author: Petr Bromnik
+'''
+
+import enum
+
+class BackendEnum(enum.Enum):
+	INTERPRETER = 1 # instructions of the compiled program are interpreted one by one
+	CODEGEN = 2 # experimental, the compiled program is turned into a generated python function, slower than INTERPRETER in all measured runs
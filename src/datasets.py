@@ -0,0 +1,153 @@
+'''
+File: datasets.py
+Purpose: Contains the registry of datasets (problems) the CGP algorithm is run on, datasets are loaded lazily
+Author: Petr Bromnik
+'''
+
+from collections.abc import Mapping
+import json
+import os
+import numpy as np
+
+def load_array(path):
+    '''[summary]
+    Loads an array from a .npy file, the file is memory mapped read only, so only the pages used are read
+    and processes loading the same file share them.
+    ### Parameters
+    1. path
+        - path of the .npy file
+    ### Returns
+    np.memmap
+        - array of the file
+    '''
+    return np.load(path, mmap_mode='r')
+
+def load_arrays(input_path, wanted_output_path = None):
+    '''[summary]
+    Loads the input and the wanted output of a dataset.
+    ### Parameters
+    1. input_path
+        - .npy file of the input matrix, or .npz file with arrays input and wanted_output
+    2. wanted_output_path
+        - .npy file of the wanted output, must be None for an .npz file
+    ### Returns
+    1. np.ndarray
+        - input matrix, one row per input
+    2. np.ndarray
+        - wanted output
+    Raises
+    ------
+    ValueError
+        - if the .npz file does not contain input and wanted_output
+        - if wanted_output_path is missing for a .npy file
+    '''
+    if input_path.endswith('.npz'):
+        # arrays in a zip archive cannot be memory mapped, they are read into memory
+        with np.load(input_path) as archive:
+            if 'input' not in archive or 'wanted_output' not in archive:
+                raise ValueError(f"{input_path} must contain arrays input and wanted_output")
+            return archive['input'], archive['wanted_output']
+
+    if wanted_output_path is None:
+        raise ValueError(f"wanted_output file is missing for {input_path}")
+    return load_array(input_path), load_array(wanted_output_path)
+
+class DatasetRegistry(Mapping):
+    def __init__(self):
+        '''[summary]
+        Registry of datasets, behaves as a read only dictionary of datasets by key.
+        A dataset is loaded on the first access and cached for the process, so registering datasets costs nothing.
+        Every dataset is a dictionary with keys:
+        - input: np.ndarray - input matrix, one row per input
+        - wanted_output: np.ndarray - expected output
+        - n_inputs: int - number of inputs
+        - name: str - name of the problem
+        - metadata given when the dataset was registered (for experiments n_columns and mutation_rate)
+        '''
+        self.loaders = {}
+        self.metadata = {}
+        self.loaded = {}
+
+    def __getitem__(self, key):
+        if key not in self.loaded:
+            if key not in self.loaders:
+                raise KeyError(key)
+            input_matrix, wanted_output = self.loaders[key]()
+            self.loaded[key] = {'input': input_matrix, 'wanted_output': wanted_output, 'n_inputs': len(input_matrix), 'name': key, **self.metadata[key]}
+        return self.loaded[key]
+
+    def __iter__(self):
+        return iter(self.loaders)
+
+    def __len__(self):
+        return len(self.loaders)
+
+    def is_loaded(self, key):
+        '''[summary]
+        Returns whether the dataset was already loaded in this process.
+        ### Parameters
+        1. key
+            - key of the dataset
+        ### Returns
+        bool
+            - True if the dataset is loaded
+        '''
+        return key in self.loaded
+
+    def register(self, key, loader, **metadata):
+        '''[summary]
+        Registers a dataset, replaces a dataset with the same key.
+        ### Parameters
+        1. key
+            - key of the dataset
+        2. loader
+            - function without parameters returning the input matrix and the wanted output, called on the first access
+        3. metadata
+            - other values of the dataset, for example name, n_columns and mutation_rate
+        ### Returns
+        None
+        '''
+        self.loaders[key] = loader
+        self.metadata[key] = metadata
+        self.loaded.pop(key, None)
+
+    def register_files(self, key, input_path, wanted_output_path = None, **metadata):
+        '''[summary]
+        Registers a dataset stored in files, see load_arrays. Large datasets should be stored in .npy files, they are memory mapped.
+        ### Parameters
+        1. key
+            - key of the dataset
+        2. input_path
+            - .npy file of the input matrix, or .npz file with arrays input and wanted_output
+        3. wanted_output_path
+            - .npy file of the wanted output, None for an .npz file
+        4. metadata
+            - other values of the dataset, see register
+        ### Returns
+        None
+        '''
+        self.register(key, lambda: load_arrays(input_path, wanted_output_path), **metadata)
+
+    def register_manifest(self, path):
+        '''[summary]
+        Registers all datasets of a manifest. The manifest is a json object of datasets by key, for example:
+        {"problem": {"input": "problem_input.npy", "wanted_output": "problem_output.npy", "name": "Problem", "n_columns": 100, "mutation_rate": 0.1}}
+        input and wanted_output are paths relative to the manifest, wanted_output is left out for an .npz file,
+        other values are metadata of the dataset.
+        ### Parameters
+        1. path
+            - path of the manifest
+        ### Returns
+        None
+        '''
+        directory = os.path.dirname(os.path.abspath(path))
+        with open(path) as f:
+            manifest = json.load(f)
+
+        for key, entry in manifest.items():
+            metadata = dict(entry)
+            input_path = os.path.join(directory, metadata.pop('input'))
+            wanted_output_path = metadata.pop('wanted_output', None)
+            if wanted_output_path is not None:
+                wanted_output_path = os.path.join(directory, wanted_output_path)
+            self.register_files(key, input_path, wanted_output_path, **metadata)
@@ -8,9 +8,9 @@ from one_plus_lambda import one_plus_lambda
 
 from genome import active_gene_transplant, subgraph_exchange
 import numpy as np
-from constants.functions import *
 from tournament_selection import tournament_selection
 from constants.algorithmEnum import AlgorithmEnum
+from constants.backendEnum import BackendEnum
 
 def evolve(population_size,
            ncolumns,
@@ -22,7 +22,14 @@ def evolve(population_size,
            mutation_rate,
            seed = None,
            algorithm = AlgorithmEnum.MUTATION_ONLY,
-           exchange_rate = 0.5):
+           exchange_rate = 0.5,
+           batch_evaluation = False,
+           backend = BackendEnum.INTERPRETER,
+           precision = np.float64,
+           streaming_chunk_size = None,
+           subset_size = None,
+           noutputs = 1,
+           return_statistics = False):
     '''[summary]
     Runs the 1 + lambda evolutionary algorithm to find a genome that solves the given problem.
     ### Parameters
@@ -39,7 +46,7 @@ def evolve(population_size,
         - input_matrix data for the function
         - must not be empty
     5. wanted_output: np.ndarray[float | int]
-        - expected output of the function
+        - expected output of the function, one row per output with several outputs (see noutputs)
         - must not be empty
     6. acceptable_boundary: float
         - acceptable fitness value
@@ -59,9 +66,37 @@ def evolve(population_size,
     11. exchange_rate: float
         - exchange rate of the algorithm
         - default 0.5
+    12. batch_evaluation: bool
+        - whether children of a generation are evaluated together in one batch, pays off for larger populations
+        - default False
+    13. backend: BackendEnum
+        - how children are evaluated, INTERPRETER runs compiled programs, CODEGEN calls generated python functions cached by phenotype hash
+        - CODEGEN is experimental, it was slower than INTERPRETER in all measured runs
+        - default INTERPRETER
+    14. precision: np.float64 | np.float32
+        - floating point type individuals are evaluated in during the search, np.float32 halves the memory traffic
+        - with np.float32, individuals close to acceptable_boundary and individuals better than all before them are evaluated again in np.float64,
+          so whether a solution was found and the returned fitness are exact
+        - default np.float64
+    15. streaming_chunk_size: int
+        - if set, individuals are evaluated in chunks of this many samples and only one chunk of node values is in memory,
+          input_matrix and wanted_output must then be np.ndarray, they can be np.memmap larger than memory
+        - default None, all samples are evaluated at once
+    16. subset_size: int
+        - if set, children are first evaluated on a fixed subset of this many samples stratified by wanted_output,
+          only children not worse than their parent on the subset are evaluated on all samples, solutions are always accepted on all samples
+        - used by MUTATION_ONLY, children of the tournament selection do not have a fitness cutoff
+        - default None, children are evaluated on all samples
+    17. noutputs: int
+        - number of output genes of the genome, for vector valued problems
+        - with several outputs, wanted_output has one row per output and the fitness is the sum of errors of all outputs
+        - default 1
+    18. return_statistics: bool
+        - whether the statistics of the fitness evaluations are returned as a 7th value
+        - default False
     ### Returns
-    1. List[List[int]]
-        - best individual found
+    1. np.ndarray
+        - best individual found, compact genome (see utils.to_genome_array)
     2. float
         - fitness of the best individual
     3. int
@@ -71,6 +106,14 @@ def evolve(population_size,
     5. List[dict]
         - list of dictionaries containing the top fitness and generation at each generation
         - [{"fitness": float, "generation": int}]
+    6. bool
+        - whether the solution was found
+    7. Dict[str, int]
+        - only if return_statistics is True, statistics of the fitness evaluations
+        - {"nominal_fitness_evaluations": int, "actual_fitness_evaluations": int, "skipped_fitness_evaluations": int,
+           "partial_fitness_evaluations": int, "screened_fitness_evaluations": int, ...}, see Population.get_evaluation_statistics
+        - nominal evaluations are counted as if every child was evaluated, actual are the really computed ones on all samples (including the first population)
+        - partial evaluations are on the subset of samples, screened children were not evaluated on all samples after them
     Raises
     ------
     ValueError
@@ -79,15 +122,17 @@ def evolve(population_size,
         - if ncolumns < 3
         - if len(input_matrix) == 0
         - if len(wanted_output) == 0
-        - if len(input matrix row) != len(wanted_output)
+        - if len(input matrix row) != number of samples of wanted_output
         - if acceptable_boundary < 0
+        - if precision is not np.float64 or np.float32
+        - if streaming_chunk_size is set and input_matrix or wanted_output is not np.ndarray (or np.memmap)
     '''
     if len(input_matrix) == 0:
         raise ValueError("input_matrix must not be empty")
     if len(wanted_output) == 0:
         raise ValueError("wanted_output must not be empty")
     for input_row in input_matrix:
-        if len(input_row) != len(wanted_output):
+        if len(input_row) != np.shape(wanted_output)[-1]:
             raise ValueError("input_row and wanted_output must have the same length")
     if acceptable_boundary < 0:
         raise ValueError("acceptable_boundary must be >= 0")
@@ -105,7 +150,14 @@ def evolve(population_size,
                         wanted_output,
                         acceptable_boundary,
                         max_fitness_evaluations,
-                        mutation_rate)
+                        mutation_rate,
+                        batch_evaluation=batch_evaluation,
+                        backend=backend,
+                        precision=precision,
+                        streaming_chunk_size=streaming_chunk_size,
+                        subset_size=subset_size,
+                        noutputs=noutputs,
+                        return_statistics=return_statistics)
     elif (algorithm == AlgorithmEnum.SUBGRAPH_EXCHANGE):
         return tournament_selection(population_size,
                         ncolumns,
@@ -116,7 +168,13 @@ def evolve(population_size,
                         max_fitness_evaluations,
                         mutation_rate,
                         exchange_rate,
-                        exchange_function=subgraph_exchange)
+                        exchange_function=subgraph_exchange,
+                        batch_evaluation=batch_evaluation,
+                        backend=backend,
+                        precision=precision,
+                        streaming_chunk_size=streaming_chunk_size,
+                        noutputs=noutputs,
+                        return_statistics=return_statistics)
     elif (algorithm ==  AlgorithmEnum.PASSIVE_ACTIVE_IMPLANTATION):
                 return tournament_selection(population_size,
                         ncolumns,
@@ -127,6 +185,12 @@ def evolve(population_size,
                         max_fitness_evaluations,
                         mutation_rate,
                         exchange_rate,
-                        exchange_function=active_gene_transplant)
+                        exchange_function=active_gene_transplant,
+                        batch_evaluation=batch_evaluation,
+                        backend=backend,
+                        precision=precision,
+                        streaming_chunk_size=streaming_chunk_size,
+                        noutputs=noutputs,
+                        return_statistics=return_statistics)
     else:
         raise ValueError("Unknown algorithm type")
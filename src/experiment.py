@@ -6,7 +6,7 @@ Author: Petr Bromnik
 
 import pandas as pd
 from constants.algorithmEnum import AlgorithmEnum, algorithm_names
-from constants.functions import *
+from constants.functions import functions
 from evolution import evolve
 from timeit import default_timer as timer
 import multiprocessing
@@ -47,17 +47,18 @@ def saveRun(algorithm, function, fitness_evaluations, generations, time, top_fit
 	with open('data-run-details.csv', 'a') as f:
 		run_details.to_csv(f, header=False, index=False)
 
-def runCGP(function, algorithm) -> None:
+def runCGP(function_key, algorithm) -> None:
 	'''[summary]
 	Runs the CGP algorithm on a specific function
 	### Parameters
-	1. function: dict
-		- function to run the algorithm on
+	1. function_key: str
+		- key of the function to run the algorithm on, the dataset is loaded in the process running the algorithm
 	2. algorithm: AlgorithmEnum
 		- algorithm to run the function with
 	### Returns
 	None
 	'''
+	function = functions[function_key]
 	run_id = uuid.uuid4()
 	seed = int(run_id) % 2**32 -1
 	start = timer()
@@ -101,12 +102,12 @@ def runFunction(function_key) -> None:
 	'''
 	for algorithm in AlgorithmEnum:
 		for _ in range(runs_per_function):
-			run = multiprocessing.Process(target=runCGP, args=(functions[function_key], algorithm,))
+			run = multiprocessing.Process(target=runCGP, args=(function_key, algorithm,))
 			run.start()
 
 def getCGPData() -> None:
 	'''[summary]
-	Runs the CGP algorithm on all functions in the constants/functions.py file
+	Runs the CGP algorithm on all functions in the dataset registry (constants/functions.py)
 	### Returns
 	None
 	'''
@@ -0,0 +1,197 @@
+'''
+File: fitness_cache.py
+Purpose: Contains the phenotype hashing and the fitness cache used in the CGP algorithm
+Author: Petr Bromnik
+'''
+
+from collections import OrderedDict
+from functools import reduce
+from operator import xor
+from utils import to_genome_array
+import numpy as np
+import sys
+
+def gene_hash(gene_index, gene):
+    '''[summary]
+    Returns hash of the gene at the given position in the genome
+    ### Parameters
+    1. gene_index
+        - index of the gene in the genome
+    2. gene
+        - gene to hash
+    ### Returns
+    int
+        - hash of the gene and its position
+    '''
+    return hash((gene_index, int(gene[0]), int(gene[1]), int(gene[2])))
+
+def phenotype_hash(genome, active_gene_indexes):
+    '''[summary]
+    Returns hash of the active genes of the genome, inactive genes do not change it.
+    The hash is a xor of hashes of all active genes, so it can be updated gene by gene (see update_phenotype_hash).
+    ### Parameters
+    1. genome
+        - genome to hash
+    2. active_gene_indexes
+        - indexes of active genes in the genome
+    ### Returns
+    int
+        - hash of the phenotype
+    '''
+    return reduce(xor, (gene_hash(gene_index, genome[gene_index]) for gene_index in active_gene_indexes), 0)
+
+def phenotype_genes(genome, active_gene_indexes):
+    '''[summary]
+    Returns the active genes of the genome with their positions, equal for equal phenotypes.
+    Stored with cached fitness results, so phenotypes with colliding hashes do not share a fitness.
+    ### Parameters
+    1. genome
+        - genome of the phenotype
+    2. active_gene_indexes
+        - indexes of active genes in the genome
+    ### Returns
+    bytes
+        - sorted active gene indexes followed by the active genes
+    '''
+    active_gene_indexes = np.array(sorted(active_gene_indexes), dtype=np.intp)
+    return active_gene_indexes.tobytes() + to_genome_array(genome)[active_gene_indexes].astype(np.int64).tobytes()
+
+def update_phenotype_hash(parent_hash, parent, parent_active_gene_indexes, child, child_active_gene_indexes, changed_gene_indexes):
+    '''[summary]
+    Returns phenotype hash of a child computed from the phenotype hash of its parent,
+    only genes that became active or inactive and changed active genes are hashed.
+    ### Parameters
+    1. parent_hash
+        - phenotype hash of the parent
+    2. parent
+        - genome of the parent
+    3. parent_active_gene_indexes
+        - indexes of active genes of the parent
+    4. child
+        - genome of the child
+    5. child_active_gene_indexes
+        - indexes of active genes of the child
+    6. changed_gene_indexes
+        - indexes of genes in which the child differs from the parent
+    ### Returns
+    int
+        - phenotype hash of the child, the same as phenotype_hash(child, child_active_gene_indexes)
+    '''
+    parent_active_genes = set(parent_active_gene_indexes)
+    child_active_genes = set(child_active_gene_indexes)
+
+    child_hash = parent_hash
+    for gene_index in parent_active_genes - child_active_genes:
+        child_hash ^= gene_hash(gene_index, parent[gene_index])
+    for gene_index in child_active_genes - parent_active_genes:
+        child_hash ^= gene_hash(gene_index, child[gene_index])
+    for gene_index in changed_gene_indexes:
+        if gene_index in parent_active_genes and gene_index in child_active_genes:
+            child_hash ^= gene_hash(gene_index, parent[gene_index]) ^ gene_hash(gene_index, child[gene_index])
+
+    return child_hash
+
+class FitnessCache:
+    def __init__(self, max_entries = 65536, max_bytes = 2**24):
+        '''[summary]
+        Cache of fitness results keyed by phenotype hash, least recently used entries are evicted first.
+        ### Parameters
+        1. max_entries
+            - maximum number of cached fitness results
+            - 0 disables the cache
+        2. max_bytes
+            - maximum estimated memory of cached fitness results
+        '''
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.collisions = 0 # lookups of a phenotype hash cached for a different phenotype
+
+    def __len__(self):
+        return len(self.entries)
+
+    def get(self, key, phenotype = None):
+        '''[summary]
+        Returns the cached fitness result for the given phenotype hash and marks it as recently used.
+        An entry of a different phenotype with the same hash is not returned.
+        ### Parameters
+        1. key
+            - phenotype hash
+        2. phenotype
+            - active genes of the phenotype, see phenotype_genes
+        ### Returns
+        Tuple[float, bool] | None
+            - cached fitness and acceptability, None if not cached
+        '''
+        entry = self.entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+
+        result, cached_phenotype = entry
+        if cached_phenotype != phenotype:
+            self.misses += 1
+            self.collisions += 1
+            return None
+
+        self.hits += 1
+        self.entries.move_to_end(key)
+        return result
+
+    def put(self, key, fitness, is_acceptable, phenotype = None):
+        '''[summary]
+        Caches the fitness result for the given phenotype hash, evicts least recently used entries over the limits.
+        An entry of a different phenotype with the same hash is replaced.
+        ### Parameters
+        1. key
+            - phenotype hash
+        2. fitness
+            - fitness of the phenotype
+        3. is_acceptable
+            - whether the phenotype is an acceptable solution
+        4. phenotype
+            - active genes of the phenotype, see phenotype_genes
+        ### Returns
+        None
+        '''
+        if self.max_entries <= 0:
+            return
+
+        entry = self.entries.get(key)
+        if entry is not None:
+            if entry[1] == phenotype:
+                self.entries.move_to_end(key)
+                return
+            del self.entries[key]
+            self.nbytes -= self.entry_size(key, *entry)
+
+        result = (fitness, is_acceptable)
+        self.entries[key] = (result, phenotype)
+        self.nbytes += self.entry_size(key, result, phenotype)
+
+        while len(self.entries) > self.max_entries or (self.nbytes > self.max_bytes and len(self.entries) > 0):
+            evicted_key, evicted_entry = self.entries.popitem(last=False)
+            self.nbytes -= self.entry_size(evicted_key, *evicted_entry)
+            self.evictions += 1
+
+    def entry_size(self, key, result, phenotype = None):
+        '''[summary]
+        Returns estimated memory of one cache entry (key, result tuple with its items, phenotype and a dictionary slot)
+        ### Returns
+        int
+            - estimated size in bytes
+        '''
+        return sys.getsizeof(key) + sys.getsizeof(result) + sys.getsizeof(result[0]) + 3 * sys.getsizeof(None) + (sys.getsizeof(phenotype) if phenotype is not None else 0)
+
+    def get_statistics(self):
+        '''[summary]
+        Returns the hit and miss statistics of the cache.
+        ### Returns
+        Dict[str, int]
+            - {"fitness_cache_hits": int, "fitness_cache_misses": int, "fitness_cache_evictions": int, "fitness_cache_collisions": int}
+        '''
+        return {"fitness_cache_hits": self.hits, "fitness_cache_misses": self.misses, "fitness_cache_evictions": self.evictions, "fitness_cache_collisions": self.collisions}
@@ -4,70 +4,44 @@ Purpose: Contains the genome operations used in the CGP algorithm
 Author: Petr Bromnik
 '''
 
-from constants.operations import operations, op_inputs, op_functions
-from utils import get_last_possible_input_index, get_number_of_op_inputs, is_input_gene, is_output_gene, random_bool
+from codegen import generated_function_cache
+from constants.backendEnum import BackendEnum
+from constants.operations import operations
+from fitness_cache import phenotype_hash
+from geometry import get_genome_geometry
+from program import allocate_registers, compile_program, program_output, run_program, run_programs, run_registers
+from utils import copy_genome, get_changed_gene_indexes, is_input_gene, is_output_gene, random_bool, to_genome_array
 import numpy as np
-from copy import deepcopy
 from math import floor
 
-def genome_output(genome, active_gene_indexes, input_matrix):
+# fitness of an evaluation stopped early, because the error was already greater than the cutoff given by selection
+# it is worse than any finite fitness, so such individual is never selected over the one that gave the cutoff
+WORSE_THAN_CUTOFF = np.inf
+
+def genome_output(genome, active_gene_indexes, input_matrix, backend = BackendEnum.INTERPRETER):
     '''[summary]
     ### Parameters
     1. genome
         - genome to calculate output for
-    2. input_matrix
+    2. active_gene_indexes
+        - indexes of active genes in the genome, in any order
+    3. input_matrix
         - list of input values to calculate output for
         - each list of input values is one input
+    4. backend
+        - INTERPRETER runs the compiled program instruction by instruction
+        - CODEGEN calls a generated python function, cached by phenotype hash of the genome, experimental, slower than INTERPRETER
 
     ### Returns
     np.ndarray
         - output of genome for given input values
-        - works with only one output gene (TODO if necessary)
+        - with several output genes, one row per output gene, all outputs are calculated in one pass over their active genes
     '''
-    n_input_nodes = len(input_matrix) # gen number of input nodes, base on parameter input_matrix
-    nrows = len(active_gene_indexes) + n_input_nodes # number of rows in matrix
-    ncols = len(input_matrix[0]) # number of columns in matrix
-
-    # mapping from gene index to matrix index, so we can use gene indexes to access the matrix, and the matrix can be only as big as the number of active nodes
-    gene_to_matrix_mapping = {key: value for key, value in zip(active_gene_indexes[::-1], range(n_input_nodes, nrows))}
-
-    matrix = np.full((nrows, ncols), 0.0)
-
-    # fill the matrix with input values
-    for i in range(n_input_nodes):
-        matrix[i] = input_matrix[i]
-        gene_to_matrix_mapping[i] = i
-
-    # fill the matrix with output of genes
-    for i in range(len(active_gene_indexes)):
-        for gene_index in active_gene_indexes:
-            gene = genome[gene_index]
-            gene_operation = gene[0]
-
-            # in case of input gene, skip it
-            if (gene_operation == -1):
-                continue
-
-            # in case of output gene, copy the input gene output
-            if (gene_operation == -2):
-                last_function_gene_index = gene[1]
-                matrix[gene_to_matrix_mapping[gene_index]] = matrix[gene_to_matrix_mapping[last_function_gene_index]]
-                continue
-
-            # function genes
-            n_of_op_inputs = op_inputs[operations[gene_operation]]
-            op_function = op_functions[operations[gene_operation]]
-
-            if n_of_op_inputs == 1:
-                first_input = matrix[gene_to_matrix_mapping[gene[1]]]
-                matrix[gene_to_matrix_mapping[gene_index]] = op_function(first_input)
-            elif n_of_op_inputs == 2:
-                first_input = matrix[gene_to_matrix_mapping[gene[1]]]
-                second_input = matrix[gene_to_matrix_mapping[gene[2]]]
-                matrix[gene_to_matrix_mapping[gene_index]] = op_function(first_input, second_input) # calculate the output of the gene
-
-    # return the last column (output column) of the matrix
-    return matrix[-1]
+    # active genes are compiled to a program, which evaluates every active gene once, after its inputs
+    program = compile_program(genome, active_gene_indexes, len(input_matrix))
+    if backend == BackendEnum.CODEGEN:
+        return generated_function_cache.get_function((len(input_matrix), phenotype_hash(genome, active_gene_indexes)), program)(input_matrix)
+    return program_output(program, run_program(program, input_matrix))
 
 def evaluate_fitness(genome, genome_active_path_indexes, input_matrix, wanted_output, max_difference=0.01):
     '''[summary]
@@ -86,14 +60,218 @@ def evaluate_fitness(genome, genome_active_path_indexes, input_matrix, wanted_ou
         - fitness of genome for given input values and wanted output
         - value >= 0.0
     '''
-    output = genome_output(genome, genome_active_path_indexes, input_matrix)
+    program = compile_program(genome, genome_active_path_indexes, len(input_matrix))
+    return evaluate_program_fitness(program, input_matrix, wanted_output, max_difference)
+
+def evaluate_program_fitness(program, input_matrix, wanted_output, max_difference=0.01):
+    '''[summary]
+    Returns fitness of a compiled genome for given input values and wanted output, see evaluate_fitness.
+    ### Parameters
+    1. program
+        - compiled active genes of the genome to calculate fitness for
+    2. input_matrix
+        - list of input values to calculate output for
+        - each list of input values is one input
+    3. wanted_output
+        - list of wanted output values
+    ### Returns
+    float
+        - fitness of genome for given input values and wanted output
+        - value >= 0.0
+    bool
+        - True if the output is an acceptable solution
+    '''
+    output = program_output(program, run_program(program, input_matrix))
+    return output_fitness(output, wanted_output, max_difference)
+
+def evaluate_programs_fitness(programs, input_matrix, wanted_output, max_difference=0.01, dtype=np.float64):
+    '''[summary]
+    Returns fitnesses of several compiled genomes, evaluated together in one batch, see evaluate_program_fitness.
+    ### Parameters
+    1. programs
+        - compiled active genes of the genomes to calculate fitness for
+    2. input_matrix
+        - list of input values to calculate output for
+        - each list of input values is one input
+    3. wanted_output
+        - list of wanted output values
+    4. max_difference
+        - maximum difference between output and wanted_output of an acceptable solution
+    5. dtype
+        - floating point type the genomes are evaluated in
+    ### Returns
+    List[Tuple[float, bool]]
+        - fitness and acceptability of each genome
+    '''
+    outputs = run_programs(programs, input_matrix, dtype)
+    return [output_fitness(output, wanted_output, max_difference) for output in outputs]
+
+def output_fitness(output, wanted_output, max_difference):
+    '''[summary]
+    Returns fitness of the given output of a genome, the sum of absolute errors, and whether it is an acceptable solution.
+    With several outputs, the errors of all outputs are summed and every output must be within max_difference.
+    ### Parameters
+    1. output
+        - output of the genome, one row per output gene with several output genes
+    2. wanted_output
+        - list of wanted output values, one row per output with several outputs
+    3. max_difference
+        - maximum difference between output and wanted_output of an acceptable solution
+    ### Returns
+    float
+        - fitness of the output
+    bool
+        - True if the output is an acceptable solution
+    '''
     mae = np.absolute(np.subtract(wanted_output, output)).sum()
     if (mae < 0):
         raise ValueError("overflow, mean squared error is negative, something went wrong with the fitness calculation")
     is_acceptable = is_acceptable_solution(output, wanted_output, max_difference)
     return mae, is_acceptable
 
-def mutate_individual(target, ncolumns, nrows, mutation_rate):
+def chunked_output_fitness(output_chunks, wanted_output, max_difference, fitness_cutoff = np.inf):
+    '''[summary]
+    Returns fitness of an output calculated in chunks of samples, see output_fitness.
+    Chunks are consumed one by one and the evaluation stops as soon as the error of the chunks so far is greater than fitness_cutoff
+    and their maximum difference already makes the solution unacceptable, then WORSE_THAN_CUTOFF is returned as fitness.
+    ### Parameters
+    1. output_chunks
+        - iterable of consecutive chunks of the output, best a generator calculating them lazily
+    2. wanted_output
+        - list of wanted output values for all samples
+    3. max_difference
+        - maximum difference between output and wanted_output of an acceptable solution
+    4. fitness_cutoff
+        - fitness above which the exact fitness is not needed
+    ### Returns
+    float
+        - fitness of the output (the same as output_fitness of the whole output), or WORSE_THAN_CUTOFF
+    bool
+        - True if the output is an acceptable solution
+    '''
+    margin = get_cutoff_margin(fitness_cutoff, np.size(wanted_output))
+    errors = []
+    partial_error = 0.0
+    partial_max_difference = 0.0
+    start = 0
+    for output in output_chunks:
+        end = start + np.shape(output)[-1]
+        chunk_errors = np.absolute(np.subtract(wanted_output[..., start:end], output))
+        errors.append(chunk_errors)
+        partial_error += chunk_errors.sum()
+        partial_max_difference = max(partial_max_difference, chunk_errors.max())
+        start = end
+
+        if partial_error > fitness_cutoff + margin and partial_max_difference > max_difference:
+            return WORSE_THAN_CUTOFF, False
+
+    errors = np.concatenate(errors, axis=-1)
+    mae = errors.sum()
+    if (mae < 0):
+        raise ValueError("overflow, mean squared error is negative, something went wrong with the fitness calculation")
+    return mae, errors.max() <= max_difference
+
+def get_cutoff_margin(fitness_cutoff, nerrors):
+    '''[summary]
+    Returns the margin of fitness_cutoff for errors summed chunk by chunk, partial sums are rounded differently than the sum of all errors,
+    the margin keeps individuals exactly at the cutoff from being stopped.
+    ### Parameters
+    1. fitness_cutoff
+        - fitness above which the exact fitness is not needed
+    2. nerrors
+        - number of summed errors (samples times outputs)
+    ### Returns
+    float
+        - margin, 0.0 without a finite cutoff
+    '''
+    return abs(fitness_cutoff) * nerrors * np.finfo(float).eps if np.isfinite(fitness_cutoff) else 0.0
+
+def evaluate_fitness_streaming(genome, genome_active_path_indexes, input_chunks, wanted_output_chunks, max_difference=0.01, dtype=np.float64):
+    '''[summary]
+    Returns fitness of genome evaluated chunk by chunk, for training sets larger than memory, see evaluate_program_fitness_streaming.
+    ### Parameters
+    1. genome
+        - genome to calculate fitness for
+    2. genome_active_path_indexes
+        - indexes of active genes in the genome
+    3. input_chunks
+        - chunks of input values, each chunk has one row per input
+    4. wanted_output_chunks
+        - chunks of wanted output values, matching the input chunks
+    5. max_difference
+        - maximum difference between output and wanted_output of an acceptable solution
+    6. dtype
+        - floating point type the genome is evaluated in
+    ### Returns
+    float
+        - fitness of genome
+    bool
+        - True if the genome is an acceptable solution
+    '''
+    ninputs = sum(1 for gene in genome if is_input_gene(gene))
+    program = compile_program(genome, genome_active_path_indexes, ninputs)
+    return evaluate_program_fitness_streaming(program, input_chunks, wanted_output_chunks, max_difference, dtype)
+
+def evaluate_program_fitness_streaming(program, input_chunks, wanted_output_chunks, max_difference=0.01, dtype=np.float64, fitness_cutoff=np.inf):
+    '''[summary]
+    Returns fitness of a compiled genome evaluated chunk by chunk, only one chunk of inputs and outputs is in memory at once.
+    Values of the active genes are kept in registers reused once they are not needed (see allocate_registers),
+    so the memory needed is about chunk size * maximum number of live values, not chunk size * number of active genes.
+    The absolute error and the maximum difference are accumulated over the chunks, the fitness can differ from evaluate_fitness
+    in the last bits, as it is summed per chunk.
+    ### Parameters
+    1. program
+        - compiled active genes of the genome
+    2. input_chunks
+        - chunks of input values, each chunk has one row per input (see iterate_chunks for np.memmap)
+        - the chunks are consumed, every evaluation needs new chunks (e.g. a new iterate_chunks of the same data)
+    3. wanted_output_chunks
+        - chunks of wanted output values, matching the input chunks
+    4. max_difference
+        - maximum difference between output and wanted_output of an acceptable solution
+    5. dtype
+        - floating point type the genome is evaluated in
+    6. fitness_cutoff
+        - the evaluation stops as soon as the error is greater than fitness_cutoff and the solution cannot be acceptable,
+          then WORSE_THAN_CUTOFF is returned as fitness, see chunked_output_fitness
+    ### Returns
+    float
+        - fitness of genome, or WORSE_THAN_CUTOFF
+    bool
+        - True if the genome is an acceptable solution
+    Raises
+    ------
+    ValueError
+        - if the chunks have no samples, e.g. they were already consumed
+    '''
+    register_instructions, output_registers, nregisters, register_constants = allocate_registers(program)
+    buffer = np.empty((nregisters, 0), dtype=dtype)
+    error = 0.0
+    max_error = 0.0
+    nerrors = 0
+    for input_chunk, wanted_output_chunk in zip(input_chunks, wanted_output_chunks):
+        input_chunk = np.asarray(input_chunk, dtype=dtype)
+        nsamples = input_chunk.shape[-1]
+        if buffer.shape[1] < nsamples:
+            buffer = np.empty((nregisters, nsamples), dtype=dtype)
+
+        registers = run_registers(register_instructions, input_chunk, buffer[:, :nsamples], register_constants)
+        output = registers[output_registers[0]] if len(output_registers) == 1 else np.stack([registers[output_register] for output_register in output_registers])
+        chunk_errors = np.absolute(np.subtract(wanted_output_chunk, output))
+        error += chunk_errors.sum()
+        max_error = max(max_error, chunk_errors.max())
+        nerrors += chunk_errors.size
+
+        if error > fitness_cutoff + get_cutoff_margin(fitness_cutoff, nerrors) and max_error > max_difference:
+            return WORSE_THAN_CUTOFF, False
+
+    if nerrors == 0:
+        raise ValueError("no samples to evaluate, input_chunks and wanted_output_chunks must not be empty or already consumed")
+    if (error < 0):
+        raise ValueError("overflow, mean squared error is negative, something went wrong with the fitness calculation")
+    return error, max_error <= max_difference
+
+def mutate_individual(target, ncolumns, nrows, mutation_rate, geometry = None):
     '''[summary]
     Returns mutated individual, without changing the original
     ### Parameters
@@ -105,32 +283,218 @@ def mutate_individual(target, ncolumns, nrows, mutation_rate):
         - number of rows in the matrix of genes
     4. mutation_rate
         - mutation rate of the algorithm
+    5. geometry
+        - geometry of the genome (see geometry.GenomeGeometry), default None, the shared geometry for ncolumns and nrows is used
     ### Returns
-    List[List[int]]
-        - mutated individual
+    np.ndarray
+        - mutated individual, compact genome (see utils.to_genome_array)
     '''
-    # deep copy the target, so we don't change the original
-    individual = deepcopy(target)
-    genome_length = len(individual)
+    individual, _ = mutate_individual_with_changes(target, ncolumns, nrows, mutation_rate, geometry)
+    return individual
+
+def mutate_individual_with_changes(target, ncolumns, nrows, mutation_rate, geometry = None):
+    '''[summary]
+    Returns mutated individual, without changing the original, together with indexes of the genes that were mutated.
+    See mutate_individual_delta, the random draws are the same.
+    ### Parameters
+    1. target
+        - individual to mutate
+    2. ncolumns
+        - number of columns in the matrix of genes
+    3. nrows
+        - number of rows in the matrix of genes
+    4. mutation_rate
+        - mutation rate of the algorithm
+    5. geometry
+        - geometry of the genome, default None, the shared geometry for ncolumns and nrows is used
+    ### Returns
+    1. np.ndarray
+        - mutated individual, compact genome
+    2. List[int]
+        - sorted indexes of mutated genes
+    '''
+    mutated_gene_indexes, mutated_genes = mutate_individual_delta(target, ncolumns, nrows, mutation_rate, geometry)
+    return apply_genome_delta(copy_genome(target), mutated_gene_indexes, mutated_genes), mutated_gene_indexes
+
+def mutate_individual_delta(target, ncolumns, nrows, mutation_rate, geometry = None):
+    '''[summary]
+    Returns the mutated genes of a child of the individual, the individual is neither changed nor copied, only the mutated genes are.
+    The child is the individual with the mutated genes (see apply_genome_delta).
+    Every mutation changes one allele chosen uniformly from the alleles that can be mutated (see GenomeGeometry.get_mutable_positions)
+    to a different valid value, random numbers of all mutations are drawn in one call.
+    ### Parameters
+    1. target
+        - individual to mutate
+    2. ncolumns
+        - number of columns in the matrix of genes
+    3. nrows
+        - number of rows in the matrix of genes
+    4. mutation_rate
+        - mutation rate of the algorithm
+    5. geometry
+        - geometry of the genome, default None, the shared geometry for ncolumns and nrows is used
+    ### Returns
+    1. List[int]
+        - sorted indexes of mutated genes
+    2. np.ndarray
+        - mutated genes, one row per index
+    '''
+    if geometry is None:
+        geometry = get_genome_geometry(ncolumns, nrows)
+
+    target = to_genome_array(target)
+    genome_length = len(target)
     n_of_genes_to_mutate = floor(genome_length * mutation_rate + 1)
+    mutated_genes = {} # copies of the mutated genes by index, the target is not changed
 
-    for i in range(n_of_genes_to_mutate):
-        success = False
-        mutated_gene = []
+    mutable_positions = geometry.get_mutable_positions(target)
+    if len(mutable_positions) == 0:
+        return [], np.empty((0, 3), dtype=target.dtype)
 
-        # find a gene that can be mutated
-        while(not success):
-            gene_index_to_mutate = np.random.randint(genome_length)
-            gene = individual[gene_index_to_mutate]
-            mutated_gene, success = mutate_gene(gene, gene_index_to_mutate, ncolumns, nrows)
+    # for every mutation: the mutated allele, its new value and an input added by a change of operation
+    draws = np.random.random((3, n_of_genes_to_mutate))
+    positions = mutable_positions[(draws[0] * len(mutable_positions)).astype(int)].tolist()
 
-        individual[gene_index_to_mutate] = mutated_gene
+    for position, value_draw, input_draw in zip(positions, draws[1].tolist(), draws[2].tolist()):
+        gene_index_to_mutate, allele_to_mutate = divmod(position, 3)
+        gene = mutated_genes.get(gene_index_to_mutate)
+        if gene is None:
+            gene = target[gene_index_to_mutate].tolist()
 
-    return individual
+        # the second input was removed by an earlier change of operation of the same gene, the allele is drawn again
+        if gene[allele_to_mutate] < 0:
+            individual = apply_genome_delta(target.copy(), list(mutated_genes.keys()), list(mutated_genes.values()))
+            mutable_positions = geometry.get_mutable_positions(individual)
+            gene_index_to_mutate, allele_to_mutate = divmod(int(mutable_positions[np.random.randint(len(mutable_positions))]), 3)
+            gene = individual[gene_index_to_mutate].tolist()
+
+        mutate_allele(gene, gene_index_to_mutate, allele_to_mutate, value_draw, input_draw, geometry)
+        mutated_genes[gene_index_to_mutate] = gene
+
+    mutated_gene_indexes = sorted(mutated_genes)
+    return mutated_gene_indexes, np.array([mutated_genes[gene_index] for gene_index in mutated_gene_indexes], dtype=target.dtype).reshape(-1, 3)
+
+def apply_genome_delta(genome, gene_indexes, genes):
+    '''[summary]
+    Writes the changed genes into the genome (changes the original)
+    ### Parameters
+    1. genome
+        - compact genome to change
+    2. gene_indexes
+        - indexes of the changed genes
+    3. genes
+        - changed genes, one per index
+    ### Returns
+    np.ndarray
+        - the changed genome
+    '''
+    if len(gene_indexes) > 0:
+        genome[gene_indexes] = genes
+    return genome
+
+def mutate_individual_in_place(individual, ncolumns, nrows, mutation_rate, geometry = None):
+    '''[summary]
+    Mutates the individual in place, the random draws are the same as in mutate_individual
+    ### Parameters
+    1. individual
+        - compact genome to mutate, it is changed
+    2. ncolumns
+        - number of columns in the matrix of genes
+    3. nrows
+        - number of rows in the matrix of genes
+    4. mutation_rate
+        - mutation rate of the algorithm
+    5. geometry
+        - geometry of the genome, default None, the shared geometry for ncolumns and nrows is used
+    ### Returns
+    List[int]
+        - sorted indexes of mutated genes
+    '''
+    mutated_gene_indexes, mutated_genes = mutate_individual_delta(individual, ncolumns, nrows, mutation_rate, geometry)
+    apply_genome_delta(individual, mutated_gene_indexes, mutated_genes)
+    return mutated_gene_indexes
 
-def mutate_gene(gene, gene_index, ncolumns, nrows):
+def crossover_and_mutate(receiver, receiver_active_path, donor, donor_active_path, exchange_rate, exchange_function, ncolumns, nrows, mutation_rate, geometry = None, child = None):
     '''[summary]
-    Returns mutated gene (may mutate the original)
+    Returns child of the receiver and the donor made by the exchange function and mutated, the child is built in one genome:
+    the exchange writes the receiver with the exchanged genes into it and the mutation changes it in place.
+    ### Parameters
+    1. receiver
+        - parent genome the child is made from
+    2. receiver_active_path
+        - active gene indexes of the receiver
+    3. donor
+        - parent genome genes are exchanged from
+    4. donor_active_path
+        - active gene indexes of the donor
+    5. exchange_rate
+        - exchange rate of the algorithm
+    6. exchange_function
+        - active_gene_transplant or subgraph_exchange
+    7. ncolumns
+        - number of columns in the matrix of genes
+    8. nrows
+        - number of rows in the matrix of genes
+    9. mutation_rate
+        - mutation rate of the algorithm
+    10. geometry
+        - geometry of the genome, default None, the shared geometry for ncolumns and nrows is used
+    11. child
+        - compact genome the child is written to, must not be the receiver or the donor
+        - default None, a new genome is made
+    ### Returns
+    1. np.ndarray
+        - child genome, compact genome
+    2. List[int]
+        - sorted indexes of genes in which the child differs from the receiver
+    '''
+    child = exchange_function(receiver, receiver_active_path, donor, donor_active_path, exchange_rate, nrows, child=child)
+    mutate_individual_in_place(child, ncolumns, nrows, mutation_rate, geometry)
+    return child, get_changed_gene_indexes(receiver, child)
+
+def mutate_allele(gene, gene_index, allele_to_mutate, value_draw, input_draw, geometry):
+    '''[summary]
+    Changes the allele of the gene (changes the original) to a value chosen uniformly from the other valid values.
+    A new value is picked from the other values directly, so it never has to be drawn again.
+    ### Parameters
+    1. gene
+        - gene to mutate
+    2. gene_index
+        - index of the gene in the genome
+    3. allele_to_mutate
+        - index of the allele in the gene, must be a mutable allele (see GenomeGeometry.get_mutable_positions)
+    4. value_draw
+        - random number from [0, 1) choosing the new value
+    5. input_draw
+        - random number from [0, 1) choosing an input the new operation needs and the gene did not have
+    6. geometry
+        - geometry of the genome
+    ### Returns
+    None
+    '''
+    last_possible_input_index = geometry.last_possible_input_index_list[gene_index]
+    original = int(gene[allele_to_mutate])
+    nvalues = len(operations) if allele_to_mutate == 0 else last_possible_input_index
+
+    # values other than the original, the original is skipped
+    mutated = floor(value_draw * (nvalues - 1))
+    if mutated >= original:
+        mutated += 1
+
+    # in case the mutation is changing the operation, prepare the inputs for the new operation
+    if allele_to_mutate == 0:
+        operation_inputs = geometry.operation_input_list[mutated]
+        for input_number in range(1, len(gene)):
+            if input_number <= operation_inputs and gene[input_number] == -1:
+                gene[input_number] = floor(input_draw * last_possible_input_index)
+            elif input_number > operation_inputs and gene[input_number] != -1:
+                gene[input_number] = -1
+    gene[allele_to_mutate] = mutated
+
+def mutate_gene(gene, gene_index, ncolumns, nrows, geometry = None):
+    '''[summary]
+    Returns mutated gene (may mutate the original), one allele chosen uniformly from the alleles that can be mutated
+    (see GenomeGeometry.get_mutable_positions) is changed to a different valid value
     ### Parameters
     1. gene
         - gene to mutate
@@ -140,50 +504,26 @@ def mutate_gene(gene, gene_index, ncolumns, nrows):
         - number of columns in the matrix of genes
     4. nrows
         - number of rows in the matrix of genes
+    5. geometry
+        - geometry of the genome, default None, the shared geometry for ncolumns and nrows is used
     ### Returns
     List[int]
         - mutated gene
     bool
-        - True if gene was successfully mutated, False otherwise
-    Raises
-    ------
-    - Exception
-        - if last_possible_input_index is 0, meaning that an internal error occured
-    ### 
+        - True if gene was successfully mutated, False if none of its alleles can be mutated
     '''
-    allele_to_mutate = np.random.randint(0, len(gene))
+    if geometry is None:
+        geometry = get_genome_geometry(ncolumns, nrows)
 
-    if gene[allele_to_mutate] == -1 or gene[allele_to_mutate] == -2:
+    mutable_alleles = [allele for allele in range(len(gene)) if gene[allele] >= 0 and geometry.mutable_alleles[gene_index, allele]]
+    if len(mutable_alleles) == 0:
         return gene, False
 
-    mutation_to_be_done = True
-    while(mutation_to_be_done):
-        original = gene[allele_to_mutate]
-
-        # if the gene is an operation, mutate it to another operation
-        if allele_to_mutate == 0:
-            mutated = np.random.randint(0, len(operations))
-        # if the gene is an input, mutate it to another (correct) input
-        else:
-            last_possible_input_index = get_last_possible_input_index(ncolumns, nrows, gene_index)
-            if (last_possible_input_index <= 0):
-                raise Exception(f"last_possible_input_index is: {last_possible_input_index}, gene_index is: {gene_index}, ncolumns is: {ncolumns}, nrows is: {nrows}")
-            elif (last_possible_input_index == 1):
-                return gene, False # impossible to mutate input, if there is only one option available
-
-            mutated = np.random.randint(0, last_possible_input_index)
-
-        # if the gene was successfully mutated, stop the loop
-        if original != mutated:
-            # in case the mutation is changing the operation, prepare the inputs for the new operation
-            if allele_to_mutate == 0:
-                format_inputs_for_new_operation(gene, gene_index, mutated, nrows)
-            gene[allele_to_mutate] = mutated
-            mutation_to_be_done = False
-
+    allele_draw, value_draw, input_draw = np.random.random(3).tolist()
+    mutate_allele(gene, gene_index, mutable_alleles[floor(allele_draw * len(mutable_alleles))], value_draw, input_draw, geometry)
     return gene, True
 
-def active_gene_transplant(receiver, receiver_active_path, donor, donor_active_path, exchange_rate, nrows = 1):
+def active_gene_transplant(receiver, receiver_active_path, donor, donor_active_path, exchange_rate, nrows = 1, child = None):
     '''[summary]
     Returns child genome from two parent genomes using recombination 1
     ### Parameters
@@ -191,21 +531,23 @@ def active_gene_transplant(receiver, receiver_active_path, donor, donor_active_p
         - first parent genome
     2. receiver
         - second parent genome
+    3. child
+        - compact genome the child is written to, must not be the receiver or the donor
+        - default None, a new genome is made
     ### Returns
-    List[List[int]]
-        - child genome
+    np.ndarray
+        - child genome, compact genome (see utils.to_genome_array)
     '''
-    # deep copy the parents, so we don't change the original
-    child = deepcopy(receiver)
+    # copy the receiver, so we don't change the original
+    child = copy_receiver(receiver, child)
 
-    exchange_indexes = [gene for gene in donor_active_path if gene not in receiver_active_path and random_bool(exchange_rate)]
-    for exchange_index in exchange_indexes:
-        donor_gene = donor[exchange_index].copy()
-        child[exchange_index] = donor_gene
+    receiver_active_genes = set(receiver_active_path)
+    exchange_indexes = [gene for gene in donor_active_path if gene not in receiver_active_genes and random_bool(exchange_rate)]
+    child[exchange_indexes] = to_genome_array(donor)[exchange_indexes]
 
     return child
 
-def subgraph_exchange(receiver, receiver_active_path, donor, donor_active_path, exchange_rate, nrows):
+def subgraph_exchange(receiver, receiver_active_path, donor, donor_active_path, exchange_rate, nrows, child = None):
     '''[summary]
     Returns child genome from two parent genomes using recombination 2
     ### Parameters
@@ -213,30 +555,54 @@ def subgraph_exchange(receiver, receiver_active_path, donor, donor_active_path,
         - first parent genome
     2. parent2
         - second parent genome
+    3. child
+        - compact genome the child is written to, must not be the receiver or the donor
+        - default None, a new genome is made
     ### Returns
-    List[List[int]]
-        - child genome
+    np.ndarray
+        - child genome, compact genome (see utils.to_genome_array)
     '''
 
-    # deep copy the parents, so we don't change the original
-    child = deepcopy(receiver)
+    # copy the receiver, so we don't change the original
+    child = copy_receiver(receiver, child)
 
-    possible_exchange_indexes = [gene for gene in receiver_active_path if gene in donor_active_path]
+    # in the order of the receiver active path, so the same gene is drawn for the same random number
+    donor_active_genes = set(donor_active_path)
+    possible_exchange_indexes = [gene for gene in receiver_active_path if gene in donor_active_genes]
     exchange_index = np.random.choice(possible_exchange_indexes)
 
-    receiver_flags = [False for _ in range(len(receiver))]
-    exchange(receiver=child, receiver_flags=receiver_flags, receiver_index=exchange_index, donor=donor, donor_index=exchange_index, exchange_rate=exchange_rate, nrows=nrows)
+    receiver_flags = bytearray(len(child)) # exchanged genes of the receiver
+    geometry = get_genome_geometry(len(child) // nrows, nrows)
+    exchange(child, receiver_flags, exchange_index, donor, exchange_index, exchange_rate, nrows, geometry)
     return child
 
+def copy_receiver(receiver, child = None):
+    '''[summary]
+    Returns copy of the receiver the exchange functions make the child from
+    ### Parameters
+    1. receiver
+        - parent genome the child is made from
+    2. child
+        - compact genome the receiver is copied to, default None, a new genome is made
+    ### Returns
+    np.ndarray
+        - copy of the receiver, compact genome
+    '''
+    if child is None:
+        return copy_genome(receiver)
+    np.copyto(child, receiver)
+    return child
 
-def exchange(receiver, receiver_flags, receiver_index, donor, donor_index, exchange_rate, nrows):
+def exchange(receiver, receiver_flags, receiver_index, donor, donor_index, exchange_rate, nrows, geometry = None):
     '''[summary]
-    Recursively exchanges the genes between the receiver and the donor
+    Exchanges the genes between the receiver and the donor, from the given pair of genes towards the inputs.
+    Genes are visited depth first with an explicit stack, in the same order and with the same random draws as a recursion would,
+    so deep genomes do not reach the recursion limit. Output genes are not exchanged, the genes they read are.
     ### Parameters
     1. receiver
-        - genome of the receiver
+        - compact genome of the receiver, it is changed
     2. receiver_flags
-        - flags for each gene in receiver, if it was already exchanged
+        - flags for each gene in receiver, if it was already exchanged (e.g. bytearray or list of bool), they are set
     3. receiver_index
         - index of the gene in the receiver
     4. donor
@@ -247,51 +613,57 @@ def exchange(receiver, receiver_flags, receiver_index, donor, donor_index, excha
         - exchange rate of the algorithm
     7. nrows
         - number of rows in the matrix of genes
+    8. geometry
+        - geometry of the genome, default None, see format_inputs_for_new_operation
     ### Returns
     None
     '''
-    if receiver_flags[receiver_index]:
-        return
-    
-    receiver_gene = receiver[receiver_index]
-    donor_gene = donor[donor_index]
-    if is_input_gene(receiver_gene) or is_input_gene(donor_gene):
-        return
-    
-    if is_output_gene(receiver_gene):
-        if is_output_gene(donor_gene):
-            exchange(receiver=receiver,
-                        receiver_flags=receiver_flags,
-                        receiver_index=receiver_gene[1],
-                        donor=donor,
-                        donor_index=donor_gene[1],
-                        exchange_rate=exchange_rate,
-                        nrows=nrows)
-            return
-        else:
-            raise Exception("output gene mismatch in subgraph exchange")
-        
-    next_receiver_genes = []
-    next_donor_genes = []
-    for i in range(1, len(receiver_gene)):
-        if receiver_gene[i] != -1 and donor_gene[i] != -1 and random_bool(exchange_rate):
-            next_receiver_genes.append(receiver_gene[i])
-            next_donor_genes.append(donor_gene[i])
-    
-    format_inputs_for_new_operation(receiver[receiver_index], receiver_index, donor_gene[0], nrows)
-    receiver_gene[0] = donor_gene[0]
-    receiver_flags[receiver_index] = True
-
-    for i in range(len(next_receiver_genes)):
-        exchange(receiver=receiver,
-                    receiver_flags=receiver_flags,
-                    receiver_index=next_receiver_genes[i],
-                    donor=donor,
-                    donor_index=next_donor_genes[i],
-                    exchange_rate=exchange_rate,
-                    nrows=nrows)
-
-def format_inputs_for_new_operation(gene, gene_index, new_operation, nrows):
+    donor = to_genome_array(donor)
+    stack = [(receiver_index, donor_index)] # pairs of genes to exchange, the last is exchanged first
+
+    while stack:
+        receiver_index, donor_index = stack.pop()
+        # with several outputs, output genes can read other output genes, both sides are followed to the genes they read
+        receiver_index = get_read_gene_index(receiver, receiver_index)
+        donor_index = get_read_gene_index(donor, donor_index)
+        if receiver_flags[receiver_index]:
+            continue
+
+        receiver_gene = receiver[receiver_index].tolist()
+        donor_gene = donor[donor_index].tolist()
+        if is_input_gene(receiver_gene) or is_input_gene(donor_gene):
+            continue
+
+        next_genes = []
+        for i in range(1, len(receiver_gene)):
+            if receiver_gene[i] != -1 and donor_gene[i] != -1 and random_bool(exchange_rate):
+                next_genes.append((receiver_gene[i], donor_gene[i]))
+
+        format_inputs_for_new_operation(receiver_gene, receiver_index, donor_gene[0], nrows, geometry)
+        receiver_gene[0] = donor_gene[0]
+        receiver[receiver_index] = receiver_gene
+        receiver_flags[receiver_index] = True
+
+        # reversed, so the inputs are exchanged in their order, each with all its inputs before the next one
+        stack.extend(reversed(next_genes))
+
+def get_read_gene_index(genome, gene_index):
+    '''[summary]
+    Returns index of the gene read through the given gene, output genes are followed to the (input or function) gene they read
+    ### Parameters
+    1. genome
+        - compact genome
+    2. gene_index
+        - index of the gene in the genome
+    ### Returns
+    int
+        - index of the first gene that is not an output gene
+    '''
+    while is_output_gene(genome[gene_index]):
+        gene_index = int(genome[gene_index][1])
+    return gene_index
+
+def format_inputs_for_new_operation(gene, gene_index, new_operation, nrows, geometry = None):
     '''[summary]
     Prepares the given gene for a change of operation allele, by changing the inputs to match the new operation.
     Shortened inputs are set to -1, if a new input is needed, it is set to a random (in bounds) value.
@@ -304,12 +676,16 @@ def format_inputs_for_new_operation(gene, gene_index, new_operation, nrows):
         - new operation to be inside gene
     4. nrows
         - number of rows in the matrix of genes
+    5. geometry
+        - geometry of the genome, default None, a geometry with the column of the gene is used
     '''
-    ncolumns = len(gene) / nrows
-    operation_inputs = get_number_of_op_inputs(new_operation)
+    if geometry is None:
+        geometry = get_genome_geometry(gene_index // nrows + 1, nrows)
+
+    operation_inputs = geometry.operation_input_list[new_operation]
     for input_number in range(1, len(gene)):
         if input_number <= operation_inputs and gene[input_number] == -1:
-            gene[input_number] = np.random.randint(get_last_possible_input_index(ncolumns, nrows, gene_index))
+            gene[input_number] = np.random.randint(geometry.last_possible_input_index_list[gene_index])
         elif input_number > operation_inputs and gene[input_number] != -1:
             gene[input_number] = -1
 
@@ -0,0 +1,95 @@
+'''
+File: geometry.py
+Purpose: Contains the GenomeGeometry class, tables of the genome layout precomputed once per number of columns and rows
+Author: Petr Bromnik
+'''
+
+from constants.operations import operations, op_inputs
+from functools import lru_cache
+import numpy as np
+
+class GenomeGeometry:
+    def __init__(self, ncolumns, nrows, noutputs = 1):
+        '''[summary]
+        Tables of the layout of genomes with the given number of columns and rows, computed once,
+        so genome operations look up the bounds of genes instead of computing and validating them on every call.
+        ### Parameters
+        1. ncolumns
+            - number of columns in the matrix of genes
+            - must be > 0
+        2. nrows
+            - number of rows in the matrix of genes
+            - must be > 0
+        3. noutputs
+            - number of output genes, the last noutputs genes of the genome
+        Raises
+        ------
+        ValueError
+            - if ncolumns < 1 or nrows < 1 or noutputs < 1
+        '''
+        if ncolumns < 1 or nrows < 1 or noutputs < 1:
+            raise ValueError("ncolumns must be > 0, nrows must be > 0, noutputs must be > 0")
+
+        self.ncolumns = ncolumns
+        self.nrows = nrows
+        self.noutputs = noutputs
+        self.ngenes = ncolumns * nrows
+
+        # genes take inputs from the previous columns, the bound is exclusive
+        self.last_possible_input_indexes = np.arange(self.ngenes) // nrows * nrows
+        self.last_possible_input_index_list = self.last_possible_input_indexes.tolist() # faster to index one by one
+
+        # number of inputs of each operation, by opcode
+        self.operation_inputs = np.array([op_inputs[operation] for operation in operations])
+        self.operation_input_list = self.operation_inputs.tolist()
+
+        # alleles that can be mutated when they are used (>= 0): operations,
+        # and inputs of genes that can be connected to more than one gene
+        self.mutable_alleles = np.ones((self.ngenes, 3), dtype=bool)
+        self.mutable_alleles[:, 1:] = (self.last_possible_input_indexes > 1)[:, None]
+
+        self.first_output_gene_index = self.ngenes - noutputs
+        self.output_gene_indexes = list(range(self.first_output_gene_index, self.ngenes))
+
+    def is_output_gene_index(self, gene_index):
+        '''[summary]
+        Returns True if the gene at the given index is an output gene
+        ### Parameters
+        1. gene_index
+            - index of the gene in the genome
+        ### Returns
+        bool
+            - True for the last noutputs genes
+        '''
+        return gene_index >= self.first_output_gene_index
+
+    def get_mutable_positions(self, genome):
+        '''[summary]
+        Returns positions of the alleles of the genome that can be mutated. Operations of function genes can be mutated,
+        inputs of function and output genes can be mutated if there is more than one gene they can be connected to.
+        Unused inputs (-1) and alleles of input and output genes that are not inputs (-1, -2) cannot be mutated.
+        ### Parameters
+        1. genome
+            - compact genome with the layout of the geometry
+        ### Returns
+        np.ndarray
+            - sorted positions gene_index * 3 + allele_index of the alleles
+        '''
+        return np.flatnonzero((genome >= 0) & self.mutable_alleles)
+
+@lru_cache(maxsize=None)
+def get_genome_geometry(ncolumns, nrows, noutputs = 1):
+    '''[summary]
+    Returns the geometry of genomes with the given number of columns and rows, geometries are created once and shared
+    ### Parameters
+    1. ncolumns
+        - number of columns in the matrix of genes
+    2. nrows
+        - number of rows in the matrix of genes
+    3. noutputs
+        - number of output genes
+    ### Returns
+    GenomeGeometry
+        - geometry of the genomes
+    '''
+    return GenomeGeometry(ncolumns, nrows, noutputs)
@@ -0,0 +1,146 @@
+'''
+File: kernels.py
+Purpose: Contains the in-place operation kernels used to evaluate programs in the CGP algorithm
+Author: Petr Bromnik
+'''
+
+from constants.operations import operations
+import numpy as np
+
+# max float64 value is 1.7976931348623157e+308
+# max was set to 1e+30 to avoid overflow when calculationg fitness - for example 1e100 * 1e100 = 1e200, when squared in fitness calculation it would be 1e400 whis is > than max float64 value
+MAX_OPERAND = 1e+30
+# e^50 is the largest result of the exponential, larger exponents give 0.0
+MAX_EXPONENT = 50
+
+# every kernel writes its result to out, positions outside of the domain of the operation are set to 0.0:
+# - +, -, * with an operand out of (-MAX_OPERAND, MAX_OPERAND) (or nan)
+# - % with y = 0
+# - e^n with x > MAX_EXPONENT
+# - ln(|x|) with x = 0
+# out can be the same array as x or y
+
+# scratch masks shared by all kernels, they grow to the largest size used and are never allocated again
+scratch_masks = [np.empty(0, dtype=bool), np.empty(0, dtype=bool)]
+
+def get_scratch_masks(shape):
+    '''[summary]
+    Returns two boolean scratch arrays of the given shape, they are views of the preallocated scratch masks.
+    Values in them are not initialized and are overwritten by the next kernel call.
+    ### Parameters
+    1. shape
+        - shape of the operands
+    ### Returns
+    Tuple[np.ndarray, np.ndarray]
+        - two scratch masks
+    '''
+    size = int(np.prod(shape))
+    if scratch_masks[0].size < size:
+        scratch_masks[0] = np.empty(size, dtype=bool)
+        scratch_masks[1] = np.empty(size, dtype=bool)
+    return scratch_masks[0][:size].reshape(shape), scratch_masks[1][:size].reshape(shape)
+
+def operands_in_range(x, y):
+    '''[summary]
+    Returns whether all values of both operands are in (-MAX_OPERAND, MAX_OPERAND), uses only reductions, no temporary arrays
+    ### Parameters
+    1. x
+        - first operand
+    2. y
+        - second operand
+    ### Returns
+    bool
+        - False if any value is out of range or nan
+    '''
+    return x.max() < MAX_OPERAND and x.min() > -MAX_OPERAND and y.max() < MAX_OPERAND and y.min() > -MAX_OPERAND
+
+def operands_in_range_mask(x, y):
+    '''[summary]
+    Returns a scratch mask of positions where both operands are in (-MAX_OPERAND, MAX_OPERAND)
+    ### Parameters
+    1. x
+        - first operand
+    2. y
+        - second operand
+    ### Returns
+    np.ndarray
+        - scratch mask, valid until the next kernel call
+    '''
+    in_range, other = get_scratch_masks(np.shape(x))
+    np.less(x, MAX_OPERAND, out=in_range)
+    np.greater(x, -MAX_OPERAND, out=other)
+    np.logical_and(in_range, other, out=in_range)
+    np.less(y, MAX_OPERAND, out=other)
+    np.logical_and(in_range, other, out=in_range)
+    np.greater(y, -MAX_OPERAND, out=other)
+    np.logical_and(in_range, other, out=in_range)
+    return in_range
+
+def apply_protected(function, valid, out, *operands):
+    # calculates the function where valid, sets out to 0.0 elsewhere (valid is inverted in place)
+    function(*operands, out=out, where=valid)
+    np.logical_not(valid, out=valid)
+    np.copyto(out, 0.0, where=valid)
+    return out
+
+# values outside of the domains are rare, so every kernel first checks the whole operands
+# and only when some value is outside of the domain it builds the mask of valid positions
+
+def add_kernel(x, y, out):
+    if operands_in_range(x, y):
+        return np.add(x, y, out=out)
+    return apply_protected(np.add, operands_in_range_mask(x, y), out, x, y)
+
+def subtract_kernel(x, y, out):
+    if operands_in_range(x, y):
+        return np.subtract(x, y, out=out)
+    return apply_protected(np.subtract, operands_in_range_mask(x, y), out, x, y)
+
+def multiply_kernel(x, y, out):
+    if operands_in_range(x, y):
+        return np.multiply(x, y, out=out)
+    return apply_protected(np.multiply, operands_in_range_mask(x, y), out, x, y)
+
+def mod_kernel(x, y, out):
+    # mod is not defined for y = 0
+    if np.count_nonzero(y) == y.size:
+        return np.mod(x, y, out=out)
+    nonzero, _ = get_scratch_masks(np.shape(y))
+    np.not_equal(y, 0, out=nonzero)
+    return apply_protected(np.mod, nonzero, out, x, y)
+
+def sin_kernel(x, out):
+    return np.sin(x, out=out)
+
+def cos_kernel(x, out):
+    return np.cos(x, out=out)
+
+def exp_kernel(x, out):
+    if x.max() <= MAX_EXPONENT:
+        return np.exp(x, out=out)
+    small, _ = get_scratch_masks(np.shape(x))
+    np.less_equal(x, MAX_EXPONENT, out=small)
+    return apply_protected(np.exp, small, out, x)
+
+def log_kernel(x, out):
+    # ln is not defined for 0, |0| = 0 already is the defined result
+    np.absolute(x, out=out)
+    if np.count_nonzero(out) == out.size:
+        return np.log(out, out=out)
+    nonzero, _ = get_scratch_masks(np.shape(out))
+    np.not_equal(out, 0, out=nonzero)
+    return np.log(out, out=out, where=nonzero)
+
+op_kernels = {
+    '+': add_kernel,
+    '-': subtract_kernel,
+    '*': multiply_kernel,
+    '%': mod_kernel,
+    'sin': sin_kernel,
+    'cos': cos_kernel,
+    'e^n': exp_kernel,
+    'ln(|x|)': log_kernel,
+}
+
+# kernels indexed by the integer opcode (index of the operation in operations)
+kernels = [op_kernels[operation] for operation in operations]
@@ -6,8 +6,9 @@ Author: Petr Bromnik
 
 import numpy as np
 
-from genome import mutate_individual
+from genome import mutate_individual_delta
 from population import Population
+from constants.backendEnum import BackendEnum
 
 def one_plus_lambda(population_size,
                     ncolumns,
@@ -16,7 +17,14 @@ def one_plus_lambda(population_size,
                     wanted_output,
                     acceptable_boundary,
                     max_fitness_evaluations,
-                    mutation_rate):
+                    mutation_rate,
+                    batch_evaluation = False,
+                    backend = BackendEnum.INTERPRETER,
+                    precision = np.float64,
+                    streaming_chunk_size = None,
+                    subset_size = None,
+                    noutputs = 1,
+                    return_statistics = False):
     '''[summary]
     Runs CGP with one plus lambda algorithm
     ### Parameters
@@ -36,8 +44,23 @@ def one_plus_lambda(population_size,
         - maximum number of fitness evaluations to run the algorithm
     8. mutation_rate
         - mutation rate of the algorithm
+    9. batch_evaluation
+        - whether children of a generation are evaluated together in one batch
+    10. backend
+        - how children not evaluated in a batch are evaluated, see BackendEnum
+    11. precision
+        - floating point type individuals are evaluated in, np.float64 or np.float32
+        - with np.float32, acceptable solutions and the returned fitness are confirmed in np.float64
+    12. streaming_chunk_size
+        - if set, individuals are evaluated in chunks of this many samples, see Population
+    13. subset_size
+        - if set, children are first evaluated on a subset of this many samples and only those not worse than the parent on it on all samples, see Population
+    14. noutputs
+        - number of output genes, wanted_output has one row per output with several outputs
+    15. return_statistics
+        - whether the statistics of the fitness evaluations are returned as a 7th value
     ### Returns
-    1. List[List[int]]
+    1. np.ndarray
         - best individual found
     2. float
         - fitness of the best individual
@@ -49,9 +72,11 @@ def one_plus_lambda(population_size,
         - list of the best fitness over time
     6. bool
         - whether the solution was found
+    7. Dict[str, int]
+        - only if return_statistics is True, nominal number of fitness evaluations and numbers of really computed (on all samples, partial on the subset) and skipped fitness evaluations
     '''
 
-    population = Population(population_size, ncolumns, nrows, mutation_rate, input_matrix=input_matrix, wanted_output=wanted_output, max_error=acceptable_boundary)
+    population = Population(population_size, ncolumns, nrows, mutation_rate, input_matrix=input_matrix, wanted_output=wanted_output, max_error=acceptable_boundary, batch_evaluation=batch_evaluation, backend=backend, precision=precision, streaming_chunk_size=streaming_chunk_size, subset_size=subset_size, noutputs=noutputs)
 
 
     fitness_evaluations = 0
@@ -78,13 +103,18 @@ def one_plus_lambda(population_size,
         generate_new_population(new_parent_index, population)
     
     top_individual = population.get_individual(new_parent_index)
-    return top_individual, fitness, generation, fitness_evaluations, top_fitness_over_time, found_solution
+    fitness = population.get_exact_fitness(top_individual, fitness)
+    if not return_statistics:
+        return top_individual, fitness, generation, fitness_evaluations, top_fitness_over_time, found_solution
+
+    evaluation_statistics = {"nominal_fitness_evaluations": fitness_evaluations, **population.get_evaluation_statistics()}
+    return top_individual, fitness, generation, fitness_evaluations, top_fitness_over_time, found_solution, evaluation_statistics
 
 def generate_new_population(new_parent_index, population):
     '''[summary]
     Generates new children from the given parent and sets them to the population.
     ### Parameters
-    1. new_parent: List[List[int]]
+    1. new_parent: np.ndarray
         - parent genome
     2. population
         - population to set the children to
@@ -92,15 +122,15 @@ def generate_new_population(new_parent_index, population):
     None
     '''
     n_children = len(population.children_indexes) # number of thildren to generate
-    new_children = []
     new_parent = population.get_individual(new_parent_index)
 
-    for i in range(n_children):
-        new_child = mutate_individual(new_parent, population.ncolumns, population.nrows, population.mutation_rate)
-        new_children.append(new_child)
+    # children are only their mutated genes, they are written over the population rows from the parent
+    child_deltas = [mutate_individual_delta(new_parent, population.ncolumns, population.nrows, population.mutation_rate, population.geometry) for _ in range(n_children)]
 
     population.set_parent_by_index(new_parent_index) # parent first, as he can be one of the previous children
-    population.set_children(new_children)
+    # children with mutations only in genes inactive in the parent inherit its fitness
+    # a child is selected only if it is not worse than the parent, so evaluation of worse children can stop early
+    population.set_children_deltas(child_deltas, parent_indexes=[0] * n_children, fitness_cutoff=population.get_parent_fitness())
 
 def get_fittest_individual_index(population):
     '''[summary]
@@ -113,7 +143,7 @@ def get_fittest_individual_index(population):
     3. wanted_output
         - expected output of the function
     ### Returns
-    1. List[List[int]]
+    1. np.ndarray
         - fittest individual
     2. float
         - fitness of the fittest individual
@@ -4,13 +4,19 @@ Purpose: Contains the Population class used in the CGP algorithm
 Author: Petr Bromnik
 '''
 
+from codegen import GeneratedFunctionCache
+from constants.backendEnum import BackendEnum
 from constants.operations import operations
-from genome import evaluate_fitness
-from utils import get_active_gene_indexes, get_last_possible_input_index, get_number_of_gene_inputs, get_output_gene_indexes
+from fitness_cache import FitnessCache, phenotype_genes, phenotype_hash, update_phenotype_hash
+from geometry import get_genome_geometry
+from genome import WORSE_THAN_CUTOFF, chunked_output_fitness, evaluate_fitness, evaluate_program_fitness_streaming, evaluate_programs_fitness, output_fitness
+from program import compile_program, program_output, run_program, run_program_incremental
+from subexpression_cache import SubexpressionCache, SubexpressionCacheChunk
+from utils import iterate_chunks, get_active_gene_indexes, get_active_genes, get_reference_counts, update_active_genes, to_genome_array, get_stratified_subset_indexes, get_output_gene_indexes
 import numpy as np
 
 class Population:
-    def __init__(self, population_size, ncolumns, nrows, mutation_rate, input_matrix, wanted_output, nparents = 1, max_error = 0.01):
+    def __init__(self, population_size, ncolumns, nrows, mutation_rate, input_matrix, wanted_output, nparents = 1, max_error = 0.01, batch_evaluation = False, node_cache_limit = 2**28, fitness_cache_size = 65536, fitness_cache_memory = 2**24, evaluation_chunk_size = 4096, backend = BackendEnum.INTERPRETER, subexpression_cache_memory = 2**26, precision = np.float64, precision_margin = None, streaming_chunk_size = None, subset_size = None, noutputs = 1):
         '''[summary]
         Initializes the population with random genomes.
         ### Parameters
@@ -26,12 +32,65 @@ class Population:
         4. mutation_rate
             - mutation rate of the algorithm
             - must be >= 0 and <= 1
+        5. input_matrix
+            - input_matrix data for the function
+        6. wanted_output
+            - expected output of the function
+        7. nparents
+            - number of parents in the population
+        8. max_error
+            - maximum difference between output and wanted_output of an acceptable solution
+        9. batch_evaluation
+            - if True, all children of a generation are evaluated together in one batch
+        10. node_cache_limit
+            - maximum number of bytes of cached outputs of all active genes (program slots), for the whole population
+            - children with a cached parent are evaluated incrementally, only the genes affected by their changes are calculated
+            - the limit is split evenly between individuals, 0 disables the cache, batch evaluated children are not cached
+        11. fitness_cache_size
+            - maximum number of fitness results cached by phenotype hash (hash of active genes), 0 disables the cache
+        12. fitness_cache_memory
+            - maximum estimated memory of the fitness cache in bytes
+        13. evaluation_chunk_size
+            - number of samples evaluated at once when the evaluation can stop early on a fitness cutoff
+        14. backend
+            - how individuals not evaluated in a batch are evaluated, see BackendEnum
+            - CODEGEN evaluates generated functions cached by phenotype hash, without cached outputs of active genes,
+              it is experimental, slower than INTERPRETER on all measured problems, as it cannot evaluate children incrementally
+        15. subexpression_cache_memory
+            - maximum number of bytes of values of subexpressions shared within a generation, 0 disables the cache
+            - every subexpression with the same structural hash is calculated once per generation, see SubexpressionCache
+        16. precision
+            - floating point type individuals are evaluated in, np.float64 or np.float32
+            - with np.float32, individuals whose maximum difference is within precision_margin of max_error
+              and every individual with a better fitness than all individuals evaluated before it
+              are evaluated again in np.float64, so acceptable solutions and their fitness are exact
+        17. precision_margin
+            - margin of the maximum difference, default 1e-3 * max(1, max(|wanted_output|)), only used with np.float32
+            - covers rounding of float32 close to max_error, larger float32 errors (e.g. at discontinuities of % or overflow of e^n)
+              cannot be bounded by a margin, solutions with them are found by confirming the best individuals
+        18. streaming_chunk_size
+            - if set, individuals are evaluated in chunks of this many samples, only one chunk of values of live active genes is in memory
+            - input_matrix and wanted_output must then be np.ndarray or np.memmap (not lists of chunks), they are read chunk by chunk
+            - node outputs, subexpressions, batch evaluation and the CODEGEN backend are not used in this mode
+        19. subset_size
+            - if set, children with a fitness cutoff are first evaluated on a fixed subset of this many samples stratified by wanted_output,
+              only children not worse than their parent on the subset are evaluated on all samples, see is_screened_out
+            - acceptable solutions are always decided on all samples
+        20. noutputs
+            - number of output genes, the last noutputs genes of the genome
+            - with several outputs, wanted_output has one row per output and the fitness is the sum of errors of all outputs
         ### Raises
         ------
         ValueError
             - if population_size < 1
             - if nrows < 1
             - if ncolumns < 3
+            - if noutputs < 1 or the output genes do not fit after the input column
+            - if wanted_output does not have one row per output with several outputs
+            - if backend is not a BackendEnum
+            - if precision is not np.float64 or np.float32
+            - if input_matrix or wanted_output is an iterator, every individual is evaluated on all samples again
+            - if streaming_chunk_size is set and input_matrix or wanted_output is not np.ndarray (or np.memmap)
         '''
         if population_size < 1:
             raise ValueError("population_size must be >= 1")
@@ -41,20 +100,72 @@ class Population:
             raise ValueError("ncolumns must be >= 3")
         if mutation_rate < 0 or mutation_rate > 1:
             raise ValueError("mutation_rate must be >= 0 and <= 1")
+        if noutputs < 1 or noutputs > (ncolumns - 1) * nrows:
+            raise ValueError("noutputs must be >= 1 and <= (ncolumns - 1) * nrows")
+        if noutputs > 1 and (np.ndim(wanted_output) != 2 or len(wanted_output) != noutputs):
+            raise ValueError("wanted_output must have one row per output")
+        if not isinstance(backend, BackendEnum):
+            raise ValueError("Unknown backend type")
+        if np.dtype(precision) not in (np.float64, np.float32):
+            raise ValueError("precision must be np.float64 or np.float32")
+        if iter(input_matrix) is input_matrix or iter(wanted_output) is wanted_output:
+            raise ValueError("input_matrix and wanted_output must be iterable more than once, e.g. np.ndarray or np.memmap, not iterators")
+        if streaming_chunk_size is not None and not (isinstance(input_matrix, np.ndarray) and isinstance(wanted_output, np.ndarray)):
+            raise ValueError("input_matrix and wanted_output must be np.ndarray or np.memmap with streaming_chunk_size, they are split into chunks of samples")
 
         self.nrows = nrows
         self.ncolumns = ncolumns
-        self.population = self.get_starting_popultation(population_size)
+        self.noutputs = noutputs
+        self.geometry = get_genome_geometry(ncolumns, nrows, noutputs) # bounds of genes, shared by genome operations
+        # struct of arrays, genomes of all individuals in one (population_size, number of genes, 3) array,
+        # fitnesses in a vector and active genes in a (population_size, number of genes) mask
+        self.population = np.stack(self.get_starting_popultation(population_size))
         self.nparents = nparents
         self.children_indexes = [i for i in range(nparents, population_size)] # 1 becouse its only for children (minus parent with index 0)
         self.mutation_rate = mutation_rate
         self.active_paths = [[] for i in range(population_size)]
-        self.fitnesses = [np.inf for i in range(population_size)]
+        self.active_masks = np.zeros(self.population.shape[:2], dtype=bool) # active genes of each individual, kept in sync with active_paths
+        self.reference_counts = [None for i in range(population_size)] # references to each gene from active genes, see utils.get_reference_counts
+        self.programs = [None for i in range(population_size)] # compiled active paths, kept in sync with active_paths
+        self.node_outputs = [None for i in range(population_size)] # values of all program slots of the last evaluation
+        self.node_cache_limit = node_cache_limit
+        self.phenotype_hashes = [None for i in range(population_size)] # hashes of active genes, keys of the fitness cache
+        self.fitness_cache = FitnessCache(fitness_cache_size, fitness_cache_memory)
+        self.fitnesses = np.full(population_size, np.inf)
         self.input_matrix = input_matrix
         self.wanted_output = wanted_output
         self.population_size = population_size
         self.max_error = max_error
         self.solution_index = None
+        self.batch_evaluation = batch_evaluation
+        self.evaluations = 0 # number of really computed fitness evaluations
+        self.skipped_evaluations = 0 # number of fitness evaluations skipped thanks to neutral changes
+        self.aborted_evaluations = 0 # number of fitness evaluations stopped early on a fitness cutoff
+        self.evaluation_chunk_size = evaluation_chunk_size
+        self.backend = backend
+        self.generated_functions = GeneratedFunctionCache() # generated functions of programs, used by the CODEGEN backend
+        self.subexpression_cache = SubexpressionCache(subexpression_cache_memory) # values of subexpressions of the current generation
+        self.precision = np.dtype(precision)
+        self.streaming_chunk_size = streaming_chunk_size
+        if precision_margin is None:
+            max_wanted_output = max(float(np.max(np.absolute(chunk))) for chunk in iterate_chunks(np.asanyarray(wanted_output), streaming_chunk_size or np.shape(wanted_output)[-1]))
+            precision_margin = 1e-3 * max(1.0, max_wanted_output)
+        # individuals are evaluated in the precision, outputs within the margin of being acceptable are confirmed in float64
+        # streamed inputs are converted chunk by chunk
+        self.evaluation_input_matrix = np.asanyarray(input_matrix) if streaming_chunk_size is not None else np.asarray(input_matrix, dtype=self.precision)
+        self.evaluation_max_error = max_error + precision_margin if self.precision != np.float64 else max_error
+        self.precision_confirmations = 0 # number of individuals evaluated again in float64
+        self.best_evaluation_fitness = np.inf # best fitness in the evaluation precision so far, better individuals are confirmed in float64
+        self.subset_fitness_cache = FitnessCache(fitness_cache_size, fitness_cache_memory) # fitness of phenotypes on the subset of samples
+        self.partial_evaluations = 0 # number of fitness evaluations on the subset of samples
+        self.screened_evaluations = 0 # number of children not evaluated on all samples, as they were worse than their parent on the subset
+        if subset_size is not None and subset_size < np.shape(wanted_output)[-1]:
+            subset_indexes = get_stratified_subset_indexes(wanted_output, subset_size)
+            self.subset_input_matrix = np.asarray(np.asanyarray(input_matrix)[..., subset_indexes], dtype=self.precision)
+            self.subset_wanted_output = np.asanyarray(wanted_output)[..., subset_indexes]
+        else:
+            self.subset_input_matrix = None
+            self.subset_wanted_output = None
         self.reset_all_active_paths()
         self.calculate_fitness_all()
 
@@ -66,8 +177,8 @@ class Population:
             - number of individuals in the population
             - must be >= 1
         ### Returns
-        List[List[List[int]]]
-            - list of random genomes
+        List[np.ndarray]
+            - list of random compact genomes
         '''
         population = []
         for i in range(population_size):
@@ -78,15 +189,15 @@ class Population:
         '''[summary]
         Returns a random genome (individual).
         ### Returns
-        List[List[int]]
-            - random genome
+        np.ndarray
+            - random compact genome (see utils.to_genome_array)
         '''
         genome = []
         for column in range(self.ncolumns):
             for row in range(self.nrows):
                 genome.append(self.get_random_gene(row, column, genome))
 
-        return genome
+        return to_genome_array(genome)
 
 
     def get_random_gene(self, rowIndex, columnIndex, genome):
@@ -115,18 +226,19 @@ class Population:
         if (columnIndex == 0):
             return gene
         
-        # output gene, internally represented as [-2, input_index, -2]
-        if ((columnIndex == self.ncolumns - 1) and (rowIndex == self.nrows - 1)):
-            return [-2, np.random.randint(0, len(genome) - rowIndex), -2]
+        gene_index = columnIndex * self.nrows + rowIndex
+        last_possible_input = self.geometry.last_possible_input_index_list[gene_index]
+
+        # output genes (the last noutputs genes), internally represented as [-2, input_index, -2]
+        if (self.geometry.is_output_gene_index(gene_index)):
+            return [-2, np.random.randint(0, last_possible_input), -2]
 
         # function genes
         operation = np.random.randint(0, len(operations))
         gene[0] = operation
 
         # generating random inputs
-        gene_index = len(genome)
-        last_possible_input = get_last_possible_input_index(self.ncolumns, self.nrows, gene_index)
-        for i in range(get_number_of_gene_inputs(gene)):
+        for i in range(self.geometry.operation_input_list[operation]):
             input = np.random.randint(0, last_possible_input)
             gene[i + 1] = input # to skip operation gene
         
@@ -135,8 +247,8 @@ class Population:
     def get_population(self):
         '''[summary]
         ### Returns
-        List[List[List[int]]]
-            - population
+        np.ndarray
+            - population, (population_size, number of genes, 3) array, every item is a compact genome
         '''
         return self.population
 
@@ -148,14 +260,27 @@ class Population:
             - index of the individual
             - must be >= 0
         ### Returns
-        List[int]
-            - individual
+        np.ndarray
+            - copy of the individual, compact genome, it does not change when the population changes
         '''
         if index < 0:
             raise ValueError("index must be >= 0")
 
-        return self.population[index]
+        return self.population[index].copy()
     
+    def get_child_buffer(self, child_number):
+        '''[summary]
+        Returns the row of the population the child is stored in, genes written to it change the child in the population.
+        After all children are written, they must be evaluated by update_children.
+        ### Parameters
+        1. child_number
+            - number of the child, 0 for the first child
+        ### Returns
+        np.ndarray
+            - the child, compact genome, not a copy
+        '''
+        return self.population[self.children_indexes[child_number]]
+
     def set_individual(self, index, individual):
         '''[summary]
         Sets an individual in the population.
@@ -164,14 +289,14 @@ class Population:
             - index of the individual
             - must be >= 0
         2. individual
-            - individual to set
+            - individual to set, compact genome or list of genes
         ### Returns
         None
         '''
         if index < 0:
             raise ValueError("index must be >= 0")
 
-        self.population[index] = individual
+        self.population[index] = to_genome_array(individual)
         self.reset_active_path(index)
         self.calculate_fitness(index)
 
@@ -179,13 +304,13 @@ class Population:
         '''[summary]
         Returns the parent of the population.
         ### Returns
-        List[List[int]]
-            - parent genome
+        np.ndarray
+            - copy of the parent genome, compact genome
         '''
         if parent_index >= self.nparents:
             raise ValueError("Parent index out of range")
 
-        return self.population[parent_index]
+        return self.population[parent_index].copy()
     
     def get_parent_with_active_path(self, parent_index = 0):
         return (self.get_parent(), self.get_active_path(parent_index))
@@ -195,14 +320,14 @@ class Population:
         Sets the parent of the population.
         ### Parameters
         1. new_parent
-            - new parent genome
+            - new parent genome, compact genome or list of genes
         ### Returns
         None
         '''
         if parent_index >= self.nparents:
             raise ValueError("Parent index out of range")
     
-        self.population[parent_index] = new_parent
+        self.population[parent_index] = to_genome_array(new_parent)
         self.reset_active_path(parent_index)
         self.calculate_fitness(parent_index)
     
@@ -210,27 +335,40 @@ class Population:
         '''[summary]
         Returns the children of the population.
         ### Returns
-        List[List[List[int]]]
-            - children genomes
+        List[np.ndarray]
+            - copies of the children genomes, compact genomes
         '''
-        children = []
-        for child_index in self.children_indexes:
-            children.append(self.population[child_index])
-        return children
+        return list(self.population[self.nparents:].copy())
     
     def get_children_with_active_paths(self):
+        '''[summary]
+        Returns the children of the population with indexes of their active genes.
+        ### Returns
+        List[Tuple[np.ndarray, List[int]]]
+            - copies of the children genomes (compact genomes) and of their active paths, they do not change when the population changes
+        '''
         children = []
         for child_index in self.children_indexes:
-            children.append((self.population[child_index], self.active_paths[child_index]))
+            children.append((self.population[child_index].copy(), list(self.active_paths[child_index])))
 
         return children
 
-    def set_children(self, new_children):
+    def set_children(self, new_children, parent_indexes = None, changed_gene_indexes = None, fitness_cutoff = np.inf):
         '''[summary]
         Sets the children of the population.
+        When the changed genes of a child are known and none of them is active in its parent,
+        the child inherits the active path, program and fitness of the parent without evaluation.
         ### Parameters
         1. new_children
-            - new children genomes
+            - new children genomes, compact genomes or lists of genes
+        2. parent_indexes
+            - index of the parent of each child, required with changed_gene_indexes
+        3. changed_gene_indexes
+            - indexes of genes in which each child differs from its parent
+            - default None, every child is evaluated
+        4. fitness_cutoff
+            - fitness above which the exact fitness of children is not needed by selection, see calculate_fitness
+            - not used with batch evaluation
         ### Returns
         None
         Raises
@@ -242,11 +380,173 @@ class Population:
             raise ValueError(f"Number of new_children is different than required, number of new_children:{len(new_children)}, required: {len(self.children_indexes)}")
 
         for i in range(len(new_children)):
+            self.population[self.children_indexes[i]] = to_genome_array(new_children[i])
+        self.update_children(parent_indexes, changed_gene_indexes, fitness_cutoff)
+
+    def set_children_deltas(self, child_deltas, parent_indexes, fitness_cutoff = np.inf):
+        '''[summary]
+        Sets the children of the population given as changes of their parents (see genome.mutate_individual_delta),
+        children are written over their rows of the population from the parent and the changed genes,
+        so no genome is allocated for them. Children are evaluated as in set_children.
+        ### Parameters
+        1. child_deltas
+            - for each child, tuple of sorted indexes of the changed genes and np.ndarray of the changed genes
+        2. parent_indexes
+            - index of the parent of each child
+        3. fitness_cutoff
+            - fitness above which the exact fitness of children is not needed by selection, see calculate_fitness
+        ### Returns
+        None
+        Raises
+        ------
+        ValueError
+            - if the number of child_deltas is different than required (number of children in the population)
+        '''
+        if len(child_deltas) != len(self.children_indexes):
+            raise ValueError(f"Number of child_deltas is different than required, number of child_deltas:{len(child_deltas)}, required: {len(self.children_indexes)}")
+
+        for i, (gene_indexes, genes) in enumerate(child_deltas):
+            child = self.population[self.children_indexes[i]]
+            np.copyto(child, self.population[parent_indexes[i]])
+            child[gene_indexes] = genes
+        self.update_children(parent_indexes, [gene_indexes for gene_indexes, _ in child_deltas], fitness_cutoff)
+
+    def update_children(self, parent_indexes = None, changed_gene_indexes = None, fitness_cutoff = np.inf):
+        '''[summary]
+        Updates active paths and fitnesses of the children after their genomes were set, see set_children and get_child_buffer.
+        ### Parameters
+        1. parent_indexes
+            - index of the parent of each child, required with changed_gene_indexes
+        2. changed_gene_indexes
+            - indexes of genes in which each child differs from its parent
+            - default None, every child is evaluated
+        3. fitness_cutoff
+            - fitness above which the exact fitness of children is not needed by selection, see calculate_fitness
+        ### Returns
+        None
+        Raises
+        ------
+        ValueError
+            - if the number of changed_gene_indexes is different than the number of children in the population
+        '''
+        if changed_gene_indexes is not None and len(changed_gene_indexes) != len(self.children_indexes):
+            raise ValueError(f"Number of changed_gene_indexes is different than required, number of changed_gene_indexes:{len(changed_gene_indexes)}, required: {len(self.children_indexes)}")
+
+        self.start_generation_subexpressions()
+        children_to_evaluate = []
+        for i in range(len(self.children_indexes)):
             child_index = self.children_indexes[i]
-            self.population[child_index] = new_children[i]
-            self.reset_active_path(child_index)
-            self.calculate_fitness(child_index)
-        
+
+            if changed_gene_indexes is not None and self.is_neutral_change(parent_indexes[i], changed_gene_indexes[i]):
+                self.inherit_evaluation(parent_indexes[i], child_index)
+                continue
+
+            if changed_gene_indexes is not None:
+                self.reset_active_path(child_index, parent_indexes[i], changed_gene_indexes[i])
+            else:
+                self.reset_active_path(child_index)
+            children_to_evaluate.append(i)
+
+        if self.batch_evaluation and self.streaming_chunk_size is None and len(children_to_evaluate) > 0:
+            self.calculate_fitness_batch([self.children_indexes[i] for i in children_to_evaluate])
+        else:
+            for i in children_to_evaluate:
+                if changed_gene_indexes is not None:
+                    # evaluated incrementally from the parent, if its node outputs are cached
+                    self.calculate_fitness(self.children_indexes[i], parent_indexes[i], changed_gene_indexes[i], fitness_cutoff)
+                else:
+                    self.calculate_fitness(self.children_indexes[i], fitness_cutoff=fitness_cutoff)
+
+    def start_generation_subexpressions(self):
+        '''[summary]
+        Clears the subexpression cache for a new generation and fills it with the cached node outputs of the parents,
+        so the children share the subexpressions of all parents, not only of the one they are evaluated incrementally from.
+        ### Returns
+        None
+        '''
+        self.subexpression_cache.clear()
+        for parent_index in range(self.nparents):
+            values = self.node_outputs[parent_index]
+            if values is not None:
+                self.put_subexpressions(self.get_program(parent_index), values)
+
+    def put_subexpressions(self, program, values):
+        '''[summary]
+        Puts the values of all instructions of the program into the subexpression cache.
+        ### Parameters
+        1. program
+            - program the values were calculated by
+        2. values
+            - values of all slots of the program, for all samples
+        ### Returns
+        None
+        '''
+        for structural_hash, structural_key, destination in zip(program.hashes, program.keys, program.destinations.tolist()):
+            self.subexpression_cache.put(structural_hash, values[destination], structural_key)
+
+    def get_subexpression_cache(self):
+        '''[summary]
+        Returns the subexpression cache used by evaluations, None if it is disabled
+        ### Returns
+        SubexpressionCache | None
+        '''
+        return self.subexpression_cache if self.subexpression_cache.max_bytes > 0 else None
+
+    def is_neutral_change(self, parent_index, changed_gene_indexes):
+        '''[summary]
+        Returns True if none of the changed genes is active in the parent, so the change does not affect the output.
+        ### Parameters
+        1. parent_index
+            - index of the parent
+        2. changed_gene_indexes
+            - indexes of changed genes
+        ### Returns
+        bool
+            - True if the change is neutral
+        '''
+        return not self.active_masks[parent_index, changed_gene_indexes].any()
+
+    def inherit_evaluation(self, parent_index, child_index):
+        '''[summary]
+        Copies the active path, program and fitness of the parent to the child, which is counted as a skipped evaluation.
+        ### Parameters
+        1. parent_index
+            - index of the parent
+        2. child_index
+            - index of the child with a neutral change
+        ### Returns
+        None
+        '''
+        self.active_paths[child_index] = self.active_paths[parent_index]
+        self.active_masks[child_index] = self.active_masks[parent_index]
+        self.reference_counts[child_index] = self.reference_counts[parent_index]
+        self.programs[child_index] = self.programs[parent_index]
+        self.node_outputs[child_index] = self.node_outputs[parent_index]
+        self.phenotype_hashes[child_index] = self.phenotype_hashes[parent_index]
+        self.fitnesses[child_index] = self.fitnesses[parent_index]
+        self.skipped_evaluations += 1
+
+    def get_evaluation_statistics(self):
+        '''[summary]
+        Returns the numbers of fitness evaluations that were really computed and that were skipped.
+        ### Returns
+        Dict[str, int]
+            - {"actual_fitness_evaluations": int, "skipped_fitness_evaluations": int, "aborted_fitness_evaluations": int,
+               "fitness_cache_hits": int, "fitness_cache_misses": int, "fitness_cache_evictions": int, "fitness_cache_collisions": int,
+               "subexpression_cache_hits": int, "subexpression_cache_misses": int, "subexpression_cache_collisions": int, "precision_confirmations": int,
+               "partial_fitness_evaluations": int, "screened_fitness_evaluations": int}
+            - actual fitness evaluations are on all samples, fitness cache hits are not counted as actual fitness evaluations, aborted evaluations are
+            - partial fitness evaluations are on the subset of samples, screened are children not evaluated on all samples after them
+        '''
+        return {"actual_fitness_evaluations": self.evaluations,
+                "skipped_fitness_evaluations": self.skipped_evaluations,
+                "aborted_fitness_evaluations": self.aborted_evaluations,
+                **self.fitness_cache.get_statistics(),
+                **self.subexpression_cache.get_statistics(),
+                "precision_confirmations": self.precision_confirmations,
+                "partial_fitness_evaluations": self.partial_evaluations,
+                "screened_fitness_evaluations": self.screened_evaluations}
+
     def get_ninputs(self):
         '''[summary]
         Returns the number of inputs in the genome.
@@ -263,7 +563,7 @@ class Population:
         int
             - number of outputs
         '''
-        return self.nrows
+        return self.noutputs
     
     def get_mutation_rate(self):
         '''[summary]
@@ -282,13 +582,23 @@ class Population:
             - index of individual to evaluate
         ### Returns
         List[int]
-            - indexes of active genes
+            - sorted indexes of active genes
         '''
-        individual = self.population[individual_index]
-        output_gene_indexes = get_output_gene_indexes(individual)
-        active_gene_indexes = get_active_gene_indexes(individual, output_gene_indexes)
-        
-        return active_gene_indexes
+        return self.calculate_active_genes(individual_index)[1]
+
+    def calculate_active_genes(self, individual_index):
+        '''[summary]
+        Returns the active genes of the given individual index, see utils.get_active_genes
+        ### Parameters
+        1. individual_index
+            - index of individual
+        ### Returns
+        1. np.ndarray
+            - mask of active genes
+        2. List[int]
+            - sorted indexes of active genes
+        '''
+        return get_active_genes(self.population[individual_index], self.geometry.output_gene_indexes)
     
     def get_active_path(self, individual_index):
         '''[summary]
@@ -301,30 +611,108 @@ class Population:
             - indexes of active genes
         '''
         return self.active_paths[individual_index]
+
+    def get_active_mask(self, individual_index):
+        '''[summary]
+        Returns the mask of active genes of the given individual index
+        ### Parameters
+        1. individual_index
+            - index of the individual
+        ### Returns
+        np.ndarray
+            - bool for each gene of the individual, True if the gene is active
+        '''
+        return self.active_masks[individual_index]
     
-    def set_active_path(self, individual_index, active_path):
+    def set_active_path(self, individual_index, active_path, active_path_hash = None, active_mask = None, reference_counts = None):
         '''[summary]
-        Sets the active path of the individual.
+        Sets the active path of the individual and compiles it into the program of the individual.
         ### Parameters
         1. individual_index
             - index of the individual
         2. active_path
-            - indexes of active genes
+            - sorted indexes of active genes, the evaluation order of the program
+        3. active_path_hash
+            - phenotype hash of the active genes, if already known
+        4. active_mask
+            - mask of the active genes, if already known
+        5. reference_counts
+            - references to each gene from the active genes, if already known
         ### Returns
         None
         '''
         self.active_paths[individual_index] = active_path
+        if active_mask is not None:
+            self.active_masks[individual_index] = active_mask
+        else:
+            self.active_masks[individual_index] = False
+            self.active_masks[individual_index, active_path] = True
+        if reference_counts is None:
+            reference_counts = get_reference_counts(self.population[individual_index], active_path, self.geometry.output_gene_indexes)
+        self.reference_counts[individual_index] = reference_counts
+        self.programs[individual_index] = compile_program(self.population[individual_index], active_path, self.nrows, in_evaluation_order=True)
+        self.node_outputs[individual_index] = None
+        if active_path_hash is None:
+            active_path_hash = phenotype_hash(self.population[individual_index], active_path)
+        self.phenotype_hashes[individual_index] = active_path_hash
 
-    def reset_active_path(self, individual_index):
+    def get_program(self, individual_index):
+        '''[summary]
+        Returns the compiled active path of the individual.
+        ### Parameters
+        1. individual_index
+            - index of the individual
+        ### Returns
+        Program
+            - compiled active genes of the individual
+        '''
+        return self.programs[individual_index]
+
+    def get_generated_function(self, individual_index):
+        '''[summary]
+        Returns the generated function of the program of the individual, see codegen.
+        ### Parameters
+        1. individual_index
+            - index of the individual
+        ### Returns
+        Callable[[np.ndarray], np.ndarray]
+            - function returning the output of the individual for the given input_matrix
+        '''
+        return self.generated_functions.get_function(self.phenotype_hashes[individual_index], self.get_program(individual_index))
+
+    def reset_active_path(self, individual_index, parent_index = None, changed_gene_indexes = None):
         '''[summary]
         Resets the active path of the individual.
         ### Parameters
         1. individual_index
             - index of the individual
+        2. parent_index
+            - index of the parent the individual was created from, its active genes and phenotype hash are updated
+              only in the part of the active genes affected by the changed genes, instead of searching and hashing all active genes
+        3. changed_gene_indexes
+            - indexes of genes in which the individual differs from the parent
         ### Returns
         None
         '''
-        self.set_active_path(individual_index, self.calculate_active_path(individual_index))
+        active_path_hash = None
+        reference_counts = None
+        if parent_index is not None and changed_gene_indexes is not None:
+            reference_counts, activity = update_active_genes(self.population[parent_index],
+                                                             self.population[individual_index],
+                                                             self.reference_counts[parent_index],
+                                                             changed_gene_indexes)
+            active_mask = self.active_masks[parent_index].copy()
+            active_mask[list(activity.keys())] = list(activity.values())
+            active_path = np.flatnonzero(active_mask).tolist()
+            active_path_hash = update_phenotype_hash(self.phenotype_hashes[parent_index],
+                                                     self.population[parent_index],
+                                                     self.active_paths[parent_index],
+                                                     self.population[individual_index],
+                                                     active_path,
+                                                     changed_gene_indexes)
+        else:
+            active_mask, active_path = self.calculate_active_genes(individual_index)
+        self.set_active_path(individual_index, active_path, active_path_hash, active_mask, reference_counts)
 
     def reset_all_active_paths(self):
         '''[summary]
@@ -342,7 +730,7 @@ class Population:
         1. individual_index
             - index of the individual
         ### Returns
-        1. List[List[int]]
+        1. np.ndarray
             - individual
         2. List[int]
             - active path
@@ -374,21 +762,304 @@ class Population:
         '''
         self.fitnesses[individual_index] = fitness
 
-    def calculate_fitness(self, individual_index):
+    def calculate_fitness(self, individual_index, parent_index = None, changed_gene_indexes = None, fitness_cutoff = np.inf):
         '''[summary]
-        Calculates the fitness of the individual.
+        Calculates the fitness of the individual, or takes it from the fitness cache.
         ### Parameters
         1. individual_index
             - index of the individual
+        2. parent_index
+            - index of the parent the individual was created from
+            - default None, the individual is evaluated from scratch
+        3. changed_gene_indexes
+            - indexes of genes in which the individual differs from the parent
+        4. fitness_cutoff
+            - fitness above which the exact fitness is not needed by selection
+            - with more samples than evaluation_chunk_size, the evaluation stops once the error exceeds it
+              and the fitness is set to WORSE_THAN_CUTOFF
+            - with subset_size, children worse than their parent on the subset are not evaluated on all samples,
+              their fitness is set to WORSE_THAN_CUTOFF
         ### Returns
         None
         '''
-        individual, active_path = self.get_individual_with_active_path(individual_index)
-        fitness, is_acceptable = evaluate_fitness(individual, active_path, self.input_matrix, self.wanted_output, self.max_error)
+        if self.set_cached_fitness(individual_index):
+            return
+
+        if fitness_cutoff < np.inf and parent_index is not None and self.is_screened_out(individual_index, parent_index):
+            self.screened_evaluations += 1
+            self.node_outputs[individual_index] = None
+            self.set_fitness(individual_index, WORSE_THAN_CUTOFF)
+            return
+
+        program = self.get_program(individual_index)
+        parent_program = self.get_program(parent_index) if parent_index is not None else None
+        parent_values = self.node_outputs[parent_index] if parent_index is not None and changed_gene_indexes is not None else None
+
+        if self.streaming_chunk_size is not None:
+            fitness, is_acceptable = self.evaluate_streaming(program, self.precision, self.evaluation_max_error, fitness_cutoff)
+            self.node_outputs[individual_index] = None
+        elif fitness_cutoff < np.inf and np.shape(self.wanted_output)[-1] > self.evaluation_chunk_size:
+            if self.backend == BackendEnum.CODEGEN:
+                values = None
+                output_chunks = self.get_output_chunks(program, generated_function=self.get_generated_function(individual_index))
+            else:
+                dtype = parent_values.dtype if parent_values is not None else self.precision
+                values = np.empty((program.nslots, np.shape(self.wanted_output)[-1]), dtype=dtype)
+                output_chunks = self.get_output_chunks(program, parent_program, parent_values, changed_gene_indexes, values=values)
+            fitness, is_acceptable = chunked_output_fitness(output_chunks, self.wanted_output, self.evaluation_max_error, fitness_cutoff)
+            if values is not None and fitness != WORSE_THAN_CUTOFF:
+                # all chunks were calculated, the values are kept as with an evaluation of all samples at once
+                self.cache_node_outputs(individual_index, values)
+                self.put_subexpressions(program, values)
+            else:
+                self.node_outputs[individual_index] = None
+        elif self.backend == BackendEnum.CODEGEN:
+            output = self.get_generated_function(individual_index)(self.evaluation_input_matrix, self.precision)
+            fitness, is_acceptable = output_fitness(output, self.wanted_output, self.evaluation_max_error)
+        else:
+            if parent_values is not None:
+                values = run_program_incremental(program, self.evaluation_input_matrix, parent_program, parent_values, changed_gene_indexes, self.get_subexpression_cache())
+            else:
+                values = run_program(program, self.evaluation_input_matrix, self.get_subexpression_cache(), self.precision)
+            self.cache_node_outputs(individual_index, values)
+            fitness, is_acceptable = output_fitness(program_output(program, values), self.wanted_output, self.evaluation_max_error)
+        fitness, is_acceptable = self.confirm_fitness(individual_index, fitness, is_acceptable)
+
+        self.evaluations += 1
+        if fitness == WORSE_THAN_CUTOFF:
+            self.aborted_evaluations += 1
+        else:
+            self.fitness_cache.put(self.phenotype_hashes[individual_index], fitness, is_acceptable, self.get_phenotype_genes(individual_index))
         if is_acceptable:
             self.solution_index = individual_index
         self.set_fitness(individual_index, fitness)
 
+    def is_screened_out(self, individual_index, parent_index):
+        '''[summary]
+        Returns True if the child is worse than its parent on the subset of samples and cannot be an acceptable solution,
+        so it does not have to be evaluated on all samples.
+        ### Parameters
+        1. individual_index
+            - index of the child
+        2. parent_index
+            - index of the parent of the child
+        ### Returns
+        bool
+            - False if there is no subset of samples (subset_size not set)
+        '''
+        if self.subset_input_matrix is None:
+            return False
+        fitness, could_be_acceptable = self.get_subset_fitness(individual_index)
+        parent_fitness, _ = self.get_subset_fitness(parent_index)
+        # a child acceptable on the subset can still be an acceptable solution, it is evaluated on all samples
+        return fitness > parent_fitness and not could_be_acceptable
+
+    def get_subset_fitness(self, individual_index):
+        '''[summary]
+        Returns the fitness of the individual on the subset of samples, fitnesses are cached by phenotype hash.
+        ### Parameters
+        1. individual_index
+            - index of the individual
+        ### Returns
+        float
+            - fitness of the individual on the subset
+        bool
+            - True if the individual is acceptable on the subset
+        '''
+        cached = self.subset_fitness_cache.get(self.phenotype_hashes[individual_index], self.get_phenotype_genes(individual_index))
+        if cached is not None:
+            return cached
+
+        program = self.get_program(individual_index)
+        values = run_program(program, self.subset_input_matrix, None, self.precision)
+        fitness, is_acceptable = output_fitness(program_output(program, values), self.subset_wanted_output, self.evaluation_max_error)
+        self.partial_evaluations += 1
+        self.subset_fitness_cache.put(self.phenotype_hashes[individual_index], fitness, is_acceptable, self.get_phenotype_genes(individual_index))
+        return fitness, is_acceptable
+
+    def confirm_fitness(self, individual_index, fitness, is_acceptable):
+        '''[summary]
+        Returns the fitness of the individual evaluated again in float64, if it was evaluated in a lower precision
+        and its maximum difference is within precision_margin of max_error (is_acceptable with evaluation_max_error)
+        or its fitness is better than fitness of all individuals evaluated before it.
+        ### Parameters
+        1. individual_index
+            - index of the individual
+        2. fitness
+            - fitness of the individual in the evaluation precision
+        3. is_acceptable
+            - whether the individual is acceptable with evaluation_max_error
+        ### Returns
+        float
+            - fitness of the individual, exact if confirmed
+        bool
+            - True if the individual is an acceptable solution (exact with max_error if confirmed)
+        '''
+        if self.precision == np.float64 or fitness == WORSE_THAN_CUTOFF:
+            return fitness, is_acceptable
+
+        # the best candidate so far can be a solution with float32 errors larger than the margin
+        is_best_candidate = fitness < self.best_evaluation_fitness
+        if is_best_candidate:
+            self.best_evaluation_fitness = fitness
+        if not is_acceptable and not is_best_candidate:
+            return fitness, is_acceptable
+
+        self.precision_confirmations += 1
+        program = self.get_program(individual_index)
+        if self.streaming_chunk_size is not None:
+            return self.evaluate_streaming(program, np.float64, self.max_error)
+        return output_fitness(program_output(program, run_program(program, self.input_matrix)), self.wanted_output, self.max_error)
+
+    def get_exact_fitness(self, individual, fitness):
+        '''[summary]
+        Returns the fitness of the individual evaluated in float64, fitness evaluated in a lower precision is only approximate.
+        ### Parameters
+        1. individual
+            - genome of the individual
+        2. fitness
+            - fitness of the individual in the evaluation precision, returned if it already is float64
+        ### Returns
+        float
+            - fitness of the individual in float64
+        '''
+        if self.precision == np.float64:
+            return fitness
+        active_path = get_active_gene_indexes(individual, get_output_gene_indexes(individual))
+        if self.streaming_chunk_size is not None:
+            return self.evaluate_streaming(compile_program(individual, active_path, self.nrows, in_evaluation_order=True), np.float64, self.max_error)[0]
+        return evaluate_fitness(individual, active_path, self.input_matrix, self.wanted_output, self.max_error)[0]
+
+    def evaluate_streaming(self, program, dtype, max_error, fitness_cutoff = np.inf):
+        '''[summary]
+        Returns the fitness of the program evaluated in chunks of streaming_chunk_size samples, see evaluate_program_fitness_streaming.
+        ### Parameters
+        1. program
+            - program to evaluate
+        2. dtype
+            - floating point type the program is evaluated in
+        3. max_error
+            - maximum difference of an acceptable solution
+        4. fitness_cutoff
+            - fitness above which the evaluation can stop, see calculate_fitness
+        ### Returns
+        float
+            - fitness of the program, or WORSE_THAN_CUTOFF
+        bool
+            - True if the program is an acceptable solution
+        '''
+        input_chunks = iterate_chunks(self.evaluation_input_matrix, self.streaming_chunk_size)
+        wanted_output_chunks = iterate_chunks(np.asanyarray(self.wanted_output), self.streaming_chunk_size)
+        return evaluate_program_fitness_streaming(program, input_chunks, wanted_output_chunks, max_error, dtype, fitness_cutoff)
+
+    def get_output_chunks(self, program, parent_program = None, parent_values = None, changed_gene_indexes = None, generated_function = None, values = None):
+        '''[summary]
+        Generates the output of the program in consecutive chunks of evaluation_chunk_size samples, a chunk is calculated only when requested.
+        ### Parameters
+        1. program
+            - program to run
+        2. parent_program
+            - program of the parent, used with parent_values
+        3. parent_values
+            - cached values of the parent program slots, chunks are calculated incrementally from them if given
+        4. changed_gene_indexes
+            - indexes of genes in which the individual differs from the parent
+        5. generated_function
+            - generated function of the program, called instead of running the program if given
+        6. values
+            - array of all samples the values of program slots of each calculated chunk are written into, if given
+        ### Returns
+        Generator[np.ndarray]
+            - chunks of the output
+        '''
+        nsamples = np.shape(self.wanted_output)[-1]
+        subexpression_cache = self.get_subexpression_cache()
+        for start in range(0, nsamples, self.evaluation_chunk_size):
+            end = min(start + self.evaluation_chunk_size, nsamples)
+            input_chunk = self.evaluation_input_matrix[:, start:end]
+            if generated_function is not None:
+                yield generated_function(input_chunk, self.precision)
+                continue
+            chunk_cache = SubexpressionCacheChunk(subexpression_cache, start, end) if subexpression_cache is not None else None
+            if parent_values is not None:
+                chunk_values = run_program_incremental(program, input_chunk, parent_program, parent_values[:, start:end], changed_gene_indexes, chunk_cache)
+            else:
+                chunk_values = run_program(program, input_chunk, chunk_cache, self.precision)
+            if values is not None:
+                values[:, start:end] = chunk_values
+            yield program_output(program, chunk_values)
+
+    def get_phenotype_genes(self, individual_index):
+        '''[summary]
+        Returns the active genes of the individual, stored with its fitness in the fitness cache (see fitness_cache.phenotype_genes)
+        ### Parameters
+        1. individual_index
+            - index of the individual
+        ### Returns
+        bytes
+            - active gene indexes and active genes of the individual
+        '''
+        return phenotype_genes(self.population[individual_index], self.active_paths[individual_index])
+
+    def set_cached_fitness(self, individual_index):
+        '''[summary]
+        Sets the fitness of the individual from the fitness cache, if its phenotype was already evaluated.
+        ### Parameters
+        1. individual_index
+            - index of the individual
+        ### Returns
+        bool
+            - True if the fitness was found in the cache
+        '''
+        cached = self.fitness_cache.get(self.phenotype_hashes[individual_index], self.get_phenotype_genes(individual_index))
+        if cached is None:
+            return False
+
+        fitness, is_acceptable = cached
+        self.node_outputs[individual_index] = None
+        if is_acceptable:
+            self.solution_index = individual_index
+        self.set_fitness(individual_index, fitness)
+        return True
+
+    def cache_node_outputs(self, individual_index, values):
+        '''[summary]
+        Keeps the values of program slots of the individual, if they fit into its part of node_cache_limit.
+        ### Parameters
+        1. individual_index
+            - index of the individual
+        2. values
+            - values of all slots of the program of the individual
+        ### Returns
+        None
+        '''
+        fits_into_limit = values.nbytes <= self.node_cache_limit / self.population_size
+        self.node_outputs[individual_index] = values if fits_into_limit else None
+
+    def calculate_fitness_batch(self, individual_indexes):
+        '''[summary]
+        Calculates the fitness of the given individuals not found in the fitness cache, evaluated together in one batch.
+        ### Parameters
+        1. individual_indexes
+            - indexes of individuals to evaluate
+        ### Returns
+        None
+        '''
+        individual_indexes = [individual_index for individual_index in individual_indexes if not self.set_cached_fitness(individual_index)]
+        if len(individual_indexes) == 0:
+            return
+
+        programs = [self.get_program(individual_index) for individual_index in individual_indexes]
+        results = evaluate_programs_fitness(programs, self.evaluation_input_matrix, self.wanted_output, self.evaluation_max_error, self.precision)
+        self.evaluations += len(individual_indexes)
+        for individual_index, (fitness, is_acceptable) in zip(individual_indexes, results):
+            fitness, is_acceptable = self.confirm_fitness(individual_index, fitness, is_acceptable)
+            self.node_outputs[individual_index] = None
+            self.fitness_cache.put(self.phenotype_hashes[individual_index], fitness, is_acceptable, self.get_phenotype_genes(individual_index))
+            if is_acceptable:
+                self.solution_index = individual_index
+            self.set_fitness(individual_index, fitness)
+
     def calculate_fitness_all(self):
         '''[summary]
         Calculates the fitness of all individuals in the population.
@@ -407,42 +1078,33 @@ class Population:
         '''[summary]
         Returns the fittest individual from the population.
         ### Returns
-        1. List[List[int]]
+        1. np.ndarray
             - fittest individual
         2. float
             - fitness of the fittest individual
         '''
-        fittest_index = self.fitnesses.index(min(self.fitnesses))
+        fittest_index = int(np.argmin(self.fitnesses))
         return (self.get_individual(fittest_index), self.get_fitness(fittest_index))
 
     def get_children_fitness_array(self):
         '''[summary]
         Returns the fitnesses of the children.
         ### Returns
-        List[float]
-            - fitnesses of the children
+        np.ndarray
+            - copy of the fitnesses of the children, it does not change when the population changes
         '''
-        children_fitnesses = []
-        for child_index in self.children_indexes:
-            children_fitnesses.append(self.get_fitness(child_index))
-        return children_fitnesses
+        return self.fitnesses[self.nparents:].copy()
 
     def get_fittest_child(self):
         '''[summary]
         Returns the fittest child from the population.
         ### Returns
-        1. List[List[int]]
+        1. np.ndarray
             - fittest child
         2. float
             - fitness of the fittest child
         '''
-        best_child_index = self.children_indexes[0]
-        best_child_fitness = self.get_fitness(best_child_index)
-        for child_index in self.children_indexes:
-            if self.fitnesses[child_index] < best_child_fitness:
-                best_child_index = child_index
-                best_child_fitness = self.fitnesses[child_index]
-
+        best_child_index, best_child_fitness = self.get_fittest_child_index()
         return (self.get_individual(best_child_index), best_child_fitness)
     
     def get_fittest_child_index(self):
@@ -454,13 +1116,9 @@ class Population:
         2. float
             - fitness of the fittest child
         '''
-        best_child_index = self.children_indexes[0]
-        best_child_fitness = self.get_fitness(best_child_index)
-        for child_index in self.children_indexes:
-            if self.fitnesses[child_index] < best_child_fitness:
-                best_child_index = child_index
-                best_child_fitness = self.fitnesses[child_index]
-        return best_child_index, best_child_fitness
+        # the first of equally fit children, children are the individuals after the parents
+        best_child_index = self.nparents + int(np.argmin(self.fitnesses[self.nparents:]))
+        return best_child_index, self.get_fitness(best_child_index)
 
     def get_parent_fitness(self, parent_index=0):
         '''[summary]
@@ -495,27 +1153,35 @@ class Population:
         1. new_parent_indexes
             - indexes of the new parents
         ### Returns
-        None
+        1. int
+            - index of the first new parent after it was set
+        2. int
+            - index of the second new parent after it was set
         '''
         if self.is_parent(new_parent_1_index) and self.is_parent(new_parent_2_index):
-            return
+            return new_parent_1_index, new_parent_2_index
         elif self.is_parent(new_parent_1_index):
             if new_parent_1_index == 0:
                 self.move_individual(new_parent_2_index, 1)
+                return 0, 1
             elif new_parent_1_index == 1:
                 self.move_individual(new_parent_2_index, 0)
+                return 1, 0
             else:
                 raise ValueError("Parent index out of range")
         elif self.is_parent(new_parent_2_index):
             if new_parent_2_index == 0:
                 self.move_individual(new_parent_1_index, 1)
+                return 1, 0
             elif new_parent_2_index == 1:
                 self.move_individual(new_parent_1_index, 0)
+                return 0, 1
             else:
                 raise ValueError("Parent index out of range")
         else:
             self.move_individual(new_parent_1_index, 0)
             self.move_individual(new_parent_2_index, 1)
+            return 0, 1
 
     def is_parent(self, index):
         '''[summary]
@@ -542,4 +1208,9 @@ class Population:
         '''
         self.population[to_index] = self.population[from_index]
         self.active_paths[to_index] = self.active_paths[from_index]
+        self.active_masks[to_index] = self.active_masks[from_index]
+        self.reference_counts[to_index] = self.reference_counts[from_index]
+        self.programs[to_index] = self.programs[from_index]
+        self.node_outputs[to_index] = self.node_outputs[from_index]
+        self.phenotype_hashes[to_index] = self.phenotype_hashes[from_index]
         self.fitnesses[to_index] = self.fitnesses[from_index]
\ No newline at end of file
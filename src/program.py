@@ -0,0 +1,548 @@
+'''
+File: program.py
+Purpose: Contains the compilation of active genes into evaluation programs used in the CGP algorithm
+Author: Petr Bromnik
+'''
+
+from constants.operations import operations, op_inputs
+from kernels import kernels
+from utils import get_evaluation_order
+import numpy as np
+
+# number of inputs of the operations, indexed by the integer opcode (index of the operation in operations), see kernels for their functions
+opcode_inputs = [op_inputs[operation] for operation in operations]
+# operations giving the same result for swapped operands, their operands are ordered in structural hashes
+commutative_opcodes = {operations.index('+'), operations.index('*')}
+SUBTRACT_OPCODE = operations.index('-')
+MULTIPLY_OPCODE = operations.index('*')
+MOD_OPCODE = operations.index('%')
+
+def input_structural_hash(input_index):
+    '''[summary]
+    Returns structural hash of the input with the given index, see compile_program
+    ### Parameters
+    1. input_index
+        - index of the input
+    ### Returns
+    int
+        - structural hash of the input
+    '''
+    return hash(("input", input_index))
+
+def instruction_structural_key(opcode, first_operand_hash, second_operand_hash = None):
+    '''[summary]
+    Returns structural key of an instruction, its opcode and structural hashes of its operands, equal for instructions calculating the same expression
+    ### Parameters
+    1. opcode
+        - integer opcode of the instruction
+    2. first_operand_hash
+        - structural hash of the first operand
+    3. second_operand_hash
+        - structural hash of the second operand, None for operations with one input
+    ### Returns
+    tuple
+        - structural key of the instruction, operands of commutative operations are ordered
+    '''
+    if second_operand_hash is None:
+        return (opcode, first_operand_hash)
+    if opcode in commutative_opcodes and second_operand_hash < first_operand_hash:
+        first_operand_hash, second_operand_hash = second_operand_hash, first_operand_hash
+    return (opcode, first_operand_hash, second_operand_hash)
+
+def instruction_structural_hash(opcode, first_operand_hash, second_operand_hash = None):
+    '''[summary]
+    Returns structural hash of an instruction, hash of its structural key (see instruction_structural_key)
+    ### Parameters
+    1. opcode
+        - integer opcode of the instruction
+    2. first_operand_hash
+        - structural hash of the first operand
+    3. second_operand_hash
+        - structural hash of the second operand, None for operations with one input
+    ### Returns
+    int
+        - structural hash of the instruction
+    '''
+    return hash(instruction_structural_key(opcode, first_operand_hash, second_operand_hash))
+
+def constant_structural_hash(value):
+    '''[summary]
+    Returns structural hash of a value not depending on the inputs, see compile_program
+    ### Parameters
+    1. value
+        - the value
+    ### Returns
+    int
+        - structural hash of the value
+    '''
+    return hash(("constant", value))
+
+def constant_value(opcode, first_operand_value, second_operand_value = None, same_operands = False):
+    '''[summary]
+    Returns the value of an instruction if it is the same for every sample (does not depend on the inputs), see kernels for the protected domains:
+    - x - x and x % x are 0.0 (0.0 also outside of the domains)
+    - x * 0.0 and x % 0.0 are 0.0 for any x
+    - an operation with all operands not depending on the inputs is calculated once, on a single value
+    ### Parameters
+    1. opcode
+        - integer opcode of the instruction
+    2. first_operand_value
+        - value of the first operand, None if it depends on the inputs
+    3. second_operand_value
+        - value of the second operand, None if it depends on the inputs or the operation has one input
+    4. same_operands
+        - True if both operands calculate the same expression (have the same structural hash)
+    ### Returns
+    float | None
+        - value of the instruction, None if it depends on the inputs
+    '''
+    if same_operands and opcode in (SUBTRACT_OPCODE, MOD_OPCODE):
+        return 0.0
+    if opcode == MULTIPLY_OPCODE and (first_operand_value == 0.0 or second_operand_value == 0.0):
+        return 0.0
+    if opcode == MOD_OPCODE and second_operand_value == 0.0:
+        return 0.0
+    if first_operand_value is None or (opcode_inputs[opcode] == 2 and second_operand_value is None):
+        return None
+
+    operands = [np.array([first_operand_value])] if opcode_inputs[opcode] == 1 else [np.array([first_operand_value]), np.array([second_operand_value])]
+    return float(kernels[opcode](*operands, out=np.empty(1))[0])
+
+class Program:
+    def __init__(self, ninputs, genes, opcodes, operands, destinations, output_slots, levels, hashes = None, constant_genes = (), constant_slots = (), constant_values = (), keys = None):
+        '''[summary]
+        Compiled active graph of a genome. Every instruction reads its operands from slots and writes its result to a slot.
+        Slots 0 to ninputs - 1 hold the input values, every instruction and every constant has its own slot after them.
+        ### Parameters
+        1. ninputs
+            - number of input slots
+        2. genes
+            - index of the gene each instruction was compiled from
+        3. opcodes
+            - integer opcode of each instruction
+        4. operands
+            - slots of the first and the second operand of each instruction, -1 for an unused operand
+        5. destinations
+            - slot each instruction writes its result to
+        6. output_slots
+            - slots holding the outputs of the genome
+        7. levels
+            - level of each instruction, longest path from the inputs, instructions on the same level do not depend on each other
+        8. hashes
+            - structural hash of each instruction (opcode and structural hashes of its operands), the same for the same expression
+        9. constant_genes
+            - index of each gene whose value does not depend on the inputs, it is not compiled into an instruction
+        10. constant_slots
+            - slot holding the value of each such gene, filled with the value before the instructions are run
+        11. constant_values
+            - value of each such gene, calculated once at compilation (see constant_value)
+        12. keys
+            - structural key of each instruction (see instruction_structural_key), hashes are hashes of the keys
+        '''
+        self.ninputs = ninputs
+        self.genes = np.array(genes, dtype=np.int32)
+        self.opcodes = np.array(opcodes, dtype=np.int8)
+        self.operands = np.array(operands, dtype=np.int32).reshape(-1, 2)
+        self.destinations = np.array(destinations, dtype=np.int32)
+        self.output_slots = np.array(output_slots, dtype=np.int32)
+        self.levels = np.array(levels, dtype=np.int32)
+        self.hashes = list(hashes) if hashes is not None else [None] * len(self.destinations)
+        self.keys = list(keys) if keys is not None else [None] * len(self.destinations)
+        self.constant_genes = np.array(constant_genes, dtype=np.int32)
+        self.constant_slots = np.array(constant_slots, dtype=np.int32)
+        self.constant_values = np.array(constant_values, dtype=np.float64)
+        self.nslots = ninputs + len(self.destinations) + len(self.constant_slots)
+        # plain python form of the instructions, iterating over it is cheaper than indexing numpy arrays
+        self.instructions = list(zip(self.opcodes.tolist(), self.destinations.tolist(), self.operands[:, 0].tolist(), self.operands[:, 1].tolist()))
+        self.constants = list(zip(self.constant_slots.tolist(), self.constant_values.tolist()))
+
+    def __len__(self):
+        return len(self.instructions)
+
+def compile_program(genome, active_gene_indexes, ninputs, in_evaluation_order = False):
+    '''[summary]
+    Compiles the active genes of a genome into a program.
+    Genes whose value does not depend on the inputs (for example x - x or cos(x - x)) are folded into constants,
+    their value is calculated once and only filled into their slot when the program is run.
+    ### Parameters
+    1. genome
+        - genome to compile
+    2. active_gene_indexes
+        - indexes of active genes in the genome, in any order
+    3. ninputs
+        - number of input genes (and input slots)
+    4. in_evaluation_order
+        - True if active_gene_indexes are already sorted (e.g. from get_active_genes), they are not sorted again
+        - default False, they are sorted by get_evaluation_order
+    ### Returns
+    Program
+        - compiled program
+    '''
+    gene_to_slot = {i: i for i in range(ninputs)}
+    slot_levels = [0] * ninputs
+    slot_hashes = [input_structural_hash(i) for i in range(ninputs)]
+    genes = []
+    opcodes = []
+    operands = []
+    destinations = []
+    output_slots = []
+    levels = []
+    hashes = []
+    keys = []
+    slot_constants = [None] * ninputs # value of slots not depending on the inputs, None for the others
+    constant_genes = []
+    constant_slots = []
+    constant_values = []
+    folded_operand_slots = set() # slots read by genes folded into constants
+
+    for gene_index in (active_gene_indexes if in_evaluation_order else get_evaluation_order(active_gene_indexes)):
+        gene = genome[gene_index]
+        gene_operation = int(gene[0])
+
+        # in case of input gene, skip it
+        if (gene_operation == -1):
+            continue
+
+        # in case of output gene, the output is the slot of its input, no instruction needed
+        # (an output gene used as an input of a later gene passes the value of its input through)
+        if (gene_operation == -2):
+            gene_to_slot[gene_index] = gene_to_slot[int(gene[1])]
+            output_slots.append(gene_to_slot[gene_index])
+            continue
+
+        # function genes
+        destination = ninputs + len(destinations) + len(constant_slots)
+        first_operand = gene_to_slot[int(gene[1])]
+        second_operand = gene_to_slot[int(gene[2])] if opcode_inputs[gene_operation] == 2 else -1
+        gene_to_slot[gene_index] = destination
+
+        value = constant_value(gene_operation,
+                               slot_constants[first_operand],
+                               slot_constants[second_operand] if second_operand != -1 else None,
+                               second_operand != -1 and slot_hashes[first_operand] == slot_hashes[second_operand])
+        if value is not None:
+            folded_operand_slots.update((first_operand, second_operand))
+            constant_genes.append(gene_index)
+            constant_slots.append(destination)
+            constant_values.append(value)
+            slot_levels.append(0)
+            slot_hashes.append(constant_structural_hash(value))
+            slot_constants.append(value)
+            continue
+
+        genes.append(gene_index)
+        opcodes.append(gene_operation)
+        operands.append((first_operand, second_operand))
+        destinations.append(destination)
+        levels.append(1 + max(slot_levels[first_operand], slot_levels[second_operand] if second_operand != -1 else 0))
+        slot_levels.append(levels[-1])
+        keys.append(instruction_structural_key(gene_operation, slot_hashes[first_operand], slot_hashes[second_operand] if second_operand != -1 else None))
+        hashes.append(hash(keys[-1]))
+        slot_hashes.append(hashes[-1])
+        slot_constants.append(None)
+
+    # instructions read only by folded genes (sin(x) of sin(x) - sin(x)) are not needed, their slots are removed
+    # (slots not read at all are kept, all given genes are compiled)
+    read_slots = folded_operand_slots.union(*operands)
+    live_slots = set(output_slots)
+    for destination, operand_slots in zip(reversed(destinations), reversed(operands)):
+        if destination in live_slots or destination not in read_slots:
+            live_slots.add(destination)
+            live_slots.update(operand_slots)
+    live_slots.update(slot for slot in constant_slots if slot not in read_slots)
+    new_slots = {-1: -1, **{i: i for i in range(ninputs)}}
+    for slot in sorted(slot for slot in live_slots if slot >= ninputs):
+        new_slots[slot] = len(new_slots) - 1
+
+    live = [i for i, destination in enumerate(destinations) if destination in live_slots]
+    live_constants = [j for j, slot in enumerate(constant_slots) if slot in live_slots]
+    return Program(ninputs,
+                   [genes[i] for i in live],
+                   [opcodes[i] for i in live],
+                   [(new_slots[operands[i][0]], new_slots[operands[i][1]]) for i in live],
+                   [new_slots[destinations[i]] for i in live],
+                   [new_slots[output_slot] for output_slot in output_slots],
+                   [levels[i] for i in live],
+                   [hashes[i] for i in live],
+                   [constant_genes[j] for j in live_constants],
+                   [new_slots[constant_slots[j]] for j in live_constants],
+                   [constant_values[j] for j in live_constants],
+                   [keys[i] for i in live])
+
+def run_program(program, input_matrix, subexpression_cache = None, dtype = np.float64):
+    '''[summary]
+    Runs the program for the given input values.
+    ### Parameters
+    1. program
+        - program to run
+    2. input_matrix
+        - list of input values to calculate output for
+        - each list of input values is one input
+    3. subexpression_cache
+        - SubexpressionCache of values calculated for the same input_matrix, instructions found in it (by structural hash and key) are copied from it
+        - values of calculated instructions are put into it
+    4. dtype
+        - floating point type the program is evaluated in (np.float64 or np.float32)
+    ### Returns
+    np.ndarray
+        - values of all slots of the program, one row per slot
+    '''
+    values = np.full((program.nslots, len(input_matrix[0])), 0.0, dtype=dtype)
+
+    # fill the input slots with input values
+    for i in range(program.ninputs):
+        values[i] = input_matrix[i]
+    # slots not depending on the inputs are filled with their value calculated at compilation
+    for slot, value in program.constants:
+        values[slot] = value
+
+    # the result is written directly to the destination slot
+    with np.errstate(over='ignore'): # float32 products can overflow to inf, which the kernels treat as out of range
+        for (opcode, destination, first_operand, second_operand), structural_hash, structural_key in zip(program.instructions, program.hashes, program.keys):
+            if subexpression_cache is not None:
+                cached_values = subexpression_cache.get(structural_hash, structural_key)
+                if cached_values is not None:
+                    values[destination] = cached_values
+                    continue
+
+            if second_operand == -1:
+                kernels[opcode](values[first_operand], out=values[destination])
+            else:
+                kernels[opcode](values[first_operand], values[second_operand], out=values[destination])
+
+            if subexpression_cache is not None:
+                subexpression_cache.put(structural_hash, values[destination], structural_key)
+
+    return values
+
+def run_program_incremental(program, input_matrix, parent_program, parent_values, changed_gene_indexes, subexpression_cache = None):
+    '''[summary]
+    Runs the program of a child, reusing values of the slots of its parent, see run_program.
+    Only instructions of changed genes, of genes not compiled in the parent and of genes depending on them are calculated,
+    values of all other instructions are copied from the parent.
+    ### Parameters
+    1. program
+        - program of the child to run
+    2. input_matrix
+        - list of input values to calculate output for, the same as the parent values were calculated for
+    3. parent_program
+        - program of the parent
+    4. parent_values
+        - values of all slots of the parent program, as returned by run_program, the child is evaluated in their dtype
+    5. changed_gene_indexes
+        - indexes of genes in which the child differs from the parent
+    6. subexpression_cache
+        - SubexpressionCache consulted for the instructions that are calculated, see run_program
+    ### Returns
+    np.ndarray
+        - values of all slots of the program, one row per slot
+    '''
+    values = np.full((program.nslots, len(input_matrix[0])), 0.0, dtype=parent_values.dtype)
+    values[:program.ninputs] = parent_values[:program.ninputs]
+
+    parent_slots = dict(zip(parent_program.genes.tolist(), parent_program.destinations.tolist()))
+    changed_genes = set(changed_gene_indexes)
+    recalculated = [False] * program.nslots # slots whose values may differ from the parent
+    parent_constants = dict(zip(parent_program.constant_genes.tolist(), parent_program.constant_values.tolist()))
+    for gene_index, (slot, value) in zip(program.constant_genes.tolist(), program.constants):
+        values[slot] = value
+        recalculated[slot] = parent_constants.get(gene_index) != value
+
+    with np.errstate(over='ignore'): # float32 products can overflow to inf, which the kernels treat as out of range
+        for (opcode, destination, first_operand, second_operand), gene_index, structural_hash, structural_key in zip(program.instructions, program.genes.tolist(), program.hashes, program.keys):
+            parent_slot = parent_slots.get(gene_index)
+            if parent_slot is not None and gene_index not in changed_genes and not recalculated[first_operand] and (second_operand == -1 or not recalculated[second_operand]):
+                values[destination] = parent_values[parent_slot]
+                continue
+
+            recalculated[destination] = True
+            if subexpression_cache is not None:
+                cached_values = subexpression_cache.get(structural_hash, structural_key)
+                if cached_values is not None:
+                    values[destination] = cached_values
+                    continue
+
+            if second_operand == -1:
+                kernels[opcode](values[first_operand], out=values[destination])
+            else:
+                kernels[opcode](values[first_operand], values[second_operand], out=values[destination])
+
+            if subexpression_cache is not None:
+                subexpression_cache.put(structural_hash, values[destination], structural_key)
+
+    return values
+
+def allocate_registers(program):
+    '''[summary]
+    Assigns registers (rows of a buffer) to the instructions of the program, a register is reused as soon as
+    the value in it is not needed anymore, so only values that are still needed (live) take memory.
+    Registers 0 to ninputs - 1 are the inputs, the others are rows of a buffer of nregisters rows after them.
+    ### Parameters
+    1. program
+        - program to allocate registers for
+    ### Returns
+    1. List[Tuple[int, int, int, int]]
+        - instructions (opcode, destination register, first operand register, second operand register or -1)
+    2. List[int]
+        - registers of the outputs
+    3. int
+        - number of registers needed in the buffer (maximum number of live values)
+    4. List[Tuple[int, float]]
+        - registers of the constants read by instructions or outputs and their values, filled before the instructions
+    '''
+    # index of the last instruction reading each slot, outputs are read after all instructions
+    last_use = {}
+    for instruction_index, (opcode, destination, first_operand, second_operand) in enumerate(program.instructions):
+        last_use[first_operand] = instruction_index
+        if second_operand != -1:
+            last_use[second_operand] = instruction_index
+    for output_slot in program.output_slots.tolist():
+        last_use[output_slot] = len(program.instructions)
+
+    slot_registers = {i: i for i in range(program.ninputs)}
+    free_registers = []
+    nregisters = 0
+    register_instructions = []
+
+    # constants are live from the start, constants read only by other constants need no register
+    register_constants = []
+    for slot, value in program.constants:
+        if slot in last_use:
+            slot_registers[slot] = program.ninputs + nregisters
+            nregisters += 1
+            register_constants.append((slot_registers[slot], value))
+    for instruction_index, (opcode, destination, first_operand, second_operand) in enumerate(program.instructions):
+        first_register = slot_registers[first_operand]
+        second_register = slot_registers[second_operand] if second_operand != -1 else -1
+
+        # operands read for the last time are released before the destination is allocated, kernels can write over their operands
+        for operand in {first_operand, second_operand}:
+            if operand >= program.ninputs and last_use[operand] == instruction_index:
+                free_registers.append(slot_registers[operand])
+
+        if len(free_registers) > 0:
+            destination_register = free_registers.pop()
+        else:
+            destination_register = program.ninputs + nregisters
+            nregisters += 1
+        slot_registers[destination] = destination_register
+        register_instructions.append((opcode, destination_register, first_register, second_register))
+
+    return register_instructions, [slot_registers[output_slot] for output_slot in program.output_slots.tolist()], nregisters, register_constants
+
+def run_registers(register_instructions, input_chunk, buffer, register_constants = ()):
+    '''[summary]
+    Runs instructions with allocated registers (see allocate_registers) for one chunk of samples.
+    ### Parameters
+    1. register_instructions
+        - instructions as returned by allocate_registers
+    2. input_chunk
+        - input values of the chunk, one row per input
+    3. buffer
+        - buffer of nregisters rows with the same number of samples as the chunk, overwritten
+    4. register_constants
+        - registers of constants and their values, as returned by allocate_registers
+    ### Returns
+    List[np.ndarray]
+        - registers, the inputs followed by the rows of the buffer
+    '''
+    registers = list(input_chunk) + list(buffer)
+    for register, value in register_constants:
+        registers[register][:] = value
+    with np.errstate(over='ignore'): # float32 products can overflow to inf, which the kernels treat as out of range
+        for opcode, destination, first_operand, second_operand in register_instructions:
+            if second_operand == -1:
+                kernels[opcode](registers[first_operand], out=registers[destination])
+            else:
+                kernels[opcode](registers[first_operand], registers[second_operand], out=registers[destination])
+    return registers
+
+def program_output(program, values):
+    '''[summary]
+    Returns the outputs of the program from values of its slots.
+    ### Parameters
+    1. program
+        - program the values belong to
+    2. values
+        - values of all slots of the program, as returned by run_program
+    ### Returns
+    np.ndarray
+        - output of the program, with several output genes one row per output gene (in the order of the genome)
+    '''
+    if len(program.output_slots) == 1:
+        return values[program.output_slots[0]]
+    return values[program.output_slots]
+
+def run_programs(programs, input_matrix, dtype = np.float64):
+    '''[summary]
+    Runs several programs with the same inputs together, returns their outputs.
+    Slots of all programs are stacked into one matrix (input slots are shared) and every group of instructions
+    with the same level and opcode is calculated by one call of the operation function, for all programs at once.
+    ### Parameters
+    1. programs
+        - programs to run, all with the same number of inputs
+    2. input_matrix
+        - list of input values to calculate output for
+        - each list of input values is one input
+    3. dtype
+        - floating point type the programs are evaluated in (np.float64 or np.float32)
+    ### Returns
+    np.ndarray
+        - outputs of the programs, one row per program (a matrix per program with several output genes, see program_output)
+    '''
+    ninputs = programs[0].ninputs
+
+    # offset of the first non input slot of each program in the stacked matrix
+    offsets = np.cumsum([ninputs] + [program.nslots - ninputs for program in programs])
+    values = np.full((offsets[-1], len(input_matrix[0])), 0.0, dtype=dtype)
+    for i in range(ninputs):
+        values[i] = input_matrix[i]
+
+    def to_stacked_slots(program_slots, offset):
+        # input slots are shared, slots of instructions are shifted to the part of the program
+        return np.where(program_slots < ninputs, program_slots, program_slots - ninputs + offset)
+
+    # one output slot per program, or a row of output slots per program with several output genes
+    output_slots = np.array([to_stacked_slots(program.output_slots, offset) for program, offset in zip(programs, offsets)])
+    if output_slots.shape[1] == 1:
+        output_slots = output_slots[:, 0]
+    for program, offset in zip(programs, offsets):
+        for slot, value in program.constants:
+            values[slot - ninputs + offset] = value
+    if sum(len(program) for program in programs) == 0:
+        return values[output_slots]
+
+    levels = np.concatenate([program.levels for program in programs])
+    opcodes = np.concatenate([program.opcodes for program in programs])
+    destinations = np.concatenate([to_stacked_slots(program.destinations, offset) for program, offset in zip(programs, offsets)])
+    operands = np.concatenate([np.where(program.operands == -1, -1, to_stacked_slots(program.operands, offset)) for program, offset in zip(programs, offsets)])
+
+    # instructions grouped by level first, then by opcode, so inputs of every group are calculated before it
+    order = np.lexsort((opcodes, levels))
+    group_keys = levels[order] * len(kernels) + opcodes[order]
+    group_starts = np.flatnonzero(np.diff(group_keys, prepend=-1))
+    group_ends = np.append(group_starts[1:], len(order))
+
+    with np.errstate(over='ignore'): # float32 products can overflow to inf, which the kernels treat as out of range
+        for start, end in zip(group_starts.tolist(), group_ends.tolist()):
+            group = order[start:end]
+            opcode = opcodes[group[0]]
+            first_operands = operands[group, 0]
+            second_operands = operands[group, 1]
+
+            # a single instruction is written directly to its slot, without gathering the operands
+            if len(group) == 1:
+                if opcode_inputs[opcode] == 1:
+                    kernels[opcode](values[first_operands[0]], out=values[destinations[group[0]]])
+                else:
+                    kernels[opcode](values[first_operands[0]], values[second_operands[0]], out=values[destinations[group[0]]])
+                continue
+
+            results = np.empty((len(group), values.shape[1]), dtype=dtype)
+            if opcode_inputs[opcode] == 1:
+                kernels[opcode](values[first_operands], out=results)
+            else:
+                kernels[opcode](values[first_operands], values[second_operands], out=results)
+            values[destinations[group]] = results
+
+    return values[output_slots]
@@ -0,0 +1,147 @@
+'''
+File: subexpression_cache.py
+Purpose: Contains the cache of values of subexpressions shared by individuals of one generation in the CGP algorithm
+Author: Petr Bromnik
+'''
+
+class SubexpressionCache:
+    def __init__(self, max_bytes = 2**26):
+        '''[summary]
+        Cache of values of program slots keyed by structural hash (see compile_program), so every subexpression
+        shared by individuals of a generation is calculated once. It is cleared at the start of every generation.
+        Values are cached with the structural key of their subexpression (see instruction_structural_key), values of a different
+        subexpression with the same hash are not used.
+        Values are not copied when cached, cached arrays must not be changed after they are put into the cache.
+        ### Parameters
+        1. max_bytes
+            - maximum number of bytes of memory kept by cached values, values over the limit are not cached, 0 disables the cache
+            - a cached row of a matrix keeps the whole matrix in memory, so the whole matrix is counted (once)
+        '''
+        self.max_bytes = max_bytes
+        self.values = {}
+        self.kept_arrays = set() # ids of arrays kept in memory by cached values
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.collisions = 0 # lookups of a structural hash cached for a different subexpression
+
+    def __len__(self):
+        return len(self.values)
+
+    def get(self, key, structural_key = None):
+        '''[summary]
+        Returns the cached values of the subexpression.
+        ### Parameters
+        1. key
+            - structural hash of the subexpression
+        2. structural_key
+            - structural key of the subexpression, see instruction_structural_key
+        ### Returns
+        np.ndarray | None
+            - cached values, None if not cached or cached for a different subexpression
+        '''
+        entry = self.values.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+
+        values, cached_structural_key = entry
+        if cached_structural_key != structural_key:
+            self.misses += 1
+            self.collisions += 1
+            return None
+
+        self.hits += 1
+        return values
+
+    def put(self, key, values, structural_key = None):
+        '''[summary]
+        Caches the values of the subexpression, if they fit into max_bytes.
+        Values already cached under the same hash are kept, also for a different subexpression.
+        ### Parameters
+        1. key
+            - structural hash of the subexpression
+        2. values
+            - values of the subexpression, kept by reference
+        3. structural_key
+            - structural key of the subexpression, see instruction_structural_key
+        ### Returns
+        None
+        '''
+        if key in self.values:
+            return
+
+        kept_array = values if values.base is None else values.base
+        nbytes = 0 if id(kept_array) in self.kept_arrays else kept_array.nbytes
+        if self.nbytes + nbytes > self.max_bytes:
+            return
+
+        self.values[key] = (values, structural_key)
+        self.kept_arrays.add(id(kept_array))
+        self.nbytes += nbytes
+
+    def clear(self):
+        '''[summary]
+        Removes all cached values, statistics are kept.
+        ### Returns
+        None
+        '''
+        self.values = {}
+        self.kept_arrays = set()
+        self.nbytes = 0
+
+    def get_statistics(self):
+        '''[summary]
+        Returns the hit and miss statistics of the cache.
+        ### Returns
+        Dict[str, int]
+            - {"subexpression_cache_hits": int, "subexpression_cache_misses": int, "subexpression_cache_collisions": int}
+        '''
+        return {"subexpression_cache_hits": self.hits, "subexpression_cache_misses": self.misses, "subexpression_cache_collisions": self.collisions}
+
+class SubexpressionCacheChunk:
+    def __init__(self, subexpression_cache, start, end):
+        '''[summary]
+        View of a SubexpressionCache for one chunk of samples, cached values are sliced to the chunk.
+        Values of a chunk do not cover all samples, so they are not put into the cache.
+        ### Parameters
+        1. subexpression_cache
+            - SubexpressionCache of values of all samples
+        2. start
+            - index of the first sample of the chunk
+        3. end
+            - index after the last sample of the chunk
+        '''
+        self.subexpression_cache = subexpression_cache
+        self.start = start
+        self.end = end
+
+    def get(self, key, structural_key = None):
+        '''[summary]
+        Returns the cached values of the subexpression for the samples of the chunk, see SubexpressionCache.get
+        ### Parameters
+        1. key
+            - structural hash of the subexpression
+        2. structural_key
+            - structural key of the subexpression, see instruction_structural_key
+        ### Returns
+        np.ndarray | None
+            - cached values of the chunk, None if not cached
+        '''
+        values = self.subexpression_cache.get(key, structural_key)
+        return None if values is None else values[self.start:self.end]
+
+    def put(self, key, values, structural_key = None):
+        '''[summary]
+        Does nothing, values of one chunk are not cached.
+        ### Parameters
+        1. key
+            - structural hash of the subexpression
+        2. values
+            - values of the subexpression for the samples of the chunk
+        3. structural_key
+            - structural key of the subexpression
+        ### Returns
+        None
+        '''
+        pass
@@ -0,0 +1,119 @@
+from __future__ import annotations
+from codegen import GeneratedFunctionCache, compile_generated_function, generate_source
+from constants.backendEnum import BackendEnum
+from constants.functions import functions
+from genome import genome_output
+from population import Population
+from program import compile_program, program_output, run_program
+from utils import get_active_gene_indexes, get_output_gene_indexes
+
+import unittest
+import numpy as np
+
+test_genome = [
+            [-1, -1, -1],   # 0   | x
+            [-1, -1, -1],   # 1   | y
+            [0, 0, 1],      # 2   | x + y
+            [4, 2, -1],     # 3   | sin(x + y)
+            [2, 3, 0],      # 4   | sin(x + y) * x
+            [7, 1, -1],     # 5   |
+            [-2, 4, -2]     # 6
+        ]                   # sin(x + y) * x
+
+class TestCodegen(unittest.TestCase):
+    def test_generate_source(self):
+        active_genes = get_active_gene_indexes(test_genome, get_output_gene_indexes(test_genome))
+        program = compile_program(test_genome, active_genes, 2)
+        source = generate_source(program)
+
+        self.assertNotIn("for ", source, "generated function should be straight-line")
+        self.assertEqual(source.count("out=np.empty(nsamples, dtype=dtype)"), len(program), "every instruction should be one kernel call")
+
+        input_matrix = np.array([np.linspace(-1, 1, 10), np.linspace(0, 2, 10)])
+        output = compile_generated_function(program)(input_matrix)
+        self.assertListEqual(output.tolist(), (np.sin(input_matrix[0] + input_matrix[1]) * input_matrix[0]).tolist())
+
+    def test_several_outputs(self):
+        genome = [[-1, -1, -1], [4, 0, -1], [2, 1, 0], [-2, 0, -2], [-2, 2, -2]] # x, sin(x) * x
+        program = compile_program(genome, get_active_gene_indexes(genome, get_output_gene_indexes(genome)), 1)
+        input_matrix = np.array([np.linspace(-1, 1, 10)])
+        output = compile_generated_function(program)(input_matrix)
+        self.assertListEqual(output.tolist(), program_output(program, run_program(program, input_matrix)).tolist())
+        self.assertEqual(output.shape, (2, 10))
+
+    def test_constants(self):
+        genome = [[-1, -1, -1], [1, 0, 0], [5, 1, -1], [0, 2, 0], [-2, 3, -2]] # cos(x - x) + x
+        program = compile_program(genome, get_active_gene_indexes(genome, get_output_gene_indexes(genome)), 1)
+        self.assertEqual(len(program), 1, "cos(x - x) should be folded into a constant")
+        input_matrix = np.array([np.linspace(-1, 1, 10)])
+        for dtype in (np.float64, np.float32):
+            output = compile_generated_function(program)(input_matrix, dtype)
+            self.assertEqual(output.dtype, dtype)
+            self.assertListEqual(output.tolist(), (input_matrix[0].astype(dtype) + dtype(1)).tolist())
+
+    def test_output_from_input(self):
+        genome = [[-1, -1, -1], [0, 0, 0], [-2, 0, -2]] # x
+        program = compile_program(genome, [0, 2], 1)
+        input_matrix = np.array([np.linspace(-1, 1, 10)])
+        output = compile_generated_function(program)(input_matrix)
+        self.assertListEqual(output.tolist(), input_matrix[0].tolist())
+        output[0] = 5.0
+        self.assertEqual(input_matrix[0][0], -1.0, "output should not be a view of the input")
+
+    def test_generated_functions_match_interpreter(self):
+        # random genomes with all operations, on inputs of all functions of the experiments
+        for function in functions.values():
+            input_matrix = function["input"]
+            population = Population(1, 30, function["n_inputs"], 0.1, input_matrix, function["wanted_output"])
+            for i in range(30):
+                genome = population.get_random_genome()
+                active_genes = get_active_gene_indexes(genome, get_output_gene_indexes(genome))
+                program = compile_program(genome, active_genes, function["n_inputs"])
+                expected = program_output(program, run_program(program, input_matrix))
+                output = compile_generated_function(program)(input_matrix)
+                self.assertListEqual(output.tolist(), expected.tolist(), "generated function should match interpreter for " + function["name"])
+                output = genome_output(genome, active_genes, input_matrix, backend=BackendEnum.CODEGEN)
+                self.assertListEqual(output.tolist(), expected.tolist(), "genome output should match interpreter for " + function["name"])
+
+    def test_generated_function_cache(self):
+        active_genes = get_active_gene_indexes(test_genome, get_output_gene_indexes(test_genome))
+        program = compile_program(test_genome, active_genes, 2)
+        cache = GeneratedFunctionCache(max_entries=2)
+
+        function = cache.get_function(1, program)
+        self.assertIs(cache.get_function(1, program), function, "cached function should be reused")
+        self.assertEqual((cache.hits, cache.misses), (1, 1))
+
+        cache.get_function(2, program)
+        cache.get_function(3, program)
+        self.assertEqual(len(cache), 2)
+        self.assertIsNot(cache.get_function(1, program), function, "least recently used function should be evicted")
+
+        # a function of a different program cached under the same key is not used
+        other_genome = [[-1, -1, -1], [-1, -1, -1], [1, 0, 1], [-2, 2, -2]] # x - y
+        other_program = compile_program(other_genome, get_active_gene_indexes(other_genome, get_output_gene_indexes(other_genome)), 2)
+        input_matrix = np.array([np.linspace(-1, 1, 20), np.linspace(1, 2, 20)])
+        output = cache.get_function(1, other_program)(input_matrix)
+        self.assertListEqual(output.tolist(), (input_matrix[0] - input_matrix[1]).tolist(), "colliding program should be generated")
+        self.assertEqual(cache.collisions, 1)
+        self.assertEqual(len(cache), 2)
+
+        cache = GeneratedFunctionCache(max_entries=0)
+        cache.get_function(1, program)
+        self.assertEqual(len(cache), 0)
+
+    def test_population_codegen_backend(self):
+        input_matrix = np.array([np.linspace(-1, 1, 20)])
+        wanted_output = input_matrix[0] ** 2
+        interpreted = Population(5, 10, 1, 0.1, input_matrix, wanted_output, fitness_cache_size=0)
+        generated = Population(5, 10, 1, 0.1, input_matrix, wanted_output, fitness_cache_size=0, backend=BackendEnum.CODEGEN)
+        generated.set_children(interpreted.get_children())
+        interpreted.set_children(interpreted.get_children())
+        self.assertListEqual(generated.get_children_fitness_array().tolist(), interpreted.get_children_fitness_array().tolist())
+        self.assertGreater(len(generated.generated_functions), 0)
+
+        with self.assertRaises(ValueError):
+            Population(5, 10, 1, 0.1, input_matrix, wanted_output, backend=1)
+
+if __name__ == '__main__':
+    unittest.main()
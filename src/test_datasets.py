@@ -0,0 +1,75 @@
+from __future__ import annotations
+from constants.functions import functions, koza_3, training_set_1
+from datasets import DatasetRegistry
+
+import json
+import os
+import tempfile
+import unittest
+import numpy as np
+
+class TestDatasets(unittest.TestCase):
+
+    def test_builtin_datasets(self):
+        self.assertListEqual(list(functions), ['koza_3', 'nguyen_6', 'nguyen_8', 'nguyen_9', 'nguyen_10'])
+        koza = functions['koza_3']
+        self.assertListEqual(koza['wanted_output'].tolist(), koza_3(training_set_1()).tolist())
+        self.assertEqual(koza['n_inputs'], 1)
+        self.assertEqual(koza['name'], 'Koza 3')
+        self.assertEqual(koza['n_columns'], 150)
+        self.assertEqual(functions['nguyen_9']['n_inputs'], 2)
+        self.assertIs(functions['koza_3'], koza, "loaded datasets should be cached")
+
+        with self.assertRaises(KeyError):
+            functions['unknown']
+
+    def test_lazy_loading(self):
+        loads = []
+        registry = DatasetRegistry()
+        registry.register('square', lambda: loads.append(1) or (np.array([[1.0, 2.0]]), np.array([1.0, 4.0])), n_columns=10)
+        self.assertEqual(len(loads), 0, "datasets should not be loaded when registered")
+        self.assertFalse(registry.is_loaded('square'))
+
+        registry['square']
+        registry['square']
+        self.assertEqual(len(loads), 1, "datasets should be loaded once")
+        self.assertTrue(registry.is_loaded('square'))
+
+    def test_files_and_manifest(self):
+        input_matrix = np.array([np.linspace(-1, 1, 50)])
+        wanted_output = input_matrix[0] ** 2
+        with tempfile.TemporaryDirectory() as directory:
+            np.save(os.path.join(directory, 'input.npy'), input_matrix)
+            np.save(os.path.join(directory, 'output.npy'), wanted_output)
+            np.savez(os.path.join(directory, 'square.npz'), input=input_matrix, wanted_output=wanted_output)
+            manifest_path = os.path.join(directory, 'manifest.json')
+            with open(manifest_path, 'w') as f:
+                json.dump({
+                    'mapped': {'input': 'input.npy', 'wanted_output': 'output.npy', 'name': 'Mapped', 'n_columns': 20, 'mutation_rate': 0.1},
+                    'archive': {'input': 'square.npz'},
+                }, f)
+
+            registry = DatasetRegistry()
+            registry.register_manifest(manifest_path)
+            self.assertEqual(len(registry), 2)
+
+            # .npy files are memory mapped
+            mapped = registry['mapped']
+            self.assertIsInstance(mapped['input'], np.memmap)
+            self.assertListEqual(mapped['input'].tolist(), input_matrix.tolist())
+            self.assertListEqual(mapped['wanted_output'].tolist(), wanted_output.tolist())
+            self.assertEqual(mapped['name'], 'Mapped')
+            self.assertEqual(mapped['mutation_rate'], 0.1)
+
+            archive = registry['archive']
+            self.assertEqual(archive['name'], 'archive')
+            self.assertEqual(archive['n_inputs'], 1)
+            self.assertListEqual(archive['wanted_output'].tolist(), wanted_output.tolist())
+
+            registry.register_files('missing_output', os.path.join(directory, 'input.npy'))
+            with self.assertRaises(ValueError):
+                registry['missing_output']
+            del mapped, registry
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,91 @@
+from __future__ import annotations
+from fitness_cache import FitnessCache, phenotype_genes, phenotype_hash, update_phenotype_hash
+from genome import mutate_individual_with_changes
+from population import Population
+from utils import get_active_gene_indexes, get_output_gene_indexes
+
+import unittest
+import numpy as np
+
+test_genome = [
+    [-1, -1, -1],   # 0   | x
+    [0, 0, 0],      # 1   | x + x
+    [2, 0, 1],      # 2   | (x + x) * x
+    [1, 0, 0],      # 3   |
+    [-2, 2, -2]     # 4   | (x + x) * x
+]
+
+class TestFitnessCache(unittest.TestCase):
+
+    def test_phenotype_hash(self):
+        active_genes = get_active_gene_indexes(test_genome, get_output_gene_indexes(test_genome))
+        genome_hash = phenotype_hash(test_genome, active_genes)
+
+        changed_inactive = [gene.copy() for gene in test_genome]
+        changed_inactive[3] = [4, 2, -1]
+        self.assertEqual(phenotype_hash(changed_inactive, active_genes), genome_hash, "inactive genes should not change the hash")
+        self.assertEqual(phenotype_hash(test_genome, active_genes[::-1]), genome_hash, "order of active genes should not change the hash")
+
+        changed_active = [gene.copy() for gene in test_genome]
+        changed_active[1] = [2, 0, 0]
+        self.assertNotEqual(phenotype_hash(changed_active, active_genes), genome_hash, "active genes should change the hash")
+
+    def test_update_phenotype_hash(self):
+        population = Population(1, 30, 2, 0.1, [[1], [1]], [1])
+        for i in range(50):
+            parent = population.get_random_genome()
+            parent_active_genes = get_active_gene_indexes(parent, get_output_gene_indexes(parent))
+            parent_hash = phenotype_hash(parent, parent_active_genes)
+            for j in range(5):
+                child, changed_gene_indexes = mutate_individual_with_changes(parent, 30, 2, 0.05)
+                child_active_genes = get_active_gene_indexes(child, get_output_gene_indexes(child))
+                self.assertEqual(update_phenotype_hash(parent_hash, parent, parent_active_genes, child, child_active_genes, changed_gene_indexes),
+                                 phenotype_hash(child, child_active_genes),
+                                 "updated hash should be the same as hash of the child")
+
+    def test_fitness_cache(self):
+        cache = FitnessCache(max_entries=2)
+        self.assertIsNone(cache.get(1))
+        cache.put(1, 0.5, False)
+        cache.put(2, 0.0, True)
+        self.assertEqual(cache.get(1), (0.5, False))
+        self.assertEqual(cache.get(2), (0.0, True))
+
+        # least recently used entry is evicted
+        cache.get(1)
+        cache.put(3, 1.5, False)
+        self.assertEqual(len(cache), 2)
+        self.assertIsNone(cache.get(2), "least recently used entry should be evicted")
+        self.assertEqual(cache.get(1), (0.5, False))
+        self.assertEqual(cache.get_statistics(), {"fitness_cache_hits": 4, "fitness_cache_misses": 2, "fitness_cache_evictions": 1, "fitness_cache_collisions": 0})
+
+        # memory limit
+        cache = FitnessCache(max_entries=100, max_bytes=3 * cache.entry_size(1, (0.5, False)))
+        for key in range(10):
+            cache.put(key, float(key), False)
+        self.assertEqual(len(cache), 3, "entries over the memory limit should be evicted")
+        self.assertEqual(list(cache.entries.keys()), [7, 8, 9])
+
+        # phenotypes with the same hash do not share a fitness
+        active_genes = get_active_gene_indexes(test_genome, get_output_gene_indexes(test_genome))
+        changed_active = [gene.copy() for gene in test_genome]
+        changed_active[1] = [2, 0, 0]
+        self.assertEqual(phenotype_genes(np.array(test_genome), active_genes[::-1]), phenotype_genes(test_genome, active_genes))
+        self.assertNotEqual(phenotype_genes(changed_active, active_genes), phenotype_genes(test_genome, active_genes))
+        cache = FitnessCache()
+        cache.put(1, 0.5, False, phenotype_genes(test_genome, active_genes))
+        self.assertEqual(cache.get(1, phenotype_genes(test_genome, active_genes)), (0.5, False))
+        self.assertIsNone(cache.get(1, phenotype_genes(changed_active, active_genes)), "colliding phenotype should not get the cached fitness")
+        cache.put(1, 0.0, True, phenotype_genes(changed_active, active_genes))
+        self.assertEqual(cache.get(1, phenotype_genes(changed_active, active_genes)), (0.0, True))
+        self.assertIsNone(cache.get(1, phenotype_genes(test_genome, active_genes)), "replaced phenotype should not be cached")
+        self.assertEqual(len(cache), 1)
+        self.assertEqual(cache.get_statistics()["fitness_cache_collisions"], 2)
+
+        # disabled cache
+        cache = FitnessCache(max_entries=0)
+        cache.put(1, 0.5, False)
+        self.assertIsNone(cache.get(1))
+
+if __name__ == '__main__':
+    unittest.main()
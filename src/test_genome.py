@@ -1,9 +1,15 @@
 from __future__ import annotations
 from copy import deepcopy
-from genome import evaluate_fitness, format_inputs_for_new_operation, genome_output, mutate_gene, mutate_individual, active_gene_transplant, subgraph_exchange
-from utils import get_active_gene_indexes, get_output_gene_indexes
+import os
+import tempfile
+from geometry import get_genome_geometry
+from genome import WORSE_THAN_CUTOFF, chunked_output_fitness, output_fitness, evaluate_fitness, evaluate_fitness_streaming, format_inputs_for_new_operation, genome_output, mutate_allele, mutate_gene, mutate_individual, mutate_individual_delta, crossover_and_mutate, mutate_individual_with_changes, active_gene_transplant, subgraph_exchange
+from utils import get_active_gene_indexes, get_changed_gene_indexes, get_output_gene_indexes, iterate_chunks, to_genome_array, to_genome_list
 from constants.operations import operations, op_inputs
+from kernels import op_kernels
+from population import Population
 
+import random
 import unittest
 import numpy as np
 
@@ -82,6 +88,40 @@ class TestGenome(unittest.TestCase):
         output = genome_output(test_genome_small, get_active_gene_indexes(test_genome_small, get_output_gene_indexes(test_genome_small)), np.array([np.array([0.5, 0.5, 0.5])]))
         self.assertListEqual(output.tolist(), [0.5, 0.5, 0.5], "incorrect genome output with small genome and floats")
     
+    def test_genome_output_single_pass(self):
+        def reference_output(genome, gene_index, input_matrix):
+            gene = genome[gene_index]
+            if gene[0] == -1:
+                return np.array(input_matrix[gene_index], dtype=float)
+            if gene[0] == -2:
+                return reference_output(genome, gene[1], input_matrix)
+            inputs = [reference_output(genome, gene[i], input_matrix) for i in range(1, 1 + op_inputs[operations[gene[0]]])]
+            return op_kernels[operations[gene[0]]](*inputs, out=np.empty_like(inputs[0]))
+
+        # order of the given active genes must not matter
+        active_genes = get_active_gene_indexes(test_genome, get_output_gene_indexes(test_genome))
+        input_matrix = np.array([np.array([0, 1, 2, 3, 4, 4, 3, 2, 1, 0])])
+        expected = genome_output(test_genome, active_genes, input_matrix).tolist()
+        self.assertListEqual(genome_output(test_genome, active_genes[::-1], input_matrix).tolist(), expected, "output should not depend on order of active genes")
+        self.assertListEqual(genome_output(test_genome, sorted(active_genes), input_matrix).tolist(), expected, "output should not depend on order of active genes")
+
+        # random genomes compared to a recursive evaluation, only operations that never hit their protected domains
+        safe_operations = [operations.index('+'), operations.index('*'), operations.index('sin'), operations.index('cos')]
+        population = Population(1, 30, 2, 0.1, [[1], [1]], [1])
+        input_matrix = np.array([np.linspace(0.5, 1, 20), np.linspace(-1, -0.5, 20)])
+        for i in range(50):
+            genome = population.get_random_genome()
+            for gene in genome:
+                if gene[0] >= 0:
+                    gene[0] = safe_operations[gene[0] % len(safe_operations)]
+                    if op_inputs[operations[gene[0]]] == 2 and gene[2] == -1:
+                        gene[2] = gene[1]
+            output_gene_indexes = get_output_gene_indexes(genome)
+            active_genes = get_active_gene_indexes(genome, output_gene_indexes)
+            expected = reference_output(genome, output_gene_indexes[0], input_matrix)
+            output = genome_output(genome, active_genes, input_matrix)
+            self.assertListEqual(output.tolist(), expected.tolist(), "single pass output should match recursive evaluation")
+
     def test_evaluate_fitness(self):
         genome_input = np.array([np.array([0, 1, 2, 3, 4, 4, 3, 2, 1, 0])])
         wanted_output = np.array([0, 64, 9216, 186624, 1638400, 1638400, 186624, 9216, 64, 0])
@@ -94,6 +134,92 @@ class TestGenome(unittest.TestCase):
         self.assertTrue(fitness > 0)
         self.assertFalse(is_acceptable)
 
+    def test_chunked_output_fitness(self):
+        wanted_output = np.linspace(-1, 1, 100)
+        output = wanted_output ** 2
+        chunks = lambda chunk_size: (output[start:start + chunk_size] for start in range(0, 100, chunk_size))
+
+        # without a cutoff, the result is exactly the same as for the whole output
+        self.assertEqual(chunked_output_fitness(chunks(7), wanted_output, 0.01), output_fitness(output, wanted_output, 0.01))
+        fitness, is_acceptable = output_fitness(output, wanted_output, 0.01)
+
+        # individual exactly at the cutoff is evaluated
+        self.assertEqual(chunked_output_fitness(chunks(7), wanted_output, 0.01, fitness), (fitness, is_acceptable))
+
+        # evaluation stops early, with chunks not consumed
+        consumed = []
+        def counted_chunks():
+            for chunk in chunks(10):
+                consumed.append(chunk)
+                yield chunk
+        self.assertEqual(chunked_output_fitness(counted_chunks(), wanted_output, 0.01, 1.0), (WORSE_THAN_CUTOFF, False))
+        self.assertLess(len(consumed), 10, "evaluation should stop before the last chunk")
+
+        # evaluation does not stop while the output can still be acceptable
+        output = wanted_output + 0.005
+        fitness, is_acceptable = chunked_output_fitness((output[start:start + 10] for start in range(0, 100, 10)), wanted_output, 0.01, 0.1)
+        self.assertTrue(is_acceptable, "acceptable solution should not be stopped by the cutoff")
+        self.assertAlmostEqual(fitness, 0.5)
+
+    def test_evaluate_fitness_streaming(self):
+        active = get_active_gene_indexes(test_genome, get_output_gene_indexes(test_genome))
+        input_matrix = np.array([np.linspace(-1, 1, 100)])
+        wanted_output = np.linspace(-1, 1, 100) ** 2
+        fitness, is_acceptable = evaluate_fitness(test_genome, active, input_matrix, wanted_output)
+
+        # chunks of an array, the last chunk is shorter
+        streamed_fitness, streamed_is_acceptable = evaluate_fitness_streaming(test_genome, active, iterate_chunks(input_matrix, 30), iterate_chunks(wanted_output, 30))
+        self.assertAlmostEqual(streamed_fitness, fitness)
+        self.assertEqual(streamed_is_acceptable, is_acceptable)
+
+        # chunks of a memory mapped file
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "inputs.dat")
+            mapped_input_matrix = np.memmap(path, dtype=np.float64, mode="w+", shape=input_matrix.shape)
+            mapped_input_matrix[:] = input_matrix
+            mapped_input_matrix.flush()
+            mapped_input_matrix = np.memmap(path, dtype=np.float64, mode="r", shape=input_matrix.shape)
+            streamed_fitness, _ = evaluate_fitness_streaming(test_genome, active, iterate_chunks(mapped_input_matrix, 16), iterate_chunks(wanted_output, 16))
+            self.assertAlmostEqual(streamed_fitness, fitness)
+            del mapped_input_matrix
+
+        # any iterable of chunks
+        input_chunks = (input_matrix[:, start:start + 25] for start in range(0, 100, 25))
+        wanted_output_chunks = [wanted_output[start:start + 25] for start in range(0, 100, 25)]
+        streamed_fitness, _ = evaluate_fitness_streaming(test_genome, active, input_chunks, wanted_output_chunks)
+        self.assertAlmostEqual(streamed_fitness, fitness)
+
+        # consumed chunks are not a perfect solution
+        with self.assertRaises(ValueError):
+            evaluate_fitness_streaming(test_genome, active, input_chunks, wanted_output_chunks)
+        with self.assertRaises(ValueError):
+            iterate_chunks(input_chunks, 25)
+
+        # acceptable solution
+        wanted_output = genome_output(test_genome, active, input_matrix)
+        self.assertEqual(evaluate_fitness_streaming(test_genome, active, iterate_chunks(input_matrix, 30), iterate_chunks(wanted_output, 30)), (0, True))
+
+    def test_several_outputs_fitness(self):
+        genome = [[-1, -1, -1], [4, 0, -1], [2, 1, 0], [-2, 1, -2], [-2, 2, -2]] # sin(x), sin(x) * x
+        active = get_active_gene_indexes(genome, get_output_gene_indexes(genome))
+        input_matrix = np.array([np.linspace(-1, 1, 100)])
+        x = input_matrix[0]
+        wanted_output = np.array([np.sin(x), np.sin(x) * x + 0.005])
+
+        # errors of the outputs are summed, every output has to be acceptable
+        fitness, is_acceptable = evaluate_fitness(genome, active, input_matrix, wanted_output)
+        self.assertAlmostEqual(fitness, 0.5)
+        self.assertTrue(is_acceptable)
+        self.assertFalse(evaluate_fitness(genome, active, input_matrix, wanted_output, 0.001)[1])
+
+        output = genome_output(genome, active, input_matrix)
+        self.assertEqual(output.shape, (2, 100))
+        chunks = (output[:, start:start + 30] for start in range(0, 100, 30))
+        self.assertEqual(chunked_output_fitness(chunks, wanted_output, 0.01), (fitness, is_acceptable))
+        streamed_fitness, streamed_is_acceptable = evaluate_fitness_streaming(genome, active, iterate_chunks(input_matrix, 30), iterate_chunks(wanted_output, 30))
+        self.assertAlmostEqual(streamed_fitness, fitness)
+        self.assertTrue(streamed_is_acceptable)
+
     def test_mutate_gene(self):
         gene, success = mutate_gene([-1, -1, -1], 0, 3, 3)
         self.assertListEqual(gene, [-1, -1, -1], "incorrect mutated gene")
@@ -120,6 +246,39 @@ class TestGenome(unittest.TestCase):
 
 
 
+    def test_mutate_allele(self):
+        # every value other than the original is reachable, the original never is
+        for allele, original, nvalues in ((0, 3, len(operations)), (1, 2, 4)):
+            values = set()
+            for value_draw in np.linspace(0, 1, 100, endpoint=False):
+                gene = [3, 2, 1]
+                mutate_allele(gene, 4, allele, value_draw, 0.5, get_genome_geometry(5, 1))
+                values.add(gene[allele])
+            self.assertSetEqual(values, set(range(nvalues)) - {original})
+
+        # a new operation gets the inputs it needs
+        gene = [4, 2, -1]
+        mutate_allele(gene, 4, 0, 0.0, 0.99, get_genome_geometry(5, 1))
+        self.assertListEqual(gene, [0, 2, 3])
+        mutate_allele(gene, 4, 0, 0.99, 0.0, get_genome_geometry(5, 1))
+        self.assertListEqual(gene, [7, 2, -1])
+
+    def test_mutate_individual_delta(self):
+        np.random.seed(4)
+        target = Population(2, 20, 2, 0.3, [[1], [2]], [1]).get_individual(0)
+        original = target.tolist()
+        for _ in range(50):
+            state = np.random.get_state()
+            mutated_gene_indexes, mutated_genes = mutate_individual_delta(target, 20, 2, 0.3)
+            np.random.set_state(state)
+            mutated, changed_gene_indexes = mutate_individual_with_changes(target, 20, 2, 0.3)
+
+            # the delta holds only the mutated genes, drawn the same way as the full mutation
+            self.assertListEqual(mutated_gene_indexes, changed_gene_indexes)
+            self.assertEqual(mutated_genes.shape, (len(mutated_gene_indexes), 3))
+            self.assertListEqual(mutated[mutated_gene_indexes].tolist(), mutated_genes.tolist())
+            self.assertListEqual(target.tolist(), original, "delta mutation should not change the original")
+
     def test_mutate_individual(self):
         gene0 = [-1, -1, -1]
         gene1 = [0, 0, 0]
@@ -148,6 +307,27 @@ class TestGenome(unittest.TestCase):
             is_mutated = set(mutated_genome[0]) != set(gene0) or set(mutated_genome[1]) != set(gene1) or set(mutated_genome[2]) != set(gene2) or set(mutated_genome[3]) != set(gene3)
             self.assertTrue(is_mutated, f"mutated genome {mutated_genome} should not be the same as the original {test_genome}")
 
+    def test_mutate_individual_with_changes(self):
+        original = deepcopy(test_genome)
+        for i in range(100):
+            mutated_genome, mutated_gene_indexes = mutate_individual_with_changes(test_genome, 10, 1, 0.1)
+            self.assertListEqual(test_genome, original, "mutated genome should not change the original")
+            self.assertListEqual(mutated_gene_indexes, sorted(set(mutated_gene_indexes)), "mutated gene indexes should be sorted and unique")
+            self.assertTrue(set(get_changed_gene_indexes(test_genome, mutated_genome)).issubset(mutated_gene_indexes), "every changed gene should be reported")
+            self.assertLessEqual(len(mutated_gene_indexes), 2, "at most floor(10 * 0.1 + 1) genes should be mutated")
+
+        # same random draws as mutate_individual
+        np.random.seed(7)
+        mutated_genome = mutate_individual(test_genome, 10, 1, 0.1)
+        np.random.seed(7)
+        self.assertListEqual(to_genome_list(mutate_individual_with_changes(test_genome, 10, 1, 0.1)[0]), to_genome_list(mutated_genome))
+
+        # compact genomes are copied, not changed
+        genome = to_genome_array(test_genome)
+        mutated_genome, mutated_gene_indexes = mutate_individual_with_changes(genome, 10, 1, 0.1)
+        self.assertListEqual(to_genome_list(genome), test_genome)
+        self.assertListEqual(get_changed_gene_indexes(genome, mutated_genome), mutated_gene_indexes)
+
     def test_active_gene_transplant(self):
         child = active_gene_transplant(test_parent1,
                                get_active_gene_indexes(test_parent1, get_output_gene_indexes(test_parent1)),
@@ -167,7 +347,7 @@ class TestGenome(unittest.TestCase):
                                donor_active_path=get_active_gene_indexes(parent2, get_output_gene_indexes(parent2)),
                                exchange_rate=1,
                                nrows=1)
-        self.assertListEqual(child, [[-1, -1, -1], [1, 0, 0], [-2, 1, -2]], "should exchange only first function gene")
+        self.assertListEqual(to_genome_list(child), [[-1, -1, -1], [1, 0, 0], [-2, 1, -2]], "should exchange only first function gene")
 
         # should exchange and format inputs
         parent1 = [[-1, -1, -1], [0, 0, 0], [-2, 1, -2]]
@@ -178,7 +358,7 @@ class TestGenome(unittest.TestCase):
                                  donor_active_path=get_active_gene_indexes(parent2, get_output_gene_indexes(parent2)),
                                  exchange_rate=1,
                                  nrows=1)
-        self.assertListEqual(child, [[-1, -1, -1], [5, 0, -1], [-2, 1, -2]], "should exchange and format inputs")
+        self.assertListEqual(to_genome_list(child), [[-1, -1, -1], [5, 0, -1], [-2, 1, -2]], "should exchange and format inputs")
 
         parent1 = [[-1, -1, -1], [0, 0, 0], [1, 0, 0], [-2, 2, -2]]
         parent2 = [[-1, -1, -1], [5, 0, -1], [0, 0, 0], [-2, 1, -2]]
@@ -188,7 +368,7 @@ class TestGenome(unittest.TestCase):
                                  donor_active_path=get_active_gene_indexes(parent2, get_output_gene_indexes(parent2)),
                                  exchange_rate=1,
                                  nrows=1)
-        self.assertListEqual(child, [[-1, -1, -1], [0, 0, 0], [5, 0, -1], [-2, 2, -2]], "should exchange and format inputs")
+        self.assertListEqual(to_genome_list(child), [[-1, -1, -1], [0, 0, 0], [5, 0, -1], [-2, 2, -2]], "should exchange and format inputs")
 
         parent1 = [[-1, -1, -1],[0, 0, 0], [1, 0, 0], [0, 0, 0], [1, 2, 0], [-2, 4, -2]]
         parent2 = [[-1, -1, -1],[3, 0, 0], [0, 0, 0], [5, 1, -1], [0, 0, 0], [-2, 3, -2]]
@@ -198,7 +378,27 @@ class TestGenome(unittest.TestCase):
                                     donor_active_path=get_active_gene_indexes(parent2, get_output_gene_indexes(parent2)),
                                     exchange_rate=1,
                                     nrows=1)
-        self.assertListEqual(child, [[-1, -1, -1],[0, 0, 0], [3, 0, 0], [0, 0, 0], [5, 2, -1], [-2, 4, -2]], "should exchange and format inputs")
+        self.assertListEqual(to_genome_list(child), [[-1, -1, -1],[0, 0, 0], [3, 0, 0], [0, 0, 0], [5, 2, -1], [-2, 4, -2]], "should exchange and format inputs")
+
+        # a chain of genes deeper than the recursion limit is exchanged whole from the output gene
+        parent1 = [[-1, -1, -1]] + [[0, i, i] for i in range(3000)] + [[-2, 3000, -2]]
+        parent2 = [[-1, -1, -1]] + [[2, i, i] for i in range(3000)] + [[-2, 3000, -2]]
+        child = subgraph_exchange(receiver=parent1,
+                                    receiver_active_path=[3001],
+                                    donor=parent2,
+                                    donor_active_path=get_active_gene_indexes(parent2, get_output_gene_indexes(parent2)),
+                                    exchange_rate=1,
+                                    nrows=1)
+        self.assertListEqual(to_genome_list(child)[:-1], parent2[:-1], "should exchange the whole chain")
+
+        # output genes reading other output genes are followed to the function genes they read, on both sides
+        parent1 = [[-1, -1, -1], [0, 0, 0], [2, 0, 1], [-2, 2, -2], [-2, 3, -2]]
+        parent2 = [[-1, -1, -1], [1, 0, 0], [4, 0, -1], [-2, 1, -2], [-2, 2, -2]]
+        child = subgraph_exchange(receiver=parent1, receiver_active_path=[4], donor=parent2, donor_active_path=[0, 2, 4], exchange_rate=1, nrows=1)
+        self.assertListEqual(to_genome_list(child), [[-1, -1, -1], [0, 0, 0], [4, 0, -1], [-2, 2, -2], [-2, 3, -2]], "should exchange the function gene read by both outputs")
+        child = subgraph_exchange(receiver=parent2, receiver_active_path=[4], donor=parent1, donor_active_path=[0, 1, 2, 3, 4], exchange_rate=1, nrows=1)
+        self.assertEqual(to_genome_list(child)[2][:2], [2, 0], "should exchange the function gene read by both outputs")
+        self.assertListEqual(to_genome_list(child)[3:], parent2[3:], "output genes should not change")
 
         # should exchange and format inputs (without throwing an exception)
         child = subgraph_exchange(receiver=test_parent1,
@@ -207,10 +407,34 @@ class TestGenome(unittest.TestCase):
                                  donor_active_path=get_active_gene_indexes(test_parent2, get_output_gene_indexes(test_parent2)),
                                  exchange_rate=1,
                                  nrows=1)
+
+    def test_crossover_and_mutate(self):
+        receiver = to_genome_array(test_parent1)
+        donor = to_genome_array(test_parent2)
+        receiver_active_path = get_active_gene_indexes(receiver, get_output_gene_indexes(receiver))
+        donor_active_path = get_active_gene_indexes(donor, get_output_gene_indexes(donor))
+        ncolumns = len(receiver)
+        for exchange_function in (active_gene_transplant, subgraph_exchange):
+            for seed in range(20):
+                # same child as the exchange followed by the mutation of a copy
+                np.random.seed(seed)
+                random.seed(seed)
+                expected = mutate_individual(exchange_function(receiver, receiver_active_path, donor, donor_active_path, 0.5, 1), ncolumns, 1, 0.2)
+
+                np.random.seed(seed)
+                random.seed(seed)
+                buffer = np.zeros_like(receiver)
+                child, changed_gene_indexes = crossover_and_mutate(receiver, receiver_active_path, donor, donor_active_path, 0.5, exchange_function, ncolumns, 1, 0.2, child=buffer)
+                self.assertIs(child, buffer, "child should be written to the given genome")
+                self.assertListEqual(child.tolist(), expected.tolist())
+                self.assertListEqual(changed_gene_indexes, get_changed_gene_indexes(receiver, child))
+                self.assertListEqual(to_genome_list(receiver), test_parent1, "parents should not change")
+                self.assertListEqual(to_genome_list(donor), test_parent2, "parents should not change")
         
 
 
 
+
     def test_format_inputs_for_new_operation(self):
         # should not change anything
         test_genome_formatting = [[-1, -1, -1], [0, 0, 0], [2, 0, 1], [-2, 2, -2]]
@@ -0,0 +1,37 @@
+from __future__ import annotations
+from constants.operations import operations
+from geometry import GenomeGeometry, get_genome_geometry
+from utils import get_last_possible_input_index, get_number_of_op_inputs, to_genome_array
+
+import unittest
+
+class TestGeometry(unittest.TestCase):
+
+    def test_tables(self):
+        geometry = GenomeGeometry(10, 3, noutputs=2)
+        self.assertEqual(geometry.ngenes, 30)
+        for gene_index in range(30):
+            self.assertEqual(geometry.last_possible_input_index_list[gene_index], get_last_possible_input_index(10, 3, gene_index))
+            self.assertEqual(geometry.is_output_gene_index(gene_index), gene_index >= 28)
+        self.assertListEqual(geometry.output_gene_indexes, [28, 29])
+        self.assertListEqual(geometry.operation_input_list, [get_number_of_op_inputs(op) for op in range(len(operations))])
+
+        with self.assertRaises(ValueError):
+            GenomeGeometry(0, 1)
+        with self.assertRaises(ValueError):
+            GenomeGeometry(3, 0)
+
+    def test_shared_geometry(self):
+        self.assertIs(get_genome_geometry(10, 2), get_genome_geometry(10, 2), "geometries should be created once")
+        self.assertIsNot(get_genome_geometry(10, 2), get_genome_geometry(10, 2, 2))
+
+    def test_get_mutable_positions(self):
+        genome = to_genome_array([[-1, -1, -1], [-1, -1, -1], [0, 0, 1], [4, 1, -1], [1, 2, 3], [-2, 4, -2]])
+        # genes 2 and 3 can only be connected to the two input genes, the output gene is connected to one of 4 genes
+        self.assertListEqual(GenomeGeometry(3, 2).get_mutable_positions(genome).tolist(), [6, 7, 8, 9, 10, 12, 13, 14, 16])
+        # with one row, genes of the second column have only one possible input
+        genome = to_genome_array([[-1, -1, -1], [0, 0, 0], [-2, 1, -2]])
+        self.assertListEqual(GenomeGeometry(3, 1).get_mutable_positions(genome).tolist(), [3, 7])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,91 @@
+from __future__ import annotations
+from constants.operations import operations, op_inputs
+from kernels import kernels, op_kernels, get_scratch_masks, MAX_OPERAND
+
+import unittest
+import numpy as np
+
+class TestKernels(unittest.TestCase):
+    def test_kernels_order(self):
+        self.assertEqual(len(kernels), len(operations))
+        for opcode, operation in enumerate(operations):
+            self.assertIs(kernels[opcode], op_kernels[operation])
+
+    def test_kernels_values(self):
+        x = np.array([-2.0, -0.5, 0.0, 0.5, 3.0])
+        y = np.array([1.0, 2.0, -3.0, 0.25, 2.0])
+        expected = {
+            '+': x + y,
+            '-': x - y,
+            '*': x * y,
+            '%': np.mod(x, y),
+            'sin': np.sin(x),
+            'cos': np.cos(x),
+            'e^n': np.exp(x),
+        }
+        for operation, expected_output in expected.items():
+            operands = (x, y) if op_inputs[operation] == 2 else (x,)
+            out = np.full(len(x), np.nan)
+            op_kernels[operation](*operands, out=out)
+            self.assertListEqual(out.tolist(), expected_output.tolist(), operation)
+
+        out = np.full(len(x), np.nan)
+        op_kernels['ln(|x|)'](x, out=out)
+        self.assertEqual(out[2], 0.0)
+        self.assertListEqual(np.delete(out, 2).tolist(), np.log(np.abs(np.delete(x, 2))).tolist())
+
+    def test_protected_domains(self):
+        # protected positions are 0.0, no matter what was in the output buffer before
+        x = np.array([1.0, 2.0, 2 * MAX_OPERAND, -2 * MAX_OPERAND, np.nan])
+        y = np.array([1.0, 0.0, 1.0, 1.0, 1.0])
+        for operation in ['+', '-', '*']:
+            out = np.full(len(x), 7.0)
+            op_kernels[operation](x, y, out=out)
+            self.assertListEqual(out[2:].tolist(), [0.0, 0.0, 0.0], operation)
+            out = np.full(len(x), 7.0)
+            op_kernels[operation](y, x, out=out)
+            self.assertListEqual(out[2:].tolist(), [0.0, 0.0, 0.0], operation)
+
+        out = np.full(len(x), 7.0)
+        op_kernels['%'](x, y, out=out)
+        self.assertEqual(out[1], 0.0, "mod by 0 should be 0")
+
+        out = np.full(3, 7.0)
+        op_kernels['e^n'](np.array([50.0, 51.0, 1000.0]), out=out)
+        self.assertListEqual(out.tolist(), [np.exp(50.0), 0.0, 0.0])
+
+        out = np.full(2, 7.0)
+        op_kernels['ln(|x|)'](np.array([0.0, -0.0]), out=out)
+        self.assertListEqual(out.tolist(), [0.0, 0.0])
+
+    def test_kernels_in_place(self):
+        x = np.array([1.0, 0.0, 3 * MAX_OPERAND])
+        y = np.array([2.0, 0.0, 1.0])
+        for opcode, operation in enumerate(operations):
+            operands = (x, y) if op_inputs[operation] == 2 else (x,)
+            expected = np.empty(len(x))
+            kernels[opcode](*operands, out=expected)
+            for i in range(len(operands)):
+                aliased = [operand.copy() for operand in operands]
+                kernels[opcode](*aliased, out=aliased[i])
+                self.assertListEqual(aliased[i].tolist(), expected.tolist(), operation + " in place")
+
+    def test_kernels_2d(self):
+        x = np.array([[0.0, 1.0], [2.0, 0.0]])
+        y = np.array([[1.0, 0.0], [0.0, 3.0]])
+        out = np.empty((2, 2))
+        op_kernels['%'](x, y, out=out)
+        self.assertListEqual(out.tolist(), [[0.0, 0.0], [0.0, 0.0]])
+
+    def test_scratch_masks(self):
+        first, second = get_scratch_masks((4, 3))
+        self.assertEqual(first.shape, (4, 3))
+        self.assertEqual(second.shape, (4, 3))
+        self.assertFalse(np.shares_memory(first, second))
+
+        # smaller masks are views of the already allocated ones
+        smaller, _ = get_scratch_masks((5,))
+        self.assertTrue(np.shares_memory(first, smaller))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,6 +1,7 @@
 from __future__ import annotations
+from constants.backendEnum import BackendEnum
 from evolution import evolve
-from genome import genome_output
+from genome import evaluate_fitness, genome_output
 from one_plus_lambda import generate_new_population, get_fittest_individual_index
 from population import Population
 
@@ -68,7 +69,7 @@ class TestOnePlusLambda(unittest.TestCase):
         parent = population.get_parent()
 
         for i in range(len(parent)):
-            self.assertListEqual(parent[i], test_genome_best_parent[i], "parent should not be changed")
+            self.assertListEqual(parent[i].tolist(), test_genome_best_parent[i], "parent should not be changed")
 
     def test_evolve_one_input_float(self):
         def func(input: np.ndarray[np.ndarray[int | float]]) -> np.ndarray[int | float]:
@@ -79,7 +80,7 @@ class TestOnePlusLambda(unittest.TestCase):
 
         wanted_output = func(input)
         acceptable_boundary = 0
-        solution, fitness, *_, found_solution  = evolve(population_size=10,
+        solution, fitness, *_, found_solution = evolve(population_size=10,
                ncolumns=10,
                nrows=1,
                input_matrix=input,
@@ -121,5 +122,167 @@ class TestOnePlusLambda(unittest.TestCase):
         else:
             print("no solution found in time in for test_evolve_two_inputs_float")
 
+    def test_evolve_evaluation_statistics(self):
+        input = np.array([np.linspace(-1, 1, 20, dtype=float)])
+        wanted_output = np.sin(input[0]) * 3 + input[0] ** 3
+        *_, fitness_evaluations, _, found_solution, evaluation_statistics = evolve(population_size=5,
+               ncolumns=30,
+               nrows=1,
+               input_matrix=input,
+               wanted_output=wanted_output,
+               acceptable_boundary=0,
+               max_fitness_evaluations=2000,
+               mutation_rate=0.05,
+               seed=3,
+               return_statistics=True)
+
+        self.assertEqual(evaluation_statistics["nominal_fitness_evaluations"], fitness_evaluations)
+        self.assertGreater(evaluation_statistics["skipped_fitness_evaluations"], 0, "some mutations should be neutral")
+        # the first population and every generated child is either evaluated or skipped,
+        # the nominal count includes the first children but not the children of the last generation (unless a solution stopped it)
+        last_generation_children = 0 if found_solution else 4
+        self.assertEqual(evaluation_statistics["actual_fitness_evaluations"] + evaluation_statistics["skipped_fitness_evaluations"] + evaluation_statistics["fitness_cache_hits"],
+                         fitness_evaluations + 1 + last_generation_children)
+        self.assertEqual(evaluation_statistics["actual_fitness_evaluations"], evaluation_statistics["fitness_cache_misses"], "every evaluation should miss the fitness cache first")
+
+    def test_evolve_subset_evaluation(self):
+        input = np.array([np.linspace(-1, 1, 200, dtype=float)])
+        wanted_output = np.sin(input[0]) * 3 + input[0] ** 3
+        *_, fitness_evaluations, _, found_solution, evaluation_statistics = evolve(population_size=5,
+               ncolumns=30,
+               nrows=1,
+               input_matrix=input,
+               wanted_output=wanted_output,
+               acceptable_boundary=0,
+               max_fitness_evaluations=2000,
+               mutation_rate=0.05,
+               seed=3,
+               subset_size=20,
+               return_statistics=True)
+
+        self.assertGreater(evaluation_statistics["screened_fitness_evaluations"], 0, "some children should be worse than the parent on the subset")
+        self.assertGreater(evaluation_statistics["partial_fitness_evaluations"], 0)
+        # screened children are counted separately from the evaluations on all samples
+        last_generation_children = 0 if found_solution else 4
+        self.assertEqual(evaluation_statistics["actual_fitness_evaluations"] + evaluation_statistics["screened_fitness_evaluations"]
+                         + evaluation_statistics["skipped_fitness_evaluations"] + evaluation_statistics["fitness_cache_hits"],
+                         fitness_evaluations + 1 + last_generation_children)
+
+    def test_evolve_several_outputs(self):
+        input = np.array([np.linspace(-1, 1, 20, dtype=float)])
+        wanted_output = np.array([input[0] * input[0], input[0] * input[0] + input[0]])
+        for batch_evaluation in (False, True):
+            solution, fitness, *_, found_solution = evolve(population_size=5,
+                ncolumns=10,
+                nrows=1,
+                input_matrix=input,
+                wanted_output=wanted_output,
+                acceptable_boundary=0,
+                max_fitness_evaluations=100000,
+                mutation_rate=0.1,
+                batch_evaluation=batch_evaluation,
+                noutputs=2)
+
+            self.assertEqual(len(get_output_gene_indexes(solution)), 2)
+            solution_output = genome_output(solution, get_active_gene_indexes(solution, get_output_gene_indexes(solution)), input)
+            if found_solution:
+                self.assertListEqual(np.round(wanted_output, 15).tolist(), np.round(solution_output, 15).tolist(), "solution should be correct")
+            else:
+                print("no solution found in time in for test_evolve_several_outputs")
+
+    def test_evolve_batch_evaluation(self):
+        def func(input: np.ndarray[np.ndarray[int | float]]) -> np.ndarray[int | float]:
+            x = input[0]
+            return (x * x) + x
+
+        input = np.array([np.linspace(-1, 1, 20, dtype=float)])
+        wanted_output = func(input)
+        solution, fitness, *_, found_solution = evolve(population_size=17,
+               ncolumns=10,
+               nrows=1,
+               input_matrix=input,
+               wanted_output=wanted_output,
+               acceptable_boundary=0,
+               max_fitness_evaluations=100000,
+               mutation_rate=0.1,
+               batch_evaluation=True)
+
+        solution_output = genome_output(solution, get_active_gene_indexes(solution, get_output_gene_indexes(solution)), input)
+
+        if found_solution:
+            self.assertListEqual(np.round(wanted_output, 15).tolist(), np.round(solution_output, 15).tolist(), "solution should be correct")
+        else:
+            print("no solution found in time in for test_evolve_batch_evaluation")
+
+    def test_evolve_streaming(self):
+        def func(input: np.ndarray[np.ndarray[int | float]]) -> np.ndarray[int | float]:
+            x = input[0]
+            return (x * x) + x
+
+        input = np.array([np.linspace(-1, 1, 20, dtype=float)])
+        wanted_output = func(input)
+        solution, fitness, *_, found_solution = evolve(population_size=5,
+               ncolumns=10,
+               nrows=1,
+               input_matrix=input,
+               wanted_output=wanted_output,
+               acceptable_boundary=0,
+               max_fitness_evaluations=100000,
+               mutation_rate=0.1,
+               streaming_chunk_size=6)
+
+        solution_output = genome_output(solution, get_active_gene_indexes(solution, get_output_gene_indexes(solution)), input)
+
+        if found_solution:
+            self.assertListEqual(np.round(wanted_output, 15).tolist(), np.round(solution_output, 15).tolist(), "solution should be correct")
+        else:
+            print("no solution found in time in for test_evolve_streaming")
+
+    def test_evolve_float32(self):
+        input = np.array([np.linspace(-1, 1, 20, dtype=float)])
+        wanted_output = input[0] ** 2 + input[0]
+        solution, fitness, *_, found_solution, evaluation_statistics = evolve(population_size=5,
+               ncolumns=10,
+               nrows=1,
+               input_matrix=input,
+               wanted_output=wanted_output,
+               acceptable_boundary=0,
+               max_fitness_evaluations=20000,
+               mutation_rate=0.1,
+               seed=1,
+               precision=np.float32,
+               return_statistics=True)
+
+        # the returned fitness is evaluated in float64
+        self.assertEqual(fitness, evaluate_fitness(solution, get_active_gene_indexes(solution, get_output_gene_indexes(solution)), input, wanted_output, 0)[0])
+        if found_solution:
+            self.assertGreater(evaluation_statistics["precision_confirmations"], 0)
+            solution_output = genome_output(solution, get_active_gene_indexes(solution, get_output_gene_indexes(solution)), input)
+            self.assertListEqual(wanted_output.tolist(), solution_output.tolist(), "solution should be exact in float64")
+        else:
+            print("no solution found in time in for test_evolve_float32")
+
+    def test_evolve_codegen_backend(self):
+        input = np.array([np.linspace(-1, 1, 20, dtype=float)])
+        wanted_output = np.sin(input[0]) + input[0] ** 2
+        results = []
+        for backend in [BackendEnum.INTERPRETER, BackendEnum.CODEGEN]:
+            solution, fitness, generations, fitness_evaluations, _, found_solution = evolve(population_size=5,
+                   ncolumns=30,
+                   nrows=1,
+                   input_matrix=input,
+                   wanted_output=wanted_output,
+                   acceptable_boundary=0.01,
+                   max_fitness_evaluations=2000,
+                   mutation_rate=0.05,
+                   seed=7,
+                   backend=backend)
+            results.append((solution.tolist(), fitness, generations, fitness_evaluations, found_solution))
+
+        self.assertEqual(results[0], results[1], "both backends should give the same evolution")
+
+        with self.assertRaises(ValueError):
+            evolve(5, 30, 1, input, wanted_output, 0.01, 100, 0.05, backend="codegen")
+
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file
@@ -1,6 +1,10 @@
 from __future__ import annotations
 import numpy as np
+from fitness_cache import FitnessCache
 from population import Population
+from genome import WORSE_THAN_CUTOFF
+from genome import active_gene_transplant, mutate_individual, mutate_individual_delta, subgraph_exchange
+from utils import get_changed_gene_indexes, get_output_gene_indexes, get_reference_counts
 from constants.operations import operations
 
 import unittest
@@ -40,7 +44,7 @@ class TestPopulation(unittest.TestCase):
         for i in range(len(genome)):
             gene = genome[i]
             if i < nrows:
-                self.assertEqual(gene, [-1, -1, -1], " first gene should be [-1, -1, -1]")
+                self.assertEqual(gene.tolist(), [-1, -1, -1], " first gene should be [-1, -1, -1]")
                 continue
             if i == (ncols * nrows - 1):
                 self.assertEqual(gene[0], -2, "output gene should have no operation")
@@ -81,5 +85,366 @@ class TestPopulation(unittest.TestCase):
         self.assertEqual(p.nrows, nrows, f"nrows should be {nrows}")
         self.assertEqual(len(p.population), pupulation_size, f"population should have {pupulation_size} genomes")
 
+    def test_several_outputs(self):
+        input_matrix = np.array([np.linspace(-1, 1, 20)])
+        wanted_output = np.array([input_matrix[0] ** 2, input_matrix[0] + 1, input_matrix[0]])
+        p = Population(5, 10, 1, 0.1, input_matrix, wanted_output, noutputs=3)
+        self.assertEqual(p.get_noutputs(), 3)
+        for i in range(5):
+            self.assertListEqual(get_output_gene_indexes(p.get_individual(i)), [7, 8, 9], "the last genes should be the output genes")
+            self.assertEqual(len(p.get_program(i).output_slots), 3)
+            self.assertLess(p.get_fitness(i), np.inf)
+
+        with self.assertRaises(ValueError):
+            Population(5, 10, 1, 0.1, input_matrix, wanted_output[0], noutputs=3)
+        with self.assertRaises(ValueError):
+            Population(5, 3, 1, 0.1, input_matrix, wanted_output, noutputs=3)
+
+    def test_programs(self):
+        input_matrix = np.array([np.linspace(-1, 1, 20)])
+        p = Population(5, 10, 1, 0.1, input_matrix, input_matrix[0])
+
+        # every individual has a program compiled from its active path
+        for i in range(5):
+            program = p.get_program(i)
+            nfunction_genes = len([gene_index for gene_index in p.get_active_path(i) if p.get_individual(i)[gene_index][0] >= 0])
+            if len(program.constants) == 0:
+                self.assertEqual(len(program), nfunction_genes, "program should have one instruction per active function gene")
+            else:
+                self.assertLess(len(program), nfunction_genes, "genes folded into constants should not be instructions")
+
+        # program moves together with the individual
+        program = p.get_program(3)
+        p.set_parent_by_index(3)
+        self.assertIs(p.get_program(0), program, "program should be moved with the individual")
+        self.assertEqual(p.get_fitness(0), p.get_fitness(3))
+
+    def test_struct_of_arrays(self):
+        input_matrix = np.array([np.linspace(-1, 1, 20)])
+        p = Population(6, 10, 1, 0.1, input_matrix, input_matrix[0])
+        self.assertEqual(p.get_population().shape, (6, 10, 3))
+        for i in range(6):
+            self.assertListEqual(np.flatnonzero(p.get_active_mask(i)).tolist(), sorted(p.get_active_path(i)))
+
+        # the first of equally fit children is the fittest
+        p.fitnesses[:] = [5.0, 4.0, 3.0, 2.0, 2.0, 3.0]
+        self.assertEqual(p.get_fittest_child_index(), (3, 2.0))
+        self.assertListEqual(p.get_children_fitness_array().tolist(), [4.0, 3.0, 2.0, 2.0, 3.0])
+        self.assertEqual(p.get_fittest_individual()[1], 2.0)
+
+        # returned individuals are copies, they do not change when individuals are moved
+        individual = p.get_individual(0)
+        genes = individual.tolist()
+        moved = p.get_individual(4)
+        p.set_parent_by_index(4)
+        self.assertListEqual(p.get_individual(0).tolist(), moved.tolist())
+        self.assertListEqual(p.get_active_mask(0).tolist(), p.get_active_mask(4).tolist())
+        self.assertListEqual(individual.tolist(), genes)
+
+        # so are the children and their fitnesses
+        children = p.get_children_with_active_paths()
+        children_genes = [(child.tolist(), list(active_path)) for child, active_path in children]
+        fitnesses = p.get_children_fitness_array()
+        p.set_children([p.get_random_genome() for i in range(5)])
+        self.assertListEqual([(child.tolist(), active_path) for child, active_path in children], children_genes)
+        self.assertListEqual(fitnesses.tolist(), [4.0, 3.0, 2.0, 2.0, 3.0])
+
+    def test_incremental_active_paths(self):
+        input_matrix = np.array([np.linspace(-1, 1, 20), np.linspace(0, 1, 20)])
+        for exchange_function in (active_gene_transplant, subgraph_exchange, None):
+            p = Population(4, 20, 2, 0.2, input_matrix, input_matrix[0], nparents=2)
+            for generation in range(20):
+                parent_1, parent_1_active_path = p.get_individual_with_active_path(0)
+                parent_2, parent_2_active_path = p.get_individual_with_active_path(1)
+                if exchange_function is None:
+                    children = [mutate_individual(parent_1, 20, 2, 0.2), mutate_individual(parent_2, 20, 2, 0.2)]
+                else:
+                    children = [mutate_individual(exchange_function(parent_1, parent_1_active_path, parent_2, parent_2_active_path, 0.5, 2), 20, 2, 0.2),
+                                mutate_individual(exchange_function(parent_2, parent_2_active_path, parent_1, parent_1_active_path, 0.5, 2), 20, 2, 0.2)]
+                p.set_children(children, parent_indexes=[0, 1], changed_gene_indexes=[get_changed_gene_indexes(parent_1, children[0]), get_changed_gene_indexes(parent_2, children[1])])
+                for i in range(4):
+                    self.assertListEqual(p.get_active_path(i), p.calculate_active_path(i), "active path should match the full search")
+                    self.assertListEqual(p.reference_counts[i], get_reference_counts(p.get_individual(i), p.get_active_path(i), [39]))
+                p.set_parents_by_indexes(2, 3)
+
+    def test_set_children_deltas(self):
+        input_matrix = np.array([np.linspace(-1, 1, 20), np.linspace(0, 1, 20)])
+        np.random.seed(2)
+        p = Population(5, 10, 2, 0.2, input_matrix, input_matrix[0] ** 2)
+        expected = Population(5, 10, 2, 0.2, input_matrix, input_matrix[0] ** 2)
+        expected.set_parent(p.get_individual(0))
+        parent = p.get_individual(0)
+        child_deltas = [mutate_individual_delta(parent, 10, 2, 0.2) for _ in range(4)]
+        children = [parent.copy() for _ in range(4)]
+        for child, (gene_indexes, genes) in zip(children, child_deltas):
+            child[gene_indexes] = genes
+
+        p.set_children_deltas(child_deltas, parent_indexes=[0] * 4)
+        expected.set_children(children, parent_indexes=[0] * 4, changed_gene_indexes=[gene_indexes for gene_indexes, _ in child_deltas])
+        self.assertListEqual(p.get_population().tolist(), expected.get_population().tolist())
+        self.assertListEqual(p.fitnesses.tolist(), expected.fitnesses.tolist())
+        for i in range(5):
+            self.assertListEqual(p.get_active_path(i), p.calculate_active_path(i))
+        self.assertListEqual(parent.tolist(), p.get_individual(0).tolist(), "parent should not change")
+
+        with self.assertRaises(ValueError):
+            p.set_children_deltas(child_deltas[:2], parent_indexes=[0] * 2)
+
+    def test_neutral_changes(self):
+        input_matrix = np.array([np.linspace(-1, 1, 20)])
+        parent = [[-1, -1, -1], [0, 0, 0], [2, 0, 1], [1, 0, 0], [-2, 2, -2]] # (x + x) * x, gene 3 is inactive
+        neutral_child = [[-1, -1, -1], [0, 0, 0], [2, 0, 1], [4, 2, -1], [-2, 2, -2]]
+        active_child = [[-1, -1, -1], [0, 0, 0], [0, 0, 1], [1, 0, 0], [-2, 2, -2]]
+        p = Population(3, 5, 1, 0.1, input_matrix, input_matrix[0] ** 2)
+        p.set_parent(parent)
+        evaluations = p.evaluations
+
+        p.set_children([neutral_child, active_child], parent_indexes=[0, 0], changed_gene_indexes=[[3], [2]])
+        self.assertIs(p.get_active_path(1), p.get_active_path(0), "neutral child should inherit the active path of the parent")
+        self.assertIs(p.get_program(1), p.get_program(0), "neutral child should inherit the program of the parent")
+        self.assertEqual(p.get_fitness(1), p.get_fitness(0), "neutral child should inherit the fitness of the parent")
+        self.assertNotEqual(p.get_fitness(2), p.get_fitness(0), "child with an active change should be evaluated")
+        self.assertEqual(p.evaluations, evaluations + 1, "only the child with an active change should be evaluated")
+        statistics = p.get_evaluation_statistics()
+        self.assertEqual(statistics["actual_fitness_evaluations"], evaluations + 1)
+        self.assertEqual(statistics["skipped_fitness_evaluations"], 1)
+
+        # without changed genes every child is evaluated, or found in the fitness cache
+        p.set_children([neutral_child, active_child])
+        self.assertEqual(p.evaluations, evaluations + 1)
+        self.assertEqual(p.fitness_cache.hits, 2, "both phenotypes should already be cached")
+        self.assertEqual(p.get_fitness(1), p.get_fitness(0))
+
+        p = Population(3, 5, 1, 0.1, input_matrix, input_matrix[0] ** 2, fitness_cache_size=0)
+        p.set_parent(parent)
+        evaluations = p.evaluations
+        p.set_children([neutral_child, active_child])
+        self.assertEqual(p.evaluations, evaluations + 2, "without the fitness cache every child should be evaluated")
+
+    def test_node_cache(self):
+        input_matrix = np.array([np.linspace(-1, 1, 20)])
+        parent = [[-1, -1, -1], [0, 0, 0], [2, 0, 1], [1, 0, 0], [-2, 2, -2]] # (x + x) * x
+        child = [[-1, -1, -1], [4, 0, -1], [2, 0, 1], [1, 0, 0], [-2, 2, -2]] # sin(x) * x
+        p = Population(2, 5, 1, 0.1, input_matrix, input_matrix[0] ** 2)
+        p.set_parent(parent)
+        self.assertEqual(p.node_outputs[0].shape, (3, 20), "node outputs of the parent should be cached")
+
+        p.set_children([child], parent_indexes=[0], changed_gene_indexes=[[1]])
+        fitness = p.get_fitness(1)
+        p.set_individual(1, child) # evaluated from scratch
+        self.assertEqual(p.get_fitness(1), fitness, "incremental evaluation should give the same fitness")
+
+        p.set_parent_by_index(1)
+        self.assertIs(p.node_outputs[0], p.node_outputs[1], "node outputs should move with the individual")
+
+        # node outputs not fitting into the limit are not cached
+        p = Population(2, 5, 1, 0.1, input_matrix, input_matrix[0] ** 2, node_cache_limit=0)
+        p.set_parent(parent)
+        self.assertIsNone(p.node_outputs[0])
+        p.set_children([child], parent_indexes=[0], changed_gene_indexes=[[1]])
+        self.assertEqual(p.get_fitness(1), fitness)
+
+    def test_fitness_cache(self):
+        input_matrix = np.array([np.linspace(-1, 1, 20)])
+        parent = [[-1, -1, -1], [0, 0, 0], [2, 0, 1], [1, 0, 0], [-2, 2, -2]] # (x + x) * x
+        child = [[-1, -1, -1], [4, 0, -1], [2, 0, 1], [1, 0, 0], [-2, 2, -2]] # sin(x) * x
+        reverted_child = [[-1, -1, -1], [0, 0, 0], [2, 0, 1], [3, 1, 2], [-2, 2, -2]] # (x + x) * x with a different inactive gene
+        p = Population(3, 5, 1, 0.1, input_matrix, input_matrix[0] ** 2)
+        p.set_parent(parent)
+        p.set_parent_by_index(0)
+
+        p.set_children([child, reverted_child], parent_indexes=[0, 0], changed_gene_indexes=[[1], [3]])
+        self.assertEqual(p.phenotype_hashes[2], p.phenotype_hashes[0], "inactive genes should not change the phenotype hash")
+
+        # incrementally updated hash should be the same as hash of all active genes
+        hits = p.fitness_cache.hits
+        p.set_children([reverted_child, child])
+        self.assertEqual(p.phenotype_hashes[1], p.phenotype_hashes[0])
+        self.assertEqual(p.fitness_cache.hits, hits + 2, "both phenotypes should be found in the cache")
+        self.assertEqual(p.get_fitness(1), p.get_fitness(0))
+
+        statistics = p.get_evaluation_statistics()
+        self.assertEqual(statistics["fitness_cache_hits"], p.fitness_cache.hits)
+        self.assertEqual(statistics["fitness_cache_misses"], p.fitness_cache.misses)
+
+        # a different phenotype cached under the same hash is not used
+        child_hash = p.phenotype_hashes[2]
+        fitness = p.get_fitness(2)
+        p.fitness_cache = FitnessCache()
+        p.fitness_cache.put(child_hash, 123.0, False, p.get_phenotype_genes(0))
+        p.set_children([parent, child])
+        self.assertEqual(p.get_fitness(2), fitness, "colliding phenotype should be evaluated")
+        self.assertEqual(p.get_evaluation_statistics()["fitness_cache_collisions"], 1)
+
+    def test_fitness_cutoff(self):
+        input_matrix = np.array([np.linspace(-1, 1, 1000)])
+        parent = [[-1, -1, -1], [0, 0, 0], [2, 0, 1], [1, 0, 0], [-2, 2, -2]] # (x + x) * x
+        worse_child = [[-1, -1, -1], [0, 0, 0], [2, 1, 1], [1, 0, 0], [-2, 2, -2]] # (x + x) * (x + x)
+        better_child = [[-1, -1, -1], [0, 0, 0], [2, 0, 0], [1, 0, 0], [-2, 2, -2]] # x * x
+        p = Population(3, 5, 1, 0.1, input_matrix, input_matrix[0] ** 2, evaluation_chunk_size=100, fitness_cache_size=0)
+        p.set_parent(parent)
+
+        p.set_children([worse_child, better_child], fitness_cutoff=p.get_parent_fitness())
+        self.assertEqual(p.get_fitness(1), WORSE_THAN_CUTOFF, "worse child should be stopped at the cutoff")
+        self.assertEqual(p.get_fitness(2), 0.0)
+        self.assertEqual(p.aborted_evaluations, 1)
+
+        # the same fitness as without the cutoff
+        p.set_children([better_child, parent], parent_indexes=[0, 0], changed_gene_indexes=[[2], []], fitness_cutoff=p.get_parent_fitness())
+        better_child_fitness = p.get_fitness(1)
+        p.set_children([better_child, parent])
+        self.assertEqual(p.get_fitness(1), better_child_fitness)
+
+        # node outputs of children evaluated in chunks are cached unless stopped at the cutoff
+        p.set_children([worse_child, better_child], parent_indexes=[0, 0], changed_gene_indexes=[[2], [2]], fitness_cutoff=p.get_parent_fitness())
+        self.assertIsNone(p.node_outputs[1])
+        self.assertEqual(p.node_outputs[2].shape, (2, 1000))
+        self.assertEqual(p.get_fitness(2), 0.0)
+
+        # so their children are evaluated incrementally and share subexpressions, x * x is copied from the parent, (x * x) * x calculated once
+        p.set_parent_by_index(2)
+        grandchild = [[-1, -1, -1], [0, 0, 0], [2, 0, 0], [2, 2, 0], [-2, 3, -2]] # (x * x) * x
+        hits, misses = p.subexpression_cache.hits, p.subexpression_cache.misses
+        p.set_children([grandchild, grandchild], parent_indexes=[0, 0], changed_gene_indexes=[[3, 4], [3, 4]], fitness_cutoff=1000.0)
+        self.assertEqual(p.subexpression_cache.hits - hits, 10)
+        self.assertEqual(p.subexpression_cache.misses - misses, 10)
+        fitness = p.get_fitness(1)
+        p.set_children([grandchild, grandchild])
+        self.assertEqual(p.get_fitness(1), fitness)
+
+    def test_subset_evaluation(self):
+        input_matrix = np.array([np.linspace(-1, 1, 1000)])
+        parent = [[-1, -1, -1], [0, 0, 0], [2, 0, 1], [1, 0, 0], [-2, 2, -2]] # (x + x) * x
+        worse_child = [[-1, -1, -1], [0, 0, 0], [2, 1, 1], [1, 0, 0], [-2, 2, -2]] # (x + x) * (x + x)
+        better_child = [[-1, -1, -1], [0, 0, 0], [2, 0, 0], [1, 0, 0], [-2, 2, -2]] # x * x
+        p = Population(3, 5, 1, 0.1, input_matrix, input_matrix[0] ** 2, subset_size=50)
+        self.assertEqual(p.subset_input_matrix.shape, (1, 50))
+        p.fitness_cache = FitnessCache() # the random first population can have the phenotype of a child
+        p.set_parent(parent)
+        partial_evaluations = p.partial_evaluations
+        evaluations = p.evaluations
+
+        p.set_children([worse_child, better_child], parent_indexes=[0, 0], changed_gene_indexes=[[2], [2]], fitness_cutoff=p.get_parent_fitness())
+        self.assertEqual(p.get_fitness(1), WORSE_THAN_CUTOFF, "child worse on the subset should not be evaluated on all samples")
+        self.assertEqual(p.get_fitness(2), 0.0)
+        self.assertEqual(p.solution_index, 2, "solution should be accepted on all samples")
+        self.assertEqual(p.evaluations - evaluations, 1)
+        self.assertEqual(p.partial_evaluations - partial_evaluations, 3, "parent and both children should be evaluated on the subset")
+        statistics = p.get_evaluation_statistics()
+        self.assertEqual(statistics["partial_fitness_evaluations"], p.partial_evaluations)
+        self.assertEqual(statistics["screened_fitness_evaluations"], 1)
+
+        # without a fitness cutoff (tournament selection) children are not screened
+        p.set_children([worse_child, better_child], parent_indexes=[0, 0], changed_gene_indexes=[[2], [2]])
+        self.assertGreater(p.get_fitness(1), p.get_parent_fitness())
+        self.assertEqual(p.get_evaluation_statistics()["screened_fitness_evaluations"], 1)
+
+    def test_subexpression_cache(self):
+        input_matrix = np.array([np.linspace(-1, 1, 20)])
+        parent = [[-1, -1, -1], [4, 0, -1], [5, 0, -1], [0, 1, 2], [-2, 3, -2]] # sin(x) + cos(x)
+        child_1 = [[-1, -1, -1], [4, 0, -1], [5, 0, -1], [2, 1, 2], [-2, 3, -2]] # sin(x) * cos(x)
+        child_2 = [[-1, -1, -1], [4, 0, -1], [5, 0, -1], [1, 2, 1], [-2, 3, -2]] # cos(x) - sin(x)
+        p = Population(3, 5, 1, 0.1, input_matrix, input_matrix[0] ** 2, node_cache_limit=0, fitness_cache_size=0)
+        p.set_parent(parent)
+
+        # sin(x) and cos(x) are calculated once for both children
+        misses = p.subexpression_cache.misses
+        p.set_children([child_1, child_2])
+        self.assertEqual(p.subexpression_cache.misses - misses, 4, "shared subexpressions should be calculated once per generation")
+        fitnesses = [p.get_fitness(1), p.get_fitness(2)]
+
+        # the cache is cleared between generations
+        p.set_children([child_2, child_1])
+        self.assertEqual(len(p.subexpression_cache), 4)
+        self.assertEqual([p.get_fitness(2), p.get_fitness(1)], fitnesses)
+
+        # parents with cached node outputs are put into the cache at the start of a generation
+        p = Population(3, 5, 1, 0.1, input_matrix, input_matrix[0] ** 2, fitness_cache_size=0)
+        p.set_parent(parent)
+        hits = p.get_evaluation_statistics()["subexpression_cache_hits"]
+        p.set_children([child_1, child_2])
+        self.assertEqual(p.get_evaluation_statistics()["subexpression_cache_hits"] - hits, 4)
+        self.assertEqual([p.get_fitness(1), p.get_fitness(2)], fitnesses)
+
+        # memory of the cache is limited, 0 disables it
+        p = Population(3, 5, 1, 0.1, input_matrix, input_matrix[0] ** 2, subexpression_cache_memory=0)
+        p.set_children([child_1, child_2])
+        self.assertEqual(len(p.subexpression_cache), 0)
+        self.assertEqual(p.get_evaluation_statistics()["subexpression_cache_misses"], 0)
+
+    def test_precision(self):
+        input_matrix = np.array([np.linspace(-1, 1, 20)])
+        solution = [[-1, -1, -1], [4, 0, -1], [2, 1, 0], [-2, 2, -2]] # sin(x) * x
+        close = [[-1, -1, -1], [4, 0, -1], [2, 0, 0], [-2, 2, -2]] # x * x
+        far = [[-1, -1, -1], [5, 0, -1], [0, 1, 1], [-2, 2, -2]] # cos(x) + cos(x)
+        wanted_output = np.sin(input_matrix[0]) * input_matrix[0]
+        exact = Population(4, 4, 1, 0.1, input_matrix, wanted_output, max_error=0.0)
+        p = Population(4, 4, 1, 0.1, input_matrix, wanted_output, max_error=0.0, precision=np.float32, precision_margin=0.2)
+        confirmations = p.precision_confirmations
+        exact.set_children([solution, close, far])
+        p.set_children([solution, close, far])
+        self.assertEqual(p.node_outputs[1].dtype, np.float32, "individuals should be evaluated in float32")
+
+        # the solution and the individual close to the boundary are confirmed in float64, so their fitness is exact
+        self.assertEqual(p.precision_confirmations - confirmations, 2)
+        self.assertEqual(p.get_evaluation_statistics()["precision_confirmations"], p.precision_confirmations)
+        self.assertEqual(p.solution_index, 1)
+        self.assertEqual(p.get_fitness(1), exact.get_fitness(1))
+        self.assertEqual(p.get_fitness(2), exact.get_fitness(2))
+        self.assertAlmostEqual(p.get_fitness(3), exact.get_fitness(3), places=3)
+        self.assertEqual(p.get_exact_fitness(far, p.get_fitness(3)), exact.get_fitness(3))
+
+        # float32 errors larger than the margin do not hide a solution better than all individuals before it
+        p = Population(4, 4, 1, 0.1, input_matrix, wanted_output, max_error=0.0, precision=np.float32, precision_margin=0.0)
+        p.set_children([far, close, solution])
+        self.assertEqual(p.solution_index, 3)
+        self.assertEqual(p.get_fitness(3), exact.get_fitness(1))
+
+        with self.assertRaises(ValueError):
+            Population(4, 4, 1, 0.1, input_matrix, wanted_output, precision=np.int32)
+
+    def test_streaming(self):
+        input_matrix = np.array([np.linspace(-1, 1, 50)])
+        solution = [[-1, -1, -1], [4, 0, -1], [2, 1, 0], [-2, 2, -2]] # sin(x) * x
+        close = [[-1, -1, -1], [4, 0, -1], [2, 0, 0], [-2, 2, -2]] # x * x
+        far = [[-1, -1, -1], [5, 0, -1], [0, 1, 1], [-2, 2, -2]] # cos(x) + cos(x)
+        wanted_output = np.sin(input_matrix[0]) * input_matrix[0]
+        exact = Population(4, 4, 1, 0.1, input_matrix, wanted_output, max_error=0.0)
+        p = Population(4, 4, 1, 0.1, input_matrix, wanted_output, max_error=0.0, streaming_chunk_size=16)
+        exact.set_children([solution, close, far])
+        p.set_children([solution, close, far])
+        self.assertIsNone(p.node_outputs[1], "node outputs should not be kept when streaming")
+        self.assertEqual(p.solution_index, 1)
+        for i in range(1, 4):
+            self.assertAlmostEqual(p.get_fitness(i), exact.get_fitness(i))
+
+        p = Population(4, 4, 1, 0.1, input_matrix, wanted_output, max_error=0.0, precision=np.float32, streaming_chunk_size=16)
+        p.set_children([solution, close, far])
+        self.assertEqual(p.solution_index, 1)
+        self.assertAlmostEqual(p.get_exact_fitness(far, p.get_fitness(3)), exact.get_fitness(3))
+
+        # chunks of an iterator would be consumed by the first individual
+        with self.assertRaises(ValueError):
+            Population(4, 4, 1, 0.1, (input_matrix[:, start:start + 16] for start in range(0, 50, 16)), wanted_output, streaming_chunk_size=16)
+
+        # lists of chunks are not split along the samples
+        with self.assertRaises(ValueError):
+            Population(4, 4, 1, 0.1, input_matrix, [wanted_output[start:start + 10] for start in range(0, 50, 10)], streaming_chunk_size=16)
+        with self.assertRaises(ValueError):
+            Population(4, 4, 1, 0.1, input_matrix.tolist(), wanted_output, streaming_chunk_size=16)
+
+    def test_batch_evaluation(self):
+        input_matrix = np.array([np.linspace(-1, 1, 20)])
+        wanted_output = input_matrix[0] ** 2
+        np.random.seed(1)
+        p = Population(6, 30, 1, 0.1, input_matrix, wanted_output)
+        np.random.seed(1)
+        p_batch = Population(6, 30, 1, 0.1, input_matrix, wanted_output, batch_evaluation=True)
+
+        children = [p.get_random_genome() for i in range(5)]
+        p.set_children(children)
+        p_batch.set_children(children)
+        self.assertListEqual(p_batch.fitnesses.tolist(), p.fitnesses.tolist(), "batch evaluation should give the same fitnesses")
+
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file
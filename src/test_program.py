@@ -0,0 +1,265 @@
+from __future__ import annotations
+from genome import genome_output
+from program import allocate_registers, compile_program, program_output, run_program, run_program_incremental, run_programs, run_registers
+from subexpression_cache import SubexpressionCache
+from population import Population
+from genome import mutate_individual, mutate_individual_with_changes
+from utils import get_active_gene_indexes, get_output_gene_indexes
+
+import unittest
+import numpy as np
+
+test_genome = [
+            [-1, -1, -1],   # 0   | x
+            [0, 0, 0],      # 1   | 2x
+            [2, 0, 1],      # 2   | 2x * x
+            [2, 1, 1],      # 3   | 
+            [1, 2, 1],      # 4   |
+            [0, 1, 2],      # 5   | (2x * x) + 2x
+            [2, 2, 5],      # 6   | (2x * x) * ((2x * x) + 2x)
+            [0, 4, 5],      # 7
+            [2, 6, 6],      # 8   | ((2x * x) * ((2x * x) + 2x)) ^ 2
+            [-2, 8, -2]     # 9
+        ]                   # ((2x * x) * ((2x * x) + 2x)) ^ 2
+
+test_genome_small_multiple_inputs = [
+    [-1, -1, -1],   # 0   | x
+    [-1, -1, -1],   # 1   | y
+    [5, 0, -1],     # 2   | cos(x)
+    [2, 0, 1],      # 3   | x * y
+    [-2, 3, -1]     # 4   | x * y
+]                   # x * y
+
+class TestProgram(unittest.TestCase):
+
+    def test_compile_program(self):
+        program = compile_program(test_genome, get_active_gene_indexes(test_genome, get_output_gene_indexes(test_genome)), 1)
+        self.assertListEqual(program.genes.tolist(), [1, 2, 5, 6, 8], "only active function genes should be compiled, in evaluation order")
+        self.assertListEqual(program.opcodes.tolist(), [0, 2, 0, 2, 2], "opcodes should be the operations of the genes")
+        self.assertListEqual(program.destinations.tolist(), [1, 2, 3, 4, 5], "every instruction should have its own slot after the input")
+        self.assertListEqual(program.operands.tolist(), [[0, 0], [0, 1], [1, 2], [2, 3], [4, 4]], "operands should be slots of the input genes")
+        self.assertListEqual(program.output_slots.tolist(), [5], "output should be the slot of the last instruction")
+        self.assertEqual(program.nslots, 6)
+        self.assertListEqual(program.levels.tolist(), [1, 2, 3, 4, 5], "level should be the longest path from the input")
+        presorted = compile_program(test_genome, get_active_gene_indexes(test_genome, get_output_gene_indexes(test_genome)), 1, in_evaluation_order=True)
+        self.assertListEqual(presorted.genes.tolist(), program.genes.tolist(), "sorted active genes should not need sorting")
+
+        # unary operation has no second operand, inactive genes are not compiled
+        program = compile_program(test_genome_small_multiple_inputs, [4, 3], 2)
+        self.assertListEqual(program.operands.tolist(), [[0, 1]])
+        program = compile_program(test_genome_small_multiple_inputs, [4, 3, 2], 2)
+        self.assertListEqual(program.operands.tolist(), [[0, -1], [0, 1]], "unary operation should have -1 as second operand")
+
+        # output connected directly to an input
+        program = compile_program([[-1, -1, -1], [0, 0, 0], [-2, 0, -2]], [2], 1)
+        self.assertEqual(len(program), 0, "program without function genes should be empty")
+        self.assertListEqual(program_output(program, run_program(program, np.array([[1.0, 2.0]]))).tolist(), [1.0, 2.0])
+
+    def test_run_program(self):
+        input_matrix = np.array([np.array([0, 1, 2, 3, 4, 4, 3, 2, 1, 0])])
+        program = compile_program(test_genome, get_active_gene_indexes(test_genome, get_output_gene_indexes(test_genome)), 1)
+        values = run_program(program, input_matrix)
+        self.assertEqual(values.shape, (6, 10), "there should be one row of values per slot")
+        self.assertListEqual(program_output(program, values).tolist(), [0, 64, 9216, 186624, 1638400, 1638400, 186624, 9216, 64, 0], "incorrect program output")
+
+        # the same program can be run on different input values
+        input_matrix = np.array([np.linspace(-1, 1, 20)])
+        self.assertListEqual(program_output(program, run_program(program, input_matrix)).tolist(),
+                             genome_output(test_genome, get_active_gene_indexes(test_genome, get_output_gene_indexes(test_genome)), input_matrix).tolist(),
+                             "program output should be the same as genome output")
+
+    def test_allocate_registers(self):
+        program = compile_program(test_genome, get_active_gene_indexes(test_genome, get_output_gene_indexes(test_genome)), 1)
+        register_instructions, output_registers, nregisters, register_constants = allocate_registers(program)
+        self.assertEqual(len(register_instructions), len(program))
+        self.assertLess(nregisters, len(program), "registers of values no longer needed should be reused")
+
+        input_matrix = np.array([np.linspace(-1, 1, 20)])
+        buffer = np.empty((nregisters, 20))
+        registers = run_registers(register_instructions, input_matrix, buffer, register_constants)
+        self.assertListEqual(registers[output_registers[0]].tolist(), program_output(program, run_program(program, input_matrix)).tolist(),
+                             "output of the registers should be the same as of the program")
+
+    def test_several_outputs(self):
+        genome = [
+            [-1, -1, -1],   # 0   | x
+            [4, 0, -1],     # 1   | sin(x)
+            [2, 1, 0],      # 2   | sin(x) * x
+            [-2, 1, -2],    # 3   | sin(x), an output used as an input of a later gene
+            [0, 3, 2],      # 4   | sin(x) + sin(x) * x
+            [-2, 4, -2]     # 5   | sin(x) + sin(x) * x
+        ]
+        input_matrix = np.array([np.linspace(-1, 1, 20)])
+        x = input_matrix[0]
+        program = compile_program(genome, get_active_gene_indexes(genome, get_output_gene_indexes(genome)), 1)
+        self.assertEqual(len(program), 3, "genes shared by the outputs should be calculated once")
+
+        output = program_output(program, run_program(program, input_matrix))
+        self.assertEqual(output.shape, (2, 20), "there should be one row per output")
+        self.assertListEqual(output[0].tolist(), np.sin(x).tolist())
+        self.assertListEqual(output[1].tolist(), (np.sin(x) + np.sin(x) * x).tolist())
+
+        outputs = run_programs([program, program], input_matrix)
+        self.assertEqual(outputs.shape, (2, 2, 20))
+        self.assertListEqual(outputs[1].tolist(), output.tolist())
+
+        register_instructions, output_registers, nregisters, register_constants = allocate_registers(program)
+        registers = run_registers(register_instructions, input_matrix, np.empty((nregisters, 20)), register_constants)
+        self.assertListEqual([registers[output_register].tolist() for output_register in output_registers], output.tolist())
+
+    def test_run_programs(self):
+        input_matrix = np.array([np.linspace(-1, 1, 20), np.linspace(0, 2, 20)])
+        population = Population(1, 30, 2, 0.1, input_matrix, input_matrix[0])
+        parent = population.get_random_genome()
+
+        # siblings of one parent, random genomes and a genome with output connected to an input
+        genomes = [mutate_individual(parent, 30, 2, 0.1) for i in range(8)] + [population.get_random_genome() for i in range(8)]
+        genomes.append([[-1, -1, -1], [-1, -1, -1], [0, 0, 1], [-2, 1, -2]])
+        programs = [compile_program(genome, get_active_gene_indexes(genome, get_output_gene_indexes(genome)), 2) for genome in genomes]
+
+        outputs = run_programs(programs, input_matrix)
+        self.assertEqual(outputs.shape, (len(programs), 20), "there should be one output row per program")
+        for program, output in zip(programs, outputs):
+            self.assertListEqual(output.tolist(), program_output(program, run_program(program, input_matrix)).tolist(), "batched output should be the same as output of a single program")
+
+        # programs without instructions only
+        program = compile_program([[-1, -1, -1], [-1, -1, -1], [-2, 1, -2]], [2], 2)
+        self.assertListEqual(run_programs([program, program], input_matrix).tolist(), [input_matrix[1].tolist()] * 2)
+
+    def test_run_program_incremental(self):
+        input_matrix = np.array([np.linspace(-1, 1, 20), np.linspace(0, 2, 20)])
+        population = Population(1, 30, 2, 0.1, input_matrix, input_matrix[0])
+        for i in range(20):
+            parent = population.get_random_genome()
+            parent_program = compile_program(parent, get_active_gene_indexes(parent, get_output_gene_indexes(parent)), 2)
+            parent_values = run_program(parent_program, input_matrix)
+            for j in range(5):
+                child, changed_gene_indexes = mutate_individual_with_changes(parent, 30, 2, 0.1)
+                program = compile_program(child, get_active_gene_indexes(child, get_output_gene_indexes(child)), 2)
+                values = run_program_incremental(program, input_matrix, parent_program, parent_values, changed_gene_indexes)
+                self.assertListEqual(values.tolist(), run_program(program, input_matrix).tolist(), "incremental run should give the same values as a full run")
+
+        # unchanged genes are copied from the parent, not calculated
+        program = compile_program(test_genome, get_active_gene_indexes(test_genome, get_output_gene_indexes(test_genome)), 1)
+        input_matrix = np.array([np.linspace(-1, 1, 20)])
+        parent_values = run_program(program, input_matrix)
+        parent_values[2] = 7 # value of gene 2
+        values = run_program_incremental(program, input_matrix, program, parent_values, [5])
+        self.assertListEqual(values[2].tolist(), [7] * 20, "unchanged gene should be copied from the parent")
+        self.assertNotEqual(values[5].tolist(), parent_values[5].tolist(), "genes depending on the changed gene should be calculated")
+
+    def test_run_program_float32(self):
+        input_matrix = np.array([np.linspace(-1, 1, 20), np.linspace(0, 2, 20)])
+        population = Population(1, 30, 2, 0.1, input_matrix, input_matrix[0])
+        for i in range(20):
+            genome = population.get_random_genome()
+            program = compile_program(genome, get_active_gene_indexes(genome, get_output_gene_indexes(genome)), 2)
+            values = run_program(program, input_matrix, dtype=np.float32)
+            self.assertEqual(values.dtype, np.float32)
+            self.assertEqual(run_programs([program], input_matrix, np.float32).dtype, np.float32)
+
+        # float32 products overflowing to inf are out of range for the next operation, like the products over 1e+30 in float64
+        genome = [[-1, -1, -1], [2, 0, 0], [2, 1, 1], [0, 2, 0], [-2, 3, -2]] # ((x * x) * (x * x)) + x
+        program = compile_program(genome, [0, 1, 2, 3, 4], 1)
+        input_matrix = np.array([[1e10, 2.0]])
+        for dtype in [np.float64, np.float32]:
+            output = program_output(program, run_program(program, input_matrix, dtype=dtype))
+            self.assertListEqual(output.tolist(), [0.0, 18.0])
+
+    def test_constant_folding(self):
+        genome = [
+            [-1, -1, -1],   # 0  | x
+            [1, 0, 0],      # 1  | x - x = 0
+            [5, 1, -1],     # 2  | cos(x - x) = 1
+            [2, 2, 0],      # 3  | cos(x - x) * x = x
+            [4, 0, -1],     # 4  | sin(x)
+            [4, 0, -1],     # 5  | sin(x)
+            [3, 4, 5],      # 6  | sin(x) % sin(x) = 0
+            [2, 6, 3],      # 7  | 0 * x = 0
+            [0, 3, 7],      # 8  | x + 0 = x
+            [-2, 8, -2]     # 9
+        ]
+        input_matrix = np.array([np.linspace(-1, 1, 20)])
+        program = compile_program(genome, get_active_gene_indexes(genome, get_output_gene_indexes(genome)), 1)
+        self.assertListEqual(program.genes.tolist(), [3, 8], "genes not depending on the input and genes only they read should not be instructions")
+        self.assertListEqual(sorted(zip(program.constant_genes.tolist(), program.constant_values.tolist())), [(2, 1.0), (7, 0.0)],
+                             "only constants read by instructions should be kept")
+        self.assertEqual(program.nslots, 5)
+
+        output = program_output(program, run_program(program, input_matrix))
+        self.assertListEqual(output.tolist(), input_matrix[0].tolist())
+        self.assertListEqual(run_programs([program], input_matrix)[0].tolist(), output.tolist())
+        register_instructions, output_registers, nregisters, register_constants = allocate_registers(program)
+        registers = run_registers(register_instructions, input_matrix, np.empty((nregisters, 20)), register_constants)
+        self.assertListEqual(registers[output_registers[0]].tolist(), output.tolist())
+
+        # protected operations outside of their domains are constant too
+        genome = [[-1, -1, -1], [3, 0, 0], [-2, 1, -2]] # x % x
+        program = compile_program(genome, [1, 2], 1)
+        self.assertEqual(len(program), 0)
+        self.assertListEqual(program_output(program, run_program(program, np.array([[0.0, 1.0, 1e40, -3.0]]))).tolist(), [0.0, 0.0, 0.0, 0.0])
+
+        # the child is evaluated incrementally from a parent with other constants
+        child = [[-1, -1, -1], [1, 0, 0], [6, 1, -1], [2, 2, 0], [-2, 3, -2]] # e^(x - x) * x
+        parent = [[-1, -1, -1], [1, 0, 0], [5, 1, -1], [2, 2, 0], [-2, 3, -2]] # cos(x - x) * x
+        parent_program = compile_program(parent, [1, 2, 3, 4], 1)
+        child_program = compile_program(child, [1, 2, 3, 4], 1)
+        parent = [[-1, -1, -1], [1, 0, 0], [7, 1, -1], [2, 2, 0], [-2, 3, -2]] # ln(|x - x|) * x = 0
+        other_program = compile_program(parent, [1, 2, 3, 4], 1)
+        values = run_program_incremental(child_program, input_matrix, other_program, run_program(other_program, input_matrix), [2])
+        self.assertListEqual(program_output(child_program, values).tolist(), input_matrix[0].tolist(), "instructions reading changed constants should be calculated")
+        values = run_program_incremental(child_program, input_matrix, parent_program, run_program(parent_program, input_matrix), [2])
+        self.assertListEqual(program_output(child_program, values).tolist(), input_matrix[0].tolist())
+
+    def test_structural_hashes(self):
+        # the same expression at different genes, with swapped operands of a commutative operation
+        genome = [
+            [-1, -1, -1],   # 0 | x
+            [-1, -1, -1],   # 1 | y
+            [0, 0, 1],      # 2 | x + y
+            [0, 1, 0],      # 3 | y + x
+            [1, 0, 1],      # 4 | x - y
+            [1, 1, 0],      # 5 | y - x
+            [4, 2, -1],     # 6 | sin(x + y)
+            [4, 3, -1],     # 7 | sin(y + x)
+            [-2, 7, -2]     # 8
+        ]
+        program = compile_program(genome, list(range(9)), 2)
+        hashes = dict(zip(program.genes.tolist(), program.hashes))
+        self.assertEqual(hashes[2], hashes[3], "operands of + should be ordered")
+        self.assertNotEqual(hashes[4], hashes[5], "operands of - should not be ordered")
+        self.assertEqual(hashes[6], hashes[7], "same expressions should have the same hash")
+        self.assertNotEqual(hashes[2], hashes[6])
+
+    def test_run_program_subexpression_cache(self):
+        input_matrix = np.array([np.linspace(-1, 1, 20), np.linspace(0, 2, 20)])
+        population = Population(1, 30, 2, 0.1, input_matrix, input_matrix[0])
+        cache = SubexpressionCache()
+        for i in range(20):
+            parent = population.get_random_genome()
+            parent_program = compile_program(parent, get_active_gene_indexes(parent, get_output_gene_indexes(parent)), 2)
+            parent_values = run_program(parent_program, input_matrix, cache)
+            self.assertListEqual(parent_values.tolist(), run_program(parent_program, input_matrix).tolist(), "cached subexpressions should give the same values")
+            for j in range(5):
+                child, changed_gene_indexes = mutate_individual_with_changes(parent, 30, 2, 0.1)
+                program = compile_program(child, get_active_gene_indexes(child, get_output_gene_indexes(child)), 2)
+                values = run_program_incremental(program, input_matrix, parent_program, parent_values, changed_gene_indexes, cache)
+                self.assertListEqual(values.tolist(), run_program(program, input_matrix).tolist(), "cached subexpressions should give the same values")
+
+        # every instruction of a program run again is found in the cache
+        program = compile_program(test_genome, get_active_gene_indexes(test_genome, get_output_gene_indexes(test_genome)), 1)
+        input_matrix = np.array([np.linspace(-1, 1, 20)])
+        cache = SubexpressionCache()
+        values = run_program(program, input_matrix, cache)
+        hits = cache.hits
+        self.assertListEqual(run_program(program, input_matrix, cache).tolist(), values.tolist())
+        self.assertEqual(cache.hits, hits + len(program))
+
+        # values of a different subexpression cached under the same hash are not copied
+        cache = SubexpressionCache()
+        cache.put(program.hashes[0], np.full(20, 123.0), ("other", 0))
+        self.assertListEqual(run_program(program, input_matrix, cache).tolist(), values.tolist())
+        self.assertEqual(cache.collisions, 1)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,49 @@
+from __future__ import annotations
+from subexpression_cache import SubexpressionCache
+
+import unittest
+import numpy as np
+
+class TestSubexpressionCache(unittest.TestCase):
+
+    def test_subexpression_cache(self):
+        cache = SubexpressionCache()
+        values = np.full((3, 10), 1.0)
+        self.assertIsNone(cache.get(1))
+        cache.put(1, values[0])
+        cache.put(2, values[1])
+        self.assertIs(cache.get(1).base, values, "values should be cached by reference")
+        self.assertEqual((cache.hits, cache.misses), (1, 1))
+        self.assertEqual(cache.nbytes, values.nbytes, "the matrix kept by the cached rows should be counted once")
+
+        cache.clear()
+        self.assertEqual(len(cache), 0)
+        self.assertEqual(cache.nbytes, 0)
+        self.assertIsNone(cache.get(1))
+        self.assertEqual(cache.get_statistics(), {"subexpression_cache_hits": 1, "subexpression_cache_misses": 2, "subexpression_cache_collisions": 0})
+
+    def test_subexpression_cache_collisions(self):
+        cache = SubexpressionCache()
+        values = np.full(10, 1.0)
+        cache.put(1, values, (4, 7))
+        self.assertIs(cache.get(1, (4, 7)), values)
+        self.assertIsNone(cache.get(1, (5, 7)), "values of a different subexpression with the same hash should not be used")
+        self.assertEqual((cache.hits, cache.misses, cache.collisions), (1, 1, 1))
+
+        # the first cached subexpression is kept
+        cache.put(1, np.full(10, 2.0), (5, 7))
+        self.assertIs(cache.get(1, (4, 7)), values)
+
+    def test_subexpression_cache_limit(self):
+        cache = SubexpressionCache(max_bytes=100)
+        cache.put(1, np.full(10, 1.0))
+        cache.put(2, np.full(10, 2.0))
+        self.assertEqual(len(cache), 1, "values over the limit should not be cached")
+        self.assertIsNone(cache.get(2))
+
+        cache = SubexpressionCache(max_bytes=0)
+        cache.put(1, np.full(1, 1.0))
+        self.assertEqual(len(cache), 0)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -4,6 +4,7 @@ from evolution import evolve
 from genome import genome_output, subgraph_exchange
 from population import Population
 
+import random
 import unittest
 import numpy as np
 
@@ -53,7 +54,7 @@ class TestTournamentSelection(unittest.TestCase):
         parent = population.get_parent()
 
         for i in range(len(parent)):
-            self.assertListEqual(parent[i], test_genome_best_parent[i], "parent should not be changed")
+            self.assertListEqual(parent[i].tolist(), test_genome_best_parent[i], "parent should not be changed")
             
     def test_get_best_group_individual(self):
         best_parent_function = lambda x: (x + x) * x
@@ -75,7 +76,7 @@ class TestTournamentSelection(unittest.TestCase):
 
         wanted_output = func(input)
         acceptable_boundary = 0
-        solution, fitness, *_, found_solution  = evolve(population_size=4,
+        solution, fitness, *_, found_solution = evolve(population_size=4,
                ncolumns=10,
                nrows=1,
                input_matrix=input,
@@ -130,7 +131,7 @@ class TestTournamentSelection(unittest.TestCase):
 
         wanted_output = func(input)
         acceptable_boundary = 0
-        solution, fitness, *_, found_solution  = evolve(population_size=4,
+        solution, fitness, *_, found_solution = evolve(population_size=4,
                ncolumns=10,
                nrows=1,
                input_matrix=input,
@@ -176,5 +177,30 @@ class TestTournamentSelection(unittest.TestCase):
         else:
             print("no solution found in time in test_evolve_two_inputs_float_AGT")
 
+    def test_evolve_several_outputs(self):
+        # with several outputs, output genes can read other output genes
+        input = np.array([np.linspace(-1, 1, 20, dtype=float), np.linspace(1, 2, 20, dtype=float)])
+        wanted_output = np.array([input[0], input[0] * input[0], input[0] + input[1]])
+        for algorithm in (AlgorithmEnum.SUBGRAPH_EXCHANGE, AlgorithmEnum.PASSIVE_ACTIVE_IMPLANTATION):
+            for seed in range(1, 6):
+                random.seed(seed)
+                solution, fitness, *_, found_solution = evolve(population_size=4,
+                    ncolumns=10,
+                    nrows=2,
+                    input_matrix=input,
+                    wanted_output=wanted_output,
+                    acceptable_boundary=0,
+                    max_fitness_evaluations=2000,
+                    mutation_rate=0.1,
+                    seed=seed,
+                    algorithm=algorithm,
+                    noutputs=3)
+
+                self.assertEqual(len(get_output_gene_indexes(solution)), 3)
+                solution_output = genome_output(solution, get_active_gene_indexes(solution, get_output_gene_indexes(solution)), input)
+                self.assertEqual(solution_output.shape, wanted_output.shape)
+                if found_solution:
+                    self.assertListEqual(np.round(wanted_output, 15).tolist(), np.round(solution_output, 15).tolist(), "solution should be correct")
+
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file
@@ -1,7 +1,8 @@
 from __future__ import annotations
-from utils import get_active_gene_indexes, get_genome_column, get_last_possible_input_index, get_number_of_gene_inputs, get_output_gene_indexes
+from utils import get_active_gene_indexes, get_active_genes, get_reference_counts, update_active_genes, get_changed_gene_indexes, get_evaluation_order, get_genome_column, get_last_possible_input_index, get_number_of_gene_inputs, get_output_gene_indexes, get_stratified_subset_indexes, copy_genome, to_genome_array, to_genome_list
 
 import unittest
+import numpy as np
 
 test_genome_small = [
     [-1, -1, -1],   # 0
@@ -31,6 +32,96 @@ class TestUtils(unittest.TestCase):
         self.assertEqual(len(active_genes), 6, f"Should be 6, active genes are: {active_genes}")
         self.assertEqual(set(active_genes), set([9, 8, 6, 5, 2, 1]), f"active genes are: {active_genes}, but they sould be 9, 8, 6, 5, 2, 1, 0")
 
+    def test_get_active_gene_indexes_several_outputs(self):
+        genome = [
+            [-1, -1, -1],   # 0   | x
+            [4, 0, -1],     # 1   | sin(x)
+            [2, 1, 0],      # 2   | sin(x) * x
+            [5, 0, -1],     # 3   |
+            [-2, 1, -2],    # 4   | sin(x)
+            [-2, 2, -2]     # 5   | sin(x) * x
+        ]
+        active_genes = get_active_gene_indexes(genome, [4, 5, 5])
+        self.assertEqual(sorted(active_genes), [1, 2, 4, 5], "genes shared by the outputs should be active once")
+
+    def test_get_active_genes(self):
+        active_mask, active_genes = get_active_genes(test_genome, [9])
+        self.assertListEqual(active_genes, [1, 2, 5, 6, 8, 9], "active genes should be sorted")
+        self.assertListEqual(np.flatnonzero(active_mask).tolist(), active_genes)
+        self.assertListEqual(get_evaluation_order(active_genes), active_genes, "active genes should already be in evaluation order")
+
+        # an output gene read by a later output gene passes its input through
+        genome = [[-1, -1, -1], [-1, -1, -1], [4, 1, -1], [0, 0, 0], [-2, 2, -2], [-2, 4, -2]]
+        active_mask, active_genes = get_active_genes(genome, [5])
+        self.assertListEqual(active_genes, [2, 4, 5], "input genes should not be active")
+        self.assertEqual(len(active_mask), 6)
+
+    def test_get_reference_counts(self):
+        reference_counts = get_reference_counts(test_genome, get_active_gene_indexes(test_genome, [9]), [9])
+        self.assertListEqual(reference_counts, [3, 2, 2, 0, 0, 1, 2, 0, 1, 1], "inactive genes should not hold references")
+
+    def test_update_active_genes(self):
+        parent = test_genome
+        parent_reference_counts = get_reference_counts(parent, get_active_gene_indexes(parent, [9]), [9])
+        children = [
+            ([[-1, -1, -1], [0, 0, 0], [2, 0, 1], [2, 1, 1], [1, 2, 1], [0, 1, 2], [2, 2, 5], [0, 4, 5], [2, 7, 6], [-2, 8, -2]], [8]), # gene 7 becomes active
+            ([[-1, -1, -1], [0, 0, 0], [2, 0, 1], [2, 1, 1], [1, 2, 1], [0, 1, 2], [2, 2, 5], [0, 4, 5], [2, 6, 6], [-2, 0, -2]], [9]), # output reads the input
+            ([[-1, -1, -1], [0, 0, 0], [2, 0, 1], [2, 1, 1], [1, 2, 1], [0, 1, 2], [4, 5, -1], [0, 4, 5], [4, 3, -1], [-2, 8, -2]], [6, 8]), # several changes
+        ]
+        for child, changed_gene_indexes in children:
+            reference_counts, activity = update_active_genes(parent, child, parent_reference_counts, changed_gene_indexes)
+            active_mask, active_genes = get_active_genes(child, [9])
+            self.assertListEqual(reference_counts, get_reference_counts(child, active_genes, [9]), "incremental reference counts should match the full count")
+            for gene_index, is_active in activity.items():
+                self.assertEqual(is_active, active_mask[gene_index])
+            unvisited_genes = [gene_index for gene_index in range(len(parent)) if gene_index not in activity]
+            self.assertListEqual(active_mask[unvisited_genes].tolist(), get_active_genes(parent, [9])[0][unvisited_genes].tolist(), "genes not visited should keep their activity")
+        self.assertListEqual(parent_reference_counts, get_reference_counts(parent, get_active_gene_indexes(parent, [9]), [9]), "parent reference counts should not be changed")
+
+    def test_compact_genome(self):
+        genome = to_genome_array(test_genome)
+        self.assertEqual(genome.shape, (10, 3))
+        self.assertEqual(genome.dtype, np.int16)
+        self.assertTrue(genome.flags.c_contiguous)
+        self.assertIs(to_genome_array(genome), genome, "compact genome should not be copied")
+        self.assertListEqual(to_genome_list(genome), test_genome)
+        self.assertListEqual(to_genome_list(test_genome), test_genome)
+
+        copy = copy_genome(genome)
+        copy[1, 0] = 3
+        self.assertEqual(genome[1, 0], 0, "copy should not share genes with the original")
+
+        # queries give the same result for both representations
+        self.assertListEqual(get_output_gene_indexes(genome), get_output_gene_indexes(test_genome))
+        self.assertListEqual(get_active_gene_indexes(genome, [9]), get_active_gene_indexes(test_genome, [9]))
+        self.assertListEqual(get_changed_gene_indexes(genome, copy), [1])
+        self.assertListEqual(get_changed_gene_indexes(test_genome, to_genome_list(copy)), [1])
+
+    def test_get_evaluation_order(self):
+        active_genes = get_active_gene_indexes(test_genome, [9])
+        order = get_evaluation_order(active_genes)
+        self.assertListEqual(order, [1, 2, 5, 6, 8, 9], "active genes should be in topological order")
+
+        # every gene has to come after its inputs
+        position = {gene_index: i for i, gene_index in enumerate(order)}
+        for gene_index in order:
+            for input_index in test_genome[gene_index][1:]:
+                if input_index in position:
+                    self.assertLess(position[input_index], position[gene_index], f"gene {gene_index} is evaluated before its input {input_index}")
+
+    def test_get_changed_gene_indexes(self):
+        self.assertListEqual(get_changed_gene_indexes(test_genome, test_genome), [], "same genomes should have no changed genes")
+        changed_genome = [gene.copy() for gene in test_genome]
+        changed_genome[3][0] = 1
+        changed_genome[7][2] = 3
+        self.assertListEqual(get_changed_gene_indexes(test_genome, changed_genome), [3, 7], "incorrect changed gene indexes")
+
+    def test_get_stratified_subset_indexes(self):
+        wanted_output = np.array([5.0, 0.0, 9.0, 1.0, 7.0, 3.0, 8.0, 2.0, 6.0, 4.0])
+        indexes = get_stratified_subset_indexes(wanted_output, 4)
+        self.assertListEqual(indexes.tolist(), [1, 2, 5, 8], "subset should contain the smallest, the largest and evenly spaced outputs")
+        self.assertListEqual(get_stratified_subset_indexes(wanted_output, 10).tolist(), list(range(10)))
+
     def test_get_number_of_gene_inputs(self):
         gene = [0, 0, 0]
         self.assertEqual(get_number_of_gene_inputs(gene), 2, "incorrect number of inputs for gene")
@@ -57,6 +148,7 @@ class TestUtils(unittest.TestCase):
 
     def test_get_output_gene_indexes(self):
         self.assertListEqual([3], get_output_gene_indexes(test_genome_small), "incorrect output gene indexes")
+        self.assertListEqual([4, 5], get_output_gene_indexes([[-1, -1, -1], [4, 0, -1], [2, 1, 0], [5, 0, -1], [-2, 1, -2], [-2, 2, -2]]))
         pass
 
 if __name__ == '__main__':
@@ -6,8 +6,9 @@ Author: Petr Bromnik
 
 import numpy as np
 
-from genome import mutate_individual
+from genome import crossover_and_mutate
 from population import Population
+from constants.backendEnum import BackendEnum
 
 
 def tournament_selection(population_size,
@@ -19,7 +20,13 @@ def tournament_selection(population_size,
                         max_fitness_evaluations,
                         mutation_rate,
                         exchange_rate,
-                        exchange_function):
+                        exchange_function,
+                        batch_evaluation = False,
+                        backend = BackendEnum.INTERPRETER,
+                        precision = np.float64,
+                        streaming_chunk_size = None,
+                        noutputs = 1,
+                        return_statistics = False):
     '''[summary]
     Runs CGP with tournament selection algorithm
     ### Parameters
@@ -43,8 +50,21 @@ def tournament_selection(population_size,
         - exchange rate of the algorithm
     10. exchange_function
         - function to exchange genes
+    11. batch_evaluation
+        - whether children of a generation are evaluated together in one batch
+    12. backend
+        - how children not evaluated in a batch are evaluated, see BackendEnum
+    13. precision
+        - floating point type individuals are evaluated in, np.float64 or np.float32
+        - with np.float32, acceptable solutions and the returned fitness are confirmed in np.float64
+    14. streaming_chunk_size
+        - if set, individuals are evaluated in chunks of this many samples, see Population
+    15. noutputs
+        - number of output genes, wanted_output has one row per output with several outputs
+    16. return_statistics
+        - whether the statistics of the fitness evaluations are returned as a 7th value
     ### Returns
-    1. List[List[int]]
+    1. np.ndarray
         - best individual found
     2. float
         - fitness of the best individual
@@ -56,9 +76,11 @@ def tournament_selection(population_size,
         - list of the best fitness over time
     6. bool
         - whether the solution was found
+    7. Dict[str, int]
+        - only if return_statistics is True, nominal number of fitness evaluations and numbers of really computed and skipped fitness evaluations
     '''
 
-    population = Population(population_size, ncolumns, nrows, mutation_rate, input_matrix=input_matrix, wanted_output=wanted_output, nparents=2, max_error=acceptable_boundary)
+    population = Population(population_size, ncolumns, nrows, mutation_rate, input_matrix=input_matrix, wanted_output=wanted_output, nparents=2, max_error=acceptable_boundary, batch_evaluation=batch_evaluation, backend=backend, precision=precision, streaming_chunk_size=streaming_chunk_size, noutputs=noutputs)
 
     fitness_evaluations = 0
     generation = 0
@@ -86,8 +108,14 @@ def tournament_selection(population_size,
     if population.solution_index != None:
         top_individual = population.get_individual(population.solution_index)
         fitness = population.get_fitness(population.solution_index)
+    else:
+        fitness = population.get_exact_fitness(top_individual, fitness)
 
-    return top_individual, fitness, generation, fitness_evaluations, top_fitness_over_time, found_solution
+    if not return_statistics:
+        return top_individual, fitness, generation, fitness_evaluations, top_fitness_over_time, found_solution
+
+    evaluation_statistics = {"nominal_fitness_evaluations": fitness_evaluations, **population.get_evaluation_statistics()}
+    return top_individual, fitness, generation, fitness_evaluations, top_fitness_over_time, found_solution, evaluation_statistics
     
 def tournament(population, population_size, exchange_rate, exchange_function):
     '''[summary]
@@ -102,9 +130,9 @@ def tournament(population, population_size, exchange_rate, exchange_function):
     4. exchange_function
         - function to exchange genes
     ### Returns
-    1. List[List[int]]
+    1. np.ndarray
         - parent 1 genome
-    2. List[List[int]]
+    2. np.ndarray
         - parent 2 genome
     3. float
         - fitness of parent 1
@@ -151,14 +179,18 @@ def generate_new_population(new_parent_1_index, new_parent_2_index, population,
     ### Returns
     None
     '''
-    parent_1, parent_1_active_path = population.get_individual_with_active_path(new_parent_1_index)
-    parent_2, parent_2_active_path = population.get_individual_with_active_path(new_parent_2_index)
-
-    child_1 = exchange_function(parent_1, parent_1_active_path, parent_2, parent_2_active_path, exchange_rate, population.nrows)
-    child_2 = exchange_function(parent_2, parent_2_active_path, parent_1, parent_1_active_path, exchange_rate, population.nrows)
-
-    child_1_mutated = mutate_individual(child_1, population.ncolumns, population.nrows, population.mutation_rate)
-    child_2_mutated = mutate_individual(child_2, population.ncolumns, population.nrows, population.mutation_rate)
-
-    population.set_parents_by_indexes(new_parent_1_index, new_parent_2_index) # parents first, as they can be one of the previous children
-    population.set_children([child_1_mutated, child_2_mutated])
\ No newline at end of file
+    parent_1_index, parent_2_index = population.set_parents_by_indexes(new_parent_1_index, new_parent_2_index) # parents first, as they can be one of the previous children
+    parent_1, parent_1_active_path = population.get_population()[parent_1_index], population.get_active_path(parent_1_index)
+    parent_2, parent_2_active_path = population.get_population()[parent_2_index], population.get_active_path(parent_2_index)
+
+    # children are exchanged and mutated directly in their rows of the population
+    changed_gene_indexes = []
+    for child_number, (receiver, receiver_active_path, donor, donor_active_path) in enumerate(((parent_1, parent_1_active_path, parent_2, parent_2_active_path),
+                                                                                              (parent_2, parent_2_active_path, parent_1, parent_1_active_path))):
+        _, child_changed_gene_indexes = crossover_and_mutate(receiver, receiver_active_path, donor, donor_active_path, exchange_rate, exchange_function,
+                                                             population.ncolumns, population.nrows, population.mutation_rate, population.geometry,
+                                                             child=population.get_child_buffer(child_number))
+        changed_gene_indexes.append(child_changed_gene_indexes)
+
+    # children changed only in genes inactive in their receiver parent inherit its fitness
+    population.update_children(parent_indexes=[parent_1_index, parent_2_index], changed_gene_indexes=changed_gene_indexes)
@@ -6,8 +6,66 @@ Author: Petr Bromnik
 
 from constants.operations import operations, op_inputs
 
+import heapq
+import numpy as np
 import random
 
+def get_gene_dtype(ngenes):
+    '''[summary]
+    Returns the smallest integer type that can hold every allele of a genome with the given number of genes
+    ### Parameters
+    1. ngenes
+        - number of genes in the genome
+    ### Returns
+    np.dtype
+        - np.int16, or np.int32 for genomes with more genes than np.int16 can index
+    '''
+    return np.dtype(np.int16) if ngenes <= np.iinfo(np.int16).max else np.dtype(np.int32)
+
+def to_genome_array(genome):
+    '''[summary]
+    Returns the genome as a compact genome, a contiguous (number of genes, 3) array of small integers.
+    Copying a compact genome is a single memory copy and queries over all genes are vectorized.
+    A compact genome is returned as it is, without copying it.
+    ### Parameters
+    1. genome
+        - genome as a list of genes (List[List[int]]) or a compact genome
+    ### Returns
+    np.ndarray
+        - compact genome, every row is one gene [operation, input 1, input 2]
+    '''
+    if isinstance(genome, np.ndarray) and genome.flags.c_contiguous and genome.dtype.kind == 'i':
+        return genome
+    return np.ascontiguousarray(genome, dtype=get_gene_dtype(len(genome))).reshape(len(genome), 3)
+
+def to_genome_list(genome):
+    '''[summary]
+    Returns the genome as a list of genes
+    ### Parameters
+    1. genome
+        - compact genome or genome as a list of genes
+    ### Returns
+    List[List[int]]
+        - genome as a list of genes, every gene is a list [operation, input 1, input 2] of python integers
+    '''
+    if isinstance(genome, np.ndarray):
+        return genome.tolist()
+    return [[int(allele) for allele in gene] for gene in genome]
+
+def copy_genome(genome):
+    '''[summary]
+    Returns a compact copy of the genome, which can be changed without changing the original
+    ### Parameters
+    1. genome
+        - compact genome or genome as a list of genes
+    ### Returns
+    np.ndarray
+        - compact genome, see to_genome_array
+    '''
+    if isinstance(genome, np.ndarray):
+        return to_genome_array(genome).copy()
+    return to_genome_array(genome)
+
 def get_last_possible_input_index(ncolumns, nrows, gene_index):
     '''[summary]
     For the given gene index, returns the last index that can be used as its input
@@ -76,7 +134,7 @@ def get_number_of_gene_inputs(gene):
 
 def get_output_gene_indexes(genome):
     '''[summary]
-    Returns indexes of output genes in genome
+    Returns indexes of output genes in genome, output genes are the last genes of the genome, so only they are read
     ### Parameters
     1. genome
         - genome to search output genes in
@@ -84,12 +142,158 @@ def get_output_gene_indexes(genome):
     List[int]
         - list of indexes of output genes in genome
     '''
-    return [i for i in range(len(genome)) if genome[i][0] == -2] # TODO may be optimized (last column of the genome matrix)
+    first_output_gene_index = len(genome)
+    while first_output_gene_index > 0 and genome[first_output_gene_index - 1][0] == -2:
+        first_output_gene_index -= 1
+    return list(range(first_output_gene_index, len(genome)))
+
+def get_active_genes(genome, output_gene_indexes):
+    '''[summary]
+    Returns the active genes of the genome found by one sweep from the last output gene to the first gene.
+    Genes only take inputs from previous genes, so when a gene is reached in the sweep, all genes reading it were already
+    visited and it is known whether it is active. The sweep jumps from one active gene to the next (largest) one,
+    inactive genes are not read.
+    ### Parameters
+    1. genome
+        - genome to search active genes in, compact genome or list of genes
+    2. output_gene_indexes
+        - list of indexes of output genes
+    ### Returns
+    1. np.ndarray
+        - bool for each gene, True if the gene is active (input genes are never marked)
+    2. List[int]
+        - sorted indexes of active genes, which is an evaluation order (see get_evaluation_order)
+    '''
+    is_compact = isinstance(genome, np.ndarray)
+
+    # genes reached by the sweep, by negative index, so the largest index is taken first
+    genes_to_visit = [-int(output_gene_index) for output_gene_index in output_gene_indexes]
+    heapq.heapify(genes_to_visit)
+
+    active_gene_indexes = []
+    last_visited_gene_index = None
+    while genes_to_visit:
+        gene_index = -heapq.heappop(genes_to_visit)
+        # genes read by several active genes are reached several times, one after another
+        if gene_index == last_visited_gene_index:
+            continue
+        last_visited_gene_index = gene_index
 
+        gene_operation, first_input, second_input = genome[gene_index].tolist() if is_compact else genome[gene_index]
+        # in case of input gene, it is not an active gene
+        if (gene_operation == -1):
+            continue
+
+        active_gene_indexes.append(gene_index)
+        # output genes use only the first input
+        heapq.heappush(genes_to_visit, -first_input)
+        if (gene_operation >= 0 and op_inputs[operations[gene_operation]] == 2):
+            heapq.heappush(genes_to_visit, -second_input)
+
+    active_gene_indexes.reverse()
+    active_mask = np.zeros(len(genome), dtype=bool)
+    active_mask[active_gene_indexes] = True
+    return active_mask, active_gene_indexes
+
+def get_gene_inputs(gene):
+    '''[summary]
+    Returns the genes the given gene reads
+    ### Parameters
+    1. gene
+        - gene as a list or tuple of python integers
+    ### Returns
+    Tuple[int]
+        - indexes of the inputs of the gene, empty for input genes, one for output genes
+    '''
+    gene_operation = gene[0]
+    if gene_operation == -1:
+        return ()
+    if gene_operation == -2 or op_inputs[operations[gene_operation]] == 1:
+        return (gene[1],)
+    return (gene[1], gene[2])
+
+def get_reference_counts(genome, active_gene_indexes, output_gene_indexes):
+    '''[summary]
+    Returns the number of references to each gene, a reference is an active gene reading the gene,
+    output genes hold one more reference, so a gene is active exactly if it is not an input gene and it is referenced
+    ### Parameters
+    1. genome
+        - genome to count the references in, compact genome or list of genes
+    2. active_gene_indexes
+        - indexes of active genes of the genome
+    3. output_gene_indexes
+        - list of indexes of output genes
+    ### Returns
+    List[int]
+        - number of references to each gene
+    '''
+    reference_counts = [0] * len(genome)
+    for output_gene_index in output_gene_indexes:
+        reference_counts[output_gene_index] += 1
+
+    active_genes = genome[active_gene_indexes].tolist() if isinstance(genome, np.ndarray) else [genome[gene_index] for gene_index in active_gene_indexes]
+    for gene in active_genes:
+        for input_gene_index in get_gene_inputs(gene):
+            reference_counts[input_gene_index] += 1
+    return reference_counts
+
+def update_active_genes(parent, child, parent_reference_counts, changed_gene_indexes):
+    '''[summary]
+    Returns the reference counts of the active genes of a child (see get_reference_counts) updated from its parent,
+    only genes whose references change are visited, so the time is proportional to the changed part of the active genes.
+    References of the parent versions of changed active genes are released first, genes left without references become inactive
+    and release their references too. Then changed genes that are still active take references of their new versions,
+    genes that get their first reference become active and take references too.
+    ### Parameters
+    1. parent
+        - genome of the parent
+    2. child
+        - genome of the child
+    3. parent_reference_counts
+        - reference counts of the parent, they are not changed
+    4. changed_gene_indexes
+        - indexes of genes in which the child differs from the parent (mutation or crossover)
+    ### Returns
+    1. List[int]
+        - reference counts of the child
+    2. Dict[int, bool]
+        - genes that may have changed their activity, with True if the gene is active in the child
+    '''
+    def get_gene(genome, gene_index):
+        return genome[gene_index].tolist() if isinstance(genome, np.ndarray) else genome[gene_index]
+
+    reference_counts = list(parent_reference_counts)
+    visited_genes = set(changed_gene_indexes)
+
+    # release references of the parent versions of changed genes active in the parent
+    # changed genes are never input genes, so a changed gene is active exactly if it is referenced
+    detached_genes = set(gene_index for gene_index in changed_gene_indexes if reference_counts[gene_index] > 0)
+    genes_to_release = [input_gene_index for gene_index in detached_genes for input_gene_index in get_gene_inputs(get_gene(parent, gene_index))]
+    while genes_to_release:
+        gene_index = genes_to_release.pop()
+        reference_counts[gene_index] -= 1
+        visited_genes.add(gene_index)
+        # gene became inactive, an unchanged gene releases the same references in the child as in the parent
+        if reference_counts[gene_index] == 0 and gene_index not in detached_genes:
+            genes_to_release.extend(get_gene_inputs(get_gene(child, gene_index)))
+
+    # take references of the child versions of changed genes that are still active
+    genes_to_reference = [input_gene_index for gene_index in changed_gene_indexes if reference_counts[gene_index] > 0
+                          for input_gene_index in get_gene_inputs(get_gene(child, gene_index))]
+    while genes_to_reference:
+        gene_index = genes_to_reference.pop()
+        reference_counts[gene_index] += 1
+        visited_genes.add(gene_index)
+        # gene became active
+        if reference_counts[gene_index] == 1:
+            genes_to_reference.extend(get_gene_inputs(get_gene(child, gene_index)))
+
+    activity = {gene_index: reference_counts[gene_index] > 0 and get_gene(child, gene_index)[0] != -1 for gene_index in visited_genes}
+    return reference_counts, activity
 
 def get_active_gene_indexes(genome, output_gene_indexes):
     '''[summary]
-    Returns indexes of active genes in genome
+    Returns indexes of active genes in genome, see get_active_genes
     ### Parameters
     1. genome
         - genome to search active genes in
@@ -98,47 +302,77 @@ def get_active_gene_indexes(genome, output_gene_indexes):
 
     ### Returns
     List[int]
-        - list of indexes of active genes in genome
-    '''
-    active_genes_indexes = []
-    added_to_active_flag = [False] * len(genome) # flag for each gene if it was added to active genes
-
-    found_new_gene = True
-    gene_indexes_to_search = output_gene_indexes.copy()
-    while (found_new_gene):
-        new_indexes_to_search = []
-        for gene_index_to_search in gene_indexes_to_search:
-            gene = genome[gene_index_to_search]
-            gene_operation = gene[0]
-
-            # in case of input gene, skip it
-            if (gene_operation == -1):
-                continue
-
-            # add the gene we are working with to active genes
-            active_genes_indexes.append(gene_index_to_search)
-
-            # in case of output gene, save it to active genes, and continue
-            if (gene_operation == -2):
-                input_gene_index = gene[1]
-                if (not added_to_active_flag[input_gene_index]):
-                    # mark the input of this gene as active, and add it to active genes
-                    added_to_active_flag[input_gene_index] = True
-                    new_indexes_to_search.append(input_gene_index)
-                continue
-
-            # function genes
-            for i in range(1, 1 + op_inputs[operations[gene_operation]]): # for each input that the operation of this gene has
-                input_gene_index = gene[i] # in case of output gene, use only the first input
-                if (not added_to_active_flag[input_gene_index]):
-                    # mark the input of this gene as active, and add it to genes to search next
-                    added_to_active_flag[input_gene_index] = True
-                    new_indexes_to_search.append(input_gene_index)
-
-        found_new_gene = len(new_indexes_to_search) != 0 # if there are no new genes to search, stop the loop
-        gene_indexes_to_search = new_indexes_to_search # reassign the genes to search
-
-    return active_genes_indexes
+        - sorted list of indexes of active genes in genome
+    '''
+    return get_active_genes(genome, output_gene_indexes)[1]
+
+def get_evaluation_order(active_gene_indexes):
+    '''[summary]
+    Returns the active gene indexes in an order in which every gene comes after its inputs.
+    Genes can only take inputs from previous columns, so ascending index order is a valid topological order.
+    Active genes from get_active_genes are already in this order.
+    ### Parameters
+    1. active_gene_indexes
+        - list of indexes of active genes, in any order
+    ### Returns
+    List[int]
+        - indexes of active genes sorted for a single pass evaluation
+    '''
+    return sorted(active_gene_indexes)
+
+def get_changed_gene_indexes(original, changed):
+    '''[summary]
+    Returns indexes of genes that differ between two genomes of the same length
+    ### Parameters
+    1. original
+        - genome before the change
+    2. changed
+        - genome after the change
+    ### Returns
+    List[int]
+        - indexes of genes that differ
+    '''
+    return np.flatnonzero((to_genome_array(original) != to_genome_array(changed)).any(axis=1)).tolist()
+
+def iterate_chunks(data, chunk_size):
+    '''[summary]
+    Returns consecutive chunks of samples of the given data.
+    ### Parameters
+    1. data
+        - np.ndarray or np.memmap with samples in the last axis (input matrix or wanted output), sliced into chunks without loading it whole
+        - or any other iterable, which is taken as an iterable of chunks already, it must be iterable more than once (e.g. a list, not a generator)
+    2. chunk_size
+        - number of samples in a chunk of sliced data
+    ### Returns
+    Iterable[np.ndarray]
+        - chunks of the data
+    Raises
+    ------
+    ValueError
+        - if data is an iterator, its chunks would be consumed by the first evaluation
+    '''
+    if not isinstance(data, np.ndarray):
+        if iter(data) is data:
+            raise ValueError("data must be iterable more than once, e.g. np.ndarray, np.memmap or a list of chunks, not an iterator")
+        return iter(data)
+    return (data[..., start:start + chunk_size] for start in range(0, data.shape[-1], chunk_size))
+
+def get_stratified_subset_indexes(wanted_output, subset_size):
+    '''[summary]
+    Returns indexes of a fixed subset of samples stratified by the wanted output,
+    samples are sorted by the wanted output and taken evenly, so the subset covers the whole range of outputs.
+    ### Parameters
+    1. wanted_output
+        - expected output of all samples, one row per output with several outputs
+    2. subset_size
+        - number of samples in the subset, must be <= number of samples
+    ### Returns
+    np.ndarray
+        - sorted indexes of the samples in the subset
+    '''
+    # with several outputs, samples are stratified by the first output
+    order = np.argsort(np.reshape(wanted_output, (-1, np.shape(wanted_output)[-1]))[0], kind='stable')
+    return np.sort(order[np.linspace(0, len(order) - 1, subset_size).round().astype(int)])
 
 def random_bool(chance):
     '''[summary]